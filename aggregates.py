@@ -0,0 +1,175 @@
+from collections import Counter
+
+# 彙總表：商店、產品（以整數鍵）與月份的退貨數量，以及 metadata 中的總筆數
+# 由寫入路徑在同一個交易中增量維護，get_statistics 只需讀取這些表
+
+SUMMARY_TABLES = {
+    'store_counts': 'store_id',
+    'product_counts': 'product_id',
+    'month_counts': 'month',
+}
+
+# 與 returns 表格分組時使用相同的月份運算式
+MONTH_EXPR = "substr(return_date, 1, 7)"
+
+GROUP_QUERIES = {
+    'store_counts': "SELECT store_id, COUNT(*) FROM returns GROUP BY store_id",
+    'product_counts': "SELECT product_id, COUNT(*) FROM returns GROUP BY product_id",
+    'month_counts': f"SELECT {MONTH_EXPR}, COUNT(*) FROM returns GROUP BY {MONTH_EXPR}",
+}
+
+
+def rebuild_summary_tables(conn):
+    """從 returns 表格重新計算所有彙總表（需在寫入交易中呼叫）"""
+    for table, key in SUMMARY_TABLES.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} ({key}, count) {GROUP_QUERIES[table]}")
+    total = conn.execute("SELECT COUNT(*) FROM returns").fetchone()[0]
+    conn.execute(
+        "INSERT OR REPLACE INTO metadata (key, value) VALUES ('returns_count', ?)",
+        (total,)
+    )
+    return total
+
+
+def _apply_table_deltas(conn, table, key, counts, sign):
+    rows = [(name, int(count) * sign) for name, count in counts.items() if count]
+    if not rows:
+        return
+    conn.executemany(f'''
+        INSERT INTO {table} ({key}, count) VALUES (?, ?)
+        ON CONFLICT({key}) DO UPDATE SET count = count + excluded.count
+    ''', rows)
+    if sign < 0:
+        conn.execute(f"DELETE FROM {table} WHERE count <= 0")
+
+
+def apply_summary_deltas(conn, store_counts, product_counts, month_counts, sign=1):
+    """將一批寫入（sign=1）或刪除（sign=-1）的分組數量套用到彙總表"""
+    _apply_table_deltas(conn, 'store_counts', 'store_id', store_counts, sign)
+    _apply_table_deltas(conn, 'product_counts', 'product_id', product_counts, sign)
+    _apply_table_deltas(conn, 'month_counts', 'month', month_counts, sign)
+
+    total = sum(int(count) for count in store_counts.values()) * sign
+    if total:
+        conn.execute('''
+            INSERT INTO metadata (key, value) VALUES ('returns_count', ?)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value
+        ''', (total,))
+
+
+def record_deltas(records):
+    """從 (store_id, product_id, return_date) 序列計算分組數量"""
+    stores, products, months = Counter(), Counter(), Counter()
+    for store_id, product_id, return_date in records:
+        stores[store_id] += 1
+        products[product_id] += 1
+        months[str(return_date)[:7]] += 1
+    return stores, products, months
+
+
+def frame_deltas(df):
+    """以向量化方式從含 store_id、product_id 的 DataFrame 計算分組數量"""
+    return (
+        {int(k): int(v) for k, v in df['store_id'].value_counts().items()},
+        {int(k): int(v) for k, v in df['product_id'].value_counts().items()},
+        df['return_date'].str.slice(0, 7).value_counts().to_dict(),
+    )
+
+
+def read_statistics(conn):
+    """讀取彙總表，成本只與分組數量有關"""
+    row = conn.execute("SELECT value FROM metadata WHERE key = 'returns_count'").fetchone()
+    total_returns = int(row[0]) if row else 0
+
+    store_stats = [
+        {'store_name': str(name), 'count': int(count)}
+        for name, count in conn.execute('''
+            SELECT s.name, c.count FROM store_counts c
+            JOIN stores s ON s.id = c.store_id
+            ORDER BY c.count DESC, s.name
+        ''')
+    ]
+    product_stats = [
+        {'product': str(name), 'count': int(count)}
+        for name, count in conn.execute('''
+            SELECT p.name, c.count FROM product_counts c
+            JOIN products p ON p.id = c.product_id
+            ORDER BY c.count DESC, p.name
+        ''')
+    ]
+    monthly_stats = [
+        {'month': str(month), 'count': int(count)}
+        for month, count in conn.execute(
+            "SELECT month, count FROM month_counts ORDER BY month DESC"
+        )
+    ]
+
+    return {
+        'total_returns': total_returns,
+        'store_stats': store_stats,
+        'product_stats': product_stats,
+        'monthly_stats': monthly_stats
+    }
+
+
+def _select_in(conn, sql, keys):
+    keys = list(keys)
+    if not keys:
+        return {}
+    placeholders = ', '.join('?' * len(keys))
+    return dict(conn.execute(sql.format(placeholders=placeholders), keys).fetchall())
+
+
+def read_changed_counts(conn, store_counts, product_counts, month_counts, max_groups=500):
+    """讀取一批寫入或刪除影響到的分組目前的數量（分組已無記錄時為 0）與總數，供變更事件使用；
+    影響的分組超過 max_groups 時只返回總數並標記 truncated"""
+    total = conn.execute("SELECT value FROM metadata WHERE key = 'returns_count'").fetchone()
+    changes = {
+        'total_returns': int(total[0]) if total else 0,
+        'store_count': conn.execute("SELECT COUNT(*) FROM store_counts").fetchone()[0],
+        'product_count': conn.execute("SELECT COUNT(*) FROM product_counts").fetchone()[0],
+        'truncated': max(len(store_counts), len(product_counts), len(month_counts)) > max_groups,
+        'stores': {},
+        'products': {},
+        'months': {},
+    }
+    if changes['truncated']:
+        return changes
+
+    changes['stores'] = _select_in(conn, '''
+        SELECT s.name, COALESCE(c.count, 0) FROM stores s
+        LEFT JOIN store_counts c ON c.store_id = s.id
+        WHERE s.id IN ({placeholders})
+    ''', store_counts)
+    changes['products'] = _select_in(conn, '''
+        SELECT p.name, COALESCE(c.count, 0) FROM products p
+        LEFT JOIN product_counts c ON c.product_id = p.id
+        WHERE p.id IN ({placeholders})
+    ''', product_counts)
+    months = _select_in(conn, "SELECT month, count FROM month_counts WHERE month IN ({placeholders})", month_counts)
+    changes['months'] = {str(month): int(months.get(month, 0)) for month in month_counts}
+    return changes
+
+
+def check_summary_consistency(conn):
+    """比對彙總表與 returns 表格的實際分組結果，返回不一致的項目"""
+    mismatches = {}
+    for table, key in SUMMARY_TABLES.items():
+        expected = dict(conn.execute(GROUP_QUERIES[table]).fetchall())
+        actual = dict(conn.execute(f"SELECT {key}, count FROM {table}").fetchall())
+        diff = {
+            str(name): {'expected': expected.get(name, 0), 'actual': actual.get(name, 0)}
+            for name in set(expected) | set(actual)
+            if expected.get(name, 0) != actual.get(name, 0)
+        }
+        if diff:
+            mismatches[table] = diff
+
+    expected_total = conn.execute("SELECT COUNT(*) FROM returns").fetchone()[0]
+    row = conn.execute("SELECT value FROM metadata WHERE key = 'returns_count'").fetchone()
+    actual_total = row[0] if row else 0
+    if expected_total != actual_total:
+        mismatches['returns_count'] = {'expected': expected_total, 'actual': actual_total}
+
+    return mismatches
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+維度表正規化基準測試
+比較 returns 以文字欄位（v4）與整數外鍵（v5）儲存時的檔案大小與分組查詢時間
+
+用法:
+    python benchmarks/bench_dimensions.py --rows 1000000 10000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import apply_migrations
+from bench_indexes import TEXT_SCHEMA_VERSION, _populate
+
+# 兩種結構下 get_statistics 重建彙總表時使用的分組查詢
+GROUP_QUERIES = {
+    'text': {
+        'by_store': "SELECT store_name, COUNT(*) FROM returns GROUP BY store_name",
+        'by_product': "SELECT product, COUNT(*) FROM returns GROUP BY product",
+    },
+    'normalized': {
+        'by_store': "SELECT store_id, COUNT(*) FROM returns GROUP BY store_id",
+        'by_product': "SELECT product_id, COUNT(*) FROM returns GROUP BY product_id",
+    },
+}
+
+
+def _file_size(conn, path):
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path) / (1024 * 1024)
+
+
+def _time_groups(conn, queries, repeat):
+    results = {}
+    for name, sql in queries.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql).fetchall()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def run(rows, repeat):
+    print(f"\n📊 {rows:,} 筆資料")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        conn.execute("BEGIN")
+        apply_migrations(conn, target_version=1)
+        conn.execute("COMMIT")
+        random.seed(rows)
+        _populate(conn, rows)
+
+        conn.execute("BEGIN")
+        apply_migrations(conn, target_version=TEXT_SCHEMA_VERSION)
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+        text_size = _file_size(conn, path)
+        text_times = _time_groups(conn, GROUP_QUERIES['text'], repeat)
+
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        apply_migrations(conn)
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+        print(f"正規化遷移: {time.perf_counter() - start:.1f} 秒")
+        normalized_size = _file_size(conn, path)
+        normalized_times = _time_groups(conn, GROUP_QUERIES['normalized'], repeat)
+        conn.close()
+
+    print(f"{'項目':<22}{'文字欄位':>14}{'整數外鍵':>14}{'比例':>10}")
+    print(f"{'file_size (MB)':<22}{text_size:>14.1f}{normalized_size:>14.1f}"
+          f"{text_size / normalized_size:>9.1f}x")
+    for name in GROUP_QUERIES['text']:
+        before, after = text_times[name], normalized_times[name]
+        speedup = before / after if after > 0 else float('inf')
+        print(f"{name + ' (ms)':<22}{before:>14.2f}{after:>14.2f}{speedup:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商店、產品維度表正規化基準測試")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
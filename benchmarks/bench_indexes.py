@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引效能基準測試
+比較 returns 表格在套用索引遷移前後，各查詢路徑的執行時間
+
+用法:
+    python benchmarks/bench_indexes.py --rows 1000000 10000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import apply_migrations
+
+STORES = [f"商店{i:03d}" for i in range(200)]
+PRODUCTS = [f"產品{i:04d}" for i in range(2000)]
+START_DATE = date(2020, 1, 1)
+DAYS = 365 * 5
+
+# 查詢使用文字欄位，只套用到正規化（v5）之前的遷移
+TEXT_SCHEMA_VERSION = 4
+
+# 與 DatabaseManager 相同的查詢
+QUERIES = {
+    'by_store': (
+        "SELECT * FROM returns WHERE store_name = ? ORDER BY return_date DESC",
+        lambda: [random.choice(STORES)]
+    ),
+    'by_product': (
+        "SELECT * FROM returns WHERE product = ? ORDER BY return_date DESC",
+        lambda: [random.choice(PRODUCTS)]
+    ),
+    'by_date_range': (
+        "SELECT * FROM returns WHERE return_date BETWEEN ? AND ? ORDER BY return_date DESC",
+        lambda: _random_range(7)
+    ),
+    'latest_50': (
+        "SELECT * FROM returns ORDER BY return_date DESC LIMIT 50",
+        lambda: []
+    ),
+    'store_recent_month': (
+        "SELECT * FROM returns WHERE store_name = ? AND return_date BETWEEN ? AND ? ORDER BY return_date DESC",
+        lambda: [random.choice(STORES)] + _random_range(30)
+    ),
+}
+
+
+def _random_range(days):
+    start = START_DATE + timedelta(days=random.randint(0, DAYS - days))
+    return [start.isoformat(), (start + timedelta(days=days)).isoformat()]
+
+
+def _generate_rows(count):
+    for i in range(count):
+        yield (
+            f"ORD{i:09d}",
+            random.choice(PRODUCTS),
+            random.choice(STORES),
+            (START_DATE + timedelta(days=random.randrange(DAYS))).isoformat()
+        )
+
+
+def _populate(conn, rows):
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO returns (order_id, product, store_name, return_date) VALUES (?, ?, ?, ?)",
+        _generate_rows(rows)
+    )
+    conn.execute("COMMIT")
+
+
+def _time_queries(conn, repeat):
+    results = {}
+    for name, (sql, make_params) in QUERIES.items():
+        random.seed(name)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, make_params()).fetchall()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def run(rows, repeat):
+    print(f"\n📊 {rows:,} 筆資料")
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"), isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        conn.execute("BEGIN")
+        apply_migrations(conn, target_version=1)
+        conn.execute("COMMIT")
+
+        start = time.perf_counter()
+        _populate(conn, rows)
+        print(f"寫入資料: {time.perf_counter() - start:.1f} 秒")
+
+        before = _time_queries(conn, repeat)
+
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        apply_migrations(conn, target_version=TEXT_SCHEMA_VERSION)
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+        print(f"建立索引: {time.perf_counter() - start:.1f} 秒")
+
+        after = _time_queries(conn, repeat)
+        conn.close()
+
+    print(f"{'查詢':<22}{'無索引 (ms)':>14}{'有索引 (ms)':>14}{'加速':>10}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] > 0 else float('inf')
+        print(f"{name:<22}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="returns 表格索引基準測試")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
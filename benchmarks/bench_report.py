@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel 報告產生基準測試
+比較原本的一般模式（載入全部記錄、逐格建立樣式物件、再逐格設定框線）
+與唯寫模式（具名樣式、由資料庫游標逐批寫入）的耗時與行程峰值記憶體
+
+每種模式在獨立的子行程中執行，峰值記憶體互不影響
+（峰值包含 SQLite mmap 映射的資料庫檔案頁面，連線池上限為 256MB）
+
+用法:
+    python benchmarks/bench_report.py --rows 200000
+    python benchmarks/bench_report.py --rows 1000000 --modes streaming
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+BUILD_CHUNK = 100000
+
+
+def build_database(db_path, rows):
+    db = DatabaseManager(db_path)
+    for start in range(0, rows, BUILD_CHUNK):
+        items = [
+            {'order_id': f"ORD{i:08d}", 'product': f"產品{i % 200}", 'store_name': f"商店{i % 30}",
+             'return_date': f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}"}
+            for i in range(start, min(rows, start + BUILD_CHUNK))
+        ]
+        db.insert_returns_bulk(items)
+    db.write_queue.close()
+    db.pool.close()
+
+
+def legacy_report(db_path, output):
+    """原本的作法：一般模式工作簿，逐格寫入字串並建立樣式，最後再逐格設定框線"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Border, Side
+
+    db = DatabaseManager(db_path)
+    returns_data = db.get_all_returns().to_dict('records')
+
+    wb = Workbook()
+    sheet = wb.active
+    headers = ['ID', '訂單ID', '產品名稱', '商店名稱', '退貨日期', '建立時間']
+    fields = ['id', 'order_id', 'product', 'store_name', 'return_date', 'created_at']
+    for col, header in enumerate(headers, 1):
+        cell = sheet.cell(row=1, column=col, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    for row_idx, record in enumerate(returns_data, 2):
+        for col, field in enumerate(fields, 1):
+            value = record.get(field)
+            sheet.cell(row=row_idx, column=col, value=str(value) if value is not None else '')
+
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                         top=Side(style='thin'), bottom=Side(style='thin'))
+    for row in range(1, len(returns_data) + 2):
+        for col in range(1, len(headers) + 1):
+            sheet.cell(row=row, column=col).border = thin_border
+    wb.save(output)
+    return len(returns_data)
+
+
+def streaming_report(db_path, output):
+    """唯寫模式：具名樣式，記錄由游標逐批寫入"""
+    from report_agent import ReportAgent
+
+    db = DatabaseManager(db_path)
+    agent = ReportAgent()
+    agent.reports_dir = os.path.dirname(output)
+    with db.export_snapshot() as snapshot:
+        wb = agent._create_workbook()
+        shards = agent._create_details_sheets(wb, snapshot['batches'])
+    agent._save_workbook(wb, output)
+    return sum(shard.rows for shard in shards)
+
+
+MODES = {
+    'legacy': legacy_report,
+    'streaming': streaming_report,
+}
+
+
+def run_child(mode, db_path, output):
+    start = time.perf_counter()
+    count = MODES[mode](db_path, output)
+    elapsed = time.perf_counter() - start
+    # Linux 上 ru_maxrss 的單位是 KB
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    size_mb = os.path.getsize(output) / 1024 / 1024
+    print(f"{mode:<12}{count:>10}{elapsed:>10.1f}{count / elapsed:>12.0f}{peak_mb:>12.0f}{size_mb:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel 報告產生基準測試")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--modes", default="legacy,streaming")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.db, args.output)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print(f"建立 {args.rows} 筆測試資料...")
+        build_database(db_path, args.rows)
+
+        print(f"{'模式':<12}{'筆數':>10}{'秒':>10}{'筆/秒':>12}{'峰值 MB':>12}{'檔案 MB':>10}")
+        for mode in args.modes.split(','):
+            output = os.path.join(tmp, f"{mode}.xlsx")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, "--db", db_path, "--output", output],
+                check=True, stdout=None, stderr=subprocess.DEVNULL
+            )
+
+
+if __name__ == "__main__":
+    main()
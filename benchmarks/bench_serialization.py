@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 序列化與回應壓縮基準測試
+比較原本的 jsonable_encoder + json.dumps 與 serialization.dumps 的耗時，
+並比較 gzip / brotli 在大型回應上的壓縮率與耗時
+
+用法:
+    python benchmarks/bench_serialization.py --records 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+import compression
+from serialization import dumps, serializer_name
+
+
+def make_frame(records):
+    return pd.DataFrame({
+        'id': range(1, records + 1),
+        'order_id': [f"ORD{i:08d}" for i in range(records)],
+        'product': [f"產品{i % 200}" for i in range(records)],
+        'store_name': [f"商店{i % 30}" for i in range(records)],
+        'return_date': [f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}" for i in range(records)],
+        'created_at': ["2024-06-01 12:00:00"] * records,
+        'version': [i // 100 for i in range(records)],
+    })
+
+
+def timed(func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 序列化與回應壓縮基準測試")
+    parser.add_argument("--records", type=int, default=50000)
+    args = parser.parse_args()
+
+    df = make_frame(args.records)
+    payload = {'status': 'success', 'message': '查詢完成', 'data': df.to_dict('records')}
+
+    print(f"序列化器: {serializer_name()}，筆數: {args.records}")
+    print(f"{'方式':<28}{'ms':>10}{'bytes':>12}")
+
+    def baseline():
+        encoded = jsonable_encoder(payload)
+        return json.dumps(encoded, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode('utf-8')
+
+    ms, body = timed(baseline)
+    print(f"{'jsonable_encoder+json':<28}{ms:>10.1f}{len(body):>12}")
+    ms, body = timed(lambda: dumps(payload))
+    print(f"{'serialization.dumps':<28}{ms:>10.1f}{len(body):>12}")
+
+    print()
+    print(f"{'壓縮':<28}{'ms':>10}{'bytes':>12}{'比例':>8}")
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+    for encoding in encodings:
+        def compress():
+            compressor = compression._Compressor(encoding, compression.GZIP_LEVEL, compression.BROTLI_QUALITY)
+            return compressor.compress(body, final=True)
+
+        ms, compressed = timed(compress)
+        print(f"{encoding:<28}{ms:>10.1f}{len(compressed):>12}{len(compressed) / len(body):>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
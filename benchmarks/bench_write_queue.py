@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批次寫入佇列基準測試
+比較並行單筆 insert_return 在逐筆提交與合併提交（group commit）時的吞吐量與延遲
+
+用法:
+    python benchmarks/bench_write_queue.py --writers 32 --records 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+from write_queue import WRITE_BATCH_SIZE, WRITE_MAX_DELAY_MS
+
+
+def run(label, writers, records, batch_size, max_delay_ms):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"),
+                             write_batch_size=batch_size, write_max_delay_ms=max_delay_ms)
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(n):
+            local = []
+            for i in range(records):
+                start = time.perf_counter()
+                db.insert_return(f"ORD{n:03d}{i:06d}", f"產品{i % 50}", f"商店{n % 10}", "2024-01-15")
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        stats = db.get_write_queue_stats()
+        db.write_queue.close()
+        db.pool.close()
+
+    latencies.sort()
+    total = writers * records
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:<14}{total / elapsed:>12.0f}{p50:>10.2f}{p99:>10.2f}{stats['avg_batch']:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次寫入佇列基準測試")
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--records", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'模式':<14}{'筆/秒':>12}{'p50 ms':>10}{'p99 ms':>10}{'平均批次':>12}")
+    run("per-record", args.writers, args.records, 1, 0)
+    run("group-commit", args.writers, args.records, WRITE_BATCH_SIZE, WRITE_MAX_DELAY_MS)
+
+
+if __name__ == "__main__":
+    main()
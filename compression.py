@@ -0,0 +1,163 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# brotli 為選用套件：有安裝時優先使用，否則只提供 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小於此大小的回應不壓縮（壓縮的成本大於傳輸節省）
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# 動態內容使用中等品質，兼顧壓縮率與 CPU
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/',
+)
+# 長時間連線的事件串流不壓縮（每條連線都要保留一個壓縮器，事件本身也很小）
+UNCOMPRESSED_TYPES = (
+    'text/event-stream',
+)
+
+
+def choose_encoding(accept_encoding):
+    """依 Accept-Encoding 選擇 br 或 gzip（忽略 q=0 的項目），都不接受時返回 None"""
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    def allowed(name):
+        return accepted.get(name, accepted.get('*', 0.0)) > 0
+
+    if brotli is not None and allowed('br'):
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data, final):
+        """壓縮一個區塊；串流時每塊都 flush，讓客戶端可以立即解壓"""
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """依 Accept-Encoding 以 brotli 或 gzip 壓縮回應，支援一般與串流回應"""
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=GZIP_LEVEL,
+                 brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        # 不接受壓縮的客戶端也經過 responder，讓可壓縮的回應都帶有 Vary: Accept-Encoding
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        responder = _CompressingResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, middleware, encoding, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self._start = None
+        self._compressor = None
+        self._passthrough = False
+
+    async def _send_start(self):
+        if self._start is not None:
+            start, self._start = self._start, None
+            await self._send(start)
+
+    def _compressible_type(self, headers):
+        content_type = headers.get('content-type', '')
+        return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNCOMPRESSED_TYPES)
+
+    def _compressible(self, headers):
+        if self._start['status'] in (204, 304) or 'content-encoding' in headers:
+            return False
+        return self._compressible_type(headers)
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            # 內容是否壓縮取決於 Accept-Encoding：可壓縮的回應（以及不帶內容類型的 304）都要帶 Vary，
+            # 即使這次沒有壓縮，共用快取才不會把未壓縮的版本給接受壓縮的客戶端（或反之）
+            headers = MutableHeaders(scope=message)
+            if message['status'] == 304 or self._compressible_type(headers):
+                headers.add_vary_header('Accept-Encoding')
+            self._start = message
+            if self.encoding is None:
+                self._passthrough = True
+                await self._send_start()
+                return
+            # 等到第一個內容區塊才決定是否壓縮
+            return
+        if message['type'] != 'http.response.body' or self._passthrough:
+            await self._send_start()
+            await self._send(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+        if self._compressor is None:
+            headers = MutableHeaders(raw=self._start['headers'])
+            if not self._compressible(headers) or (not more_body and len(body) < self.middleware.minimum_size):
+                self._passthrough = True
+                await self._send_start()
+                await self._send(message)
+                return
+
+            self._compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers['Content-Encoding'] = self.encoding
+            if more_body:
+                # 串流回應的總長度未知
+                if 'content-length' in headers:
+                    del headers['Content-Length']
+                await self._send_start()
+            else:
+                body = self._compressor.compress(body, final=True)
+                headers['Content-Length'] = str(len(body))
+                await self._send_start()
+                await self._send({'type': 'http.response.body', 'body': body, 'more_body': False})
+                return
+
+        await self._send({
+            'type': 'http.response.body',
+            'body': self._compressor.compress(body, final=not more_body),
+            'more_body': more_body,
+        })
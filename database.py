@@ -2,53 +2,387 @@ import sqlite3
 import pandas as pd
 from datetime import datetime
 import os
+import time
+import json
+import base64
+from contextlib import contextmanager
+
+from db_pool import get_pool
+from result_cache import get_cache
+from dimensions import get_dimension_cache
+from write_queue import get_write_batcher, WRITE_BATCH_SIZE, WRITE_MAX_DELAY_MS
+from migrations import apply_migrations
+from aggregates import (
+    apply_summary_deltas, record_deltas, frame_deltas, read_changed_counts,
+    read_statistics, rebuild_summary_tables, check_summary_consistency
+)
+from events import get_event_bus, EVENT_MAX_RECORDS
+
+# CSV 必要欄位與資料庫欄位
+REQUIRED_CSV_COLUMNS = ['order_id', 'product', 'store_name', 'date']
+RETURN_FIELDS = ['order_id', 'product', 'store_name', 'return_date']
+
+# 退貨日期的儲存格式；單筆與批次新增只接受此格式（未補零的月、日也可以）
+RETURN_DATE_FORMAT = '%Y-%m-%d'
+# CSV 導入另外接受以斜線分隔的日期（試算表常見的匯出格式），其他寫法一律列為錯誤
+CSV_DATE_FORMATS = (RETURN_DATE_FORMAT, '%Y/%m/%d')
+
+# 串流導入時每個區塊（交易）的列數
+IMPORT_CHUNK_SIZE = 50000
+
+# 單次批次新增 API 可接受的最大筆數
+MAX_BULK_ITEMS = 100000
+
+# 分頁查詢的預設與最大筆數
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 串流輸出時每次從游標讀取的列數
+STREAM_BATCH_SIZE = 1000
+
+# 匯出時依分區排序，讓同一分區的記錄連續出現（皆可直接依索引順序掃描）
+EXPORT_ORDERS = {
+    None: "ORDER BY r.return_date DESC, r.id DESC",
+    'store': "ORDER BY r.store_id DESC, r.return_date DESC, r.id DESC",
+    'month': "ORDER BY r.return_date DESC, r.id DESC",
+}
+
+# returns 只儲存商店、產品的整數鍵，讀取時再接回名稱
+# CROSS JOIN 固定以 returns 為外層迴圈，讓 {hint}（INDEXED BY）與排序索引生效
+RETURNS_SELECT = '''
+    SELECT r.id, r.order_id, p.name AS product, s.name AS store_name, r.return_date, r.created_at, r.version
+    FROM returns r {hint}
+    CROSS JOIN stores s ON s.id = r.store_id
+    CROSS JOIN products p ON p.id = r.product_id
+'''
+RETURNS_COLUMNS = ['id', 'order_id', 'product', 'store_name', 'return_date', 'created_at', 'version']
+
+
+def returns_query(where="", order="ORDER BY r.return_date DESC, r.id DESC", hint=""):
+    """組合帶有商店、產品名稱的退貨查詢"""
+    return f"{RETURNS_SELECT.format(hint=hint)} {where} {order}"
+
+
+def normalize_return_date(value):
+    """將退貨日期統一為 YYYY-MM-DD（接受 2024-3-5 這類未補零的寫法），格式錯誤時拋出 ValueError；
+    月份彙總、分頁游標與日期範圍查詢都依字串排序，寫入前必須補零"""
+    return datetime.strptime(str(value).strip(), RETURN_DATE_FORMAT).strftime(RETURN_DATE_FORMAT)
+
+
+def encode_cursor(return_date, record_id):
+    """將分頁位置編碼為不透明的游標字串"""
+    raw = json.dumps([return_date, record_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解碼游標字串，格式錯誤時拋出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return_date, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(return_date), int(record_id)
+    except Exception:
+        raise ValueError(f"無效的分頁游標: {cursor}")
+
+
+def normalize_page_size(limit):
+    """將分頁筆數限制在 1 到 MAX_PAGE_SIZE 之間"""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError("limit 必須大於 0")
+    return min(limit, MAX_PAGE_SIZE)
+
+def iter_cursor(conn, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+    """以 fetchmany 逐批產生字典列表，記憶體用量與總筆數無關"""
+    result = conn.execute(sql, list(params))
+    columns = [col[0] for col in result.description]
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [dict(zip(columns, row)) for row in rows]
+
+
+@contextmanager
+def read_export_snapshot(pool, batch_size=STREAM_BATCH_SIZE, partition_by=None):
+    """在同一個讀取交易中提供資料版本、統計資料與逐批產生的全部記錄，匯出內容對應單一資料版本
+    
+    只使用連線池的唯讀連線，不需要 DatabaseManager（報告行程不套用遷移、不開啟寫入連線）；
+    partition_by 為 'store' 或 'month' 時，同一商店或月份的記錄會連續出現
+    """
+    order = EXPORT_ORDERS[partition_by]
+    with pool.snapshot() as conn:
+        row = conn.execute("SELECT value FROM metadata WHERE key = 'data_version'").fetchone()
+        yield {
+            'data_version': int(row[0]) if row else 0,
+            'statistics': read_statistics(conn),
+            'batches': iter_cursor(conn, returns_query(order=order), (), batch_size),
+        }
+
 
 class DatabaseManager:
-    def __init__(self, db_path="returns.db"):
+    def __init__(self, db_path="returns.db", pool_size=8,
+                 write_batch_size=WRITE_BATCH_SIZE, write_max_delay_ms=WRITE_MAX_DELAY_MS):
         self.db_path = db_path
+        # 同一個資料庫檔案的所有 DatabaseManager 共用一個連線池
+        self.pool = get_pool(db_path, max_readers=pool_size)
+        # 讀取結果快取，以資料版本失效
+        self.cache = get_cache(db_path)
+        # 商店、產品名稱與整數鍵的對照快取
+        self.stores = get_dimension_cache(self.pool, 'store_name')
+        self.products = get_dimension_cache(self.pool, 'product')
+        # 單筆寫入經由佇列合併提交，write_max_delay_ms 為最多增加的延遲；
+        # 同一個資料庫檔案只能使用一組批次設定（與既有設定不同時拋出 ValueError）
+        self.write_queue = get_write_batcher(
+            db_path, self._insert_return_batch,
+            batch_size=write_batch_size, max_delay_ms=write_max_delay_ms
+        )
+        # 寫入交易提交後推送給儀表板的變更事件
+        self.events = get_event_bus(db_path)
         self.init_database()
     
     def init_database(self):
-        """初始化資料庫和表格"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """初始化資料庫並套用尚未執行的結構遷移"""
+        with self.pool.transaction() as conn:
+            applied = apply_migrations(conn)
         
-        # 建立退貨記錄表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS returns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_id TEXT NOT NULL,
-                product TEXT NOT NULL,
-                store_name TEXT NOT NULL,
-                return_date DATE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+        if 5 in applied:
+            # 正規化後舊的文字欄位頁面仍留在檔案中，重整一次以縮小檔案
+            self.pool.vacuum()
+    
+    def get_pool_stats(self):
+        """獲取連線池使用狀況"""
+        return self.pool.get_stats()
+    
+    def get_cache_stats(self):
+        """獲取結果快取使用狀況"""
+        return self.cache.get_stats()
+    
+    def get_write_queue_stats(self):
+        """獲取批次寫入佇列使用狀況"""
+        return self.write_queue.get_stats()
+    
+    def get_event_stats(self):
+        """獲取變更事件推送狀況"""
+        return self.events.get_stats()
+    
+    def get_data_version(self):
+        """獲取目前的資料版本（每次寫入交易遞增）"""
+        with self.pool.reader() as conn:
+            return self._read_data_version(conn)
+    
+    def _read_data_version(self, conn):
+        row = conn.execute("SELECT value FROM metadata WHERE key = 'data_version'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def get_returns_count(self):
+        """獲取記錄總數（讀取寫入時維護的 metadata，不掃描 returns 表格）"""
+        with self.pool.reader() as conn:
+            return self._read_returns_count(conn)
+    
+    def _read_returns_count(self, conn):
+        row = conn.execute("SELECT value FROM metadata WHERE key = 'returns_count'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def ping(self, timeout=1.0):
+        """以連線池的唯讀連線執行一次常數成本的查詢，返回 (記錄總數, 耗時毫秒)；
+        等待連線超過 timeout 秒時拋出 PoolTimeoutError"""
+        start = time.perf_counter()
+        conn = self.pool.acquire(timeout=timeout)
+        try:
+            returns_count = self._read_returns_count(conn)
+        finally:
+            self.pool.release(conn)
+        return returns_count, round((time.perf_counter() - start) * 1000, 3)
+    
+    def get_data_validators(self):
+        """獲取資料版本與最後寫入時間（epoch 秒，未知時為 None），用於 HTTP 條件式請求"""
+        with self.pool.reader() as conn:
+            values = dict(conn.execute(
+                "SELECT key, value FROM metadata WHERE key IN ('data_version', 'data_updated_at')"
+            ).fetchall())
+        updated_at = values.get('data_updated_at')
+        return int(values.get('data_version', 0)), int(updated_at) if updated_at is not None else None
+    
+    def _bump_data_version(self, conn):
+        """在目前的寫入交易中遞增資料版本並記錄寫入時間，返回新的版本"""
+        conn.execute('''
+            INSERT INTO metadata (key, value) VALUES ('data_version', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
         ''')
+        conn.execute('''
+            INSERT INTO metadata (key, value) VALUES ('data_updated_at', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (int(time.time()),))
+        return int(conn.execute("SELECT value FROM metadata WHERE key = 'data_version'").fetchone()[0])
+    
+    def _publish_changes(self, conn, version, deltas, inserted_ids=(), deleted_ids=()):
+        """在寫入交易中準備變更事件（記錄與受影響的統計數量），交易提交後才發布，回滾時不會送出"""
+        inserted_ids = list(inserted_ids)
+        truncated = len(inserted_ids) > EVENT_MAX_RECORDS
+        records = []
+        if inserted_ids and not truncated:
+            placeholders = ', '.join('?' * len(inserted_ids))
+            result = conn.execute(returns_query(f"WHERE r.id IN ({placeholders})", "ORDER BY r.id"), inserted_ids)
+            columns = [col[0] for col in result.description]
+            records = [dict(zip(columns, values)) for values in result.fetchall()]
+        
+        returns_event = {
+            'data_version': version,
+            'inserted_count': len(inserted_ids),
+            'records': records,
+            'deleted_ids': list(deleted_ids),
+            'truncated': truncated
+        }
+        statistics_event = read_changed_counts(conn, *deltas)
+        statistics_event['data_version'] = version
         
-        conn.commit()
-        conn.close()
+        def publish():
+            self.events.publish('returns', returns_event)
+            self.events.publish('statistics', statistics_event)
+        
+        self.pool.on_commit(publish)
+    
+    def _cached(self, name, args, compute):
+        """以 (方法, 參數, 資料版本) 為鍵快取讀取結果"""
+        return self.cache.get_or_compute(name, args, self.get_data_version(), compute)
+    
+    def _query_frame(self, sql, params=()):
+        """在唯讀連線上執行查詢並返回 DataFrame"""
+        with self.pool.reader() as conn:
+            return pd.read_sql_query(sql, conn, params=list(params))
     
     def insert_return(self, order_id, product, store_name, return_date):
-        """插入新的退貨記錄"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """插入新的退貨記錄（與並行的寫入合併提交），返回記錄ID"""
+        # 不可在 pool.transaction() 內呼叫：寫入由佇列執行緒在另一個交易中完成
+        return self.write_queue.write((order_id, product, store_name, normalize_return_date(return_date)))
+    
+    def submit_return(self, order_id, product, store_name, return_date):
+        """將新的退貨記錄放入寫入佇列，返回完成後帶有記錄ID的 Future（日期格式錯誤時拋出 ValueError）"""
+        return self.write_queue.submit((order_id, product, store_name, normalize_return_date(return_date)))
+    
+    def _insert_return_batch(self, records):
+        """在一個交易中寫入多筆 (order_id, product, store_name, return_date)，依序返回記錄ID"""
+        with self.pool.transaction() as conn:
+            version = self._bump_data_version(conn)
+            store_ids = self.stores.resolve(conn, list({record[2] for record in records}))
+            product_ids = self.products.resolve(conn, list({record[1] for record in records}))
+            
+            record_ids = []
+            rows = []
+            for order_id, product, store_name, return_date in records:
+                row = (store_ids[store_name], product_ids[product], return_date)
+                cursor = conn.execute('''
+                    INSERT INTO returns (order_id, store_id, product_id, return_date, version)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (order_id, *row, version))
+                record_ids.append(cursor.lastrowid)
+                rows.append(row)
+            
+            deltas = record_deltas(rows)
+            apply_summary_deltas(conn, *deltas)
+            self._publish_changes(conn, version, deltas, inserted_ids=record_ids)
         
-        cursor.execute('''
-            INSERT INTO returns (order_id, product, store_name, return_date)
-            VALUES (?, ?, ?, ?)
-        ''', (order_id, product, store_name, return_date))
+        return record_ids
+    
+    def delete_return(self, record_id):
+        """刪除退貨記錄，返回是否有刪除資料"""
+        with self.pool.transaction() as conn:
+            row = conn.execute(
+                "SELECT store_id, product_id, return_date FROM returns WHERE id = ?",
+                (record_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM returns WHERE id = ?", (record_id,))
+            deltas = record_deltas([row])
+            apply_summary_deltas(conn, *deltas, sign=-1)
+            version = self._bump_data_version(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO deleted_returns (id, version) VALUES (?, ?)",
+                (record_id, version)
+            )
+            self._publish_changes(conn, version, deltas, deleted_ids=[record_id])
+        
+        return True
+    
+    def get_return(self, record_id):
+        """獲取單筆退貨記錄，不存在時返回 None"""
+        rows = self._fetch_records(returns_query("WHERE r.id = ?", ""), [record_id])
+        return rows[0] if rows else None
+    
+    def get_changes_since(self, since_version, limit=None):
+        """獲取資料版本 since_version 之後新增與刪除的記錄；變更過多或版本無效時返回 reset=True 要求重新載入"""
+        limit = normalize_page_size(limit or MAX_PAGE_SIZE)
+        since_version = int(since_version)
         
-        conn.commit()
-        conn.close()
+        with self.pool.snapshot() as conn:
+            versions = dict(conn.execute(
+                "SELECT key, value FROM metadata WHERE key IN ('data_version', 'changes_base_version')"
+            ).fetchall())
+            data_version = int(versions.get('data_version', 0))
+            base_version = int(versions.get('changes_base_version', 0))
+            
+            if since_version < base_version or since_version > data_version:
+                upserts, deleted_ids, reset = [], [], True
+            else:
+                result = conn.execute(
+                    returns_query("WHERE r.version > ?", "ORDER BY r.version, r.id LIMIT ?"),
+                    [since_version, limit + 1]
+                )
+                columns = [col[0] for col in result.description]
+                upserts = [dict(zip(columns, values)) for values in result.fetchall()]
+                deleted_ids = [record_id for (record_id,) in conn.execute(
+                    "SELECT id FROM deleted_returns WHERE version > ? ORDER BY version, id LIMIT ?",
+                    [since_version, limit + 1]
+                )]
+                reset = len(upserts) > limit or len(deleted_ids) > limit
+                if reset:
+                    upserts, deleted_ids = [], []
         
-        return cursor.lastrowid
+        return {
+            'since_version': since_version,
+            'data_version': data_version,
+            'reset': reset,
+            'upserts': upserts,
+            'deleted_ids': deleted_ids
+        }
+    
+    def get_dashboard_data(self, statistics=True, returns=True, limit=None, sections=None):
+        """在同一個讀取交易中獲取資料版本、總筆數、統計資料與第一頁退貨記錄，各部分看到同一個資料版本；
+        統計與分頁結果與 get_statistics、get_returns_page 共用快取。
+        sections 為 {名稱: read(conn)}，在同一個交易中讀取其他表格（例如報告目錄）"""
+        limit = normalize_page_size(limit)
+        with self.pool.snapshot() as conn:
+            values = dict(conn.execute(
+                "SELECT key, value FROM metadata WHERE key IN ('data_version', 'data_updated_at', 'returns_count')"
+            ).fetchall())
+            data_version = int(values.get('data_version', 0))
+            updated_at = values.get('data_updated_at')
+            data = {
+                'data_version': data_version,
+                'updated_at': int(updated_at) if updated_at is not None else None,
+                'returns_count': int(values.get('returns_count', 0))
+            }
+            if statistics:
+                data['statistics'] = self.cache.get_or_compute(
+                    'get_statistics', (), data_version, lambda: read_statistics(conn)
+                )
+            if returns:
+                data['returns'] = self.cache.get_or_compute(
+                    'get_returns_page', (limit, None, None, None, None, None), data_version,
+                    lambda: self._read_page(conn, "", [limit + 1], limit)
+                )
+            for name, read in (sections or {}).items():
+                data[name] = read(conn)
+        return data
     
     def get_all_returns(self):
         """獲取所有退貨記錄"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql_query("SELECT * FROM returns ORDER BY return_date DESC", conn)
-            conn.close()
+            df = self._cached('get_all_returns', (), lambda: self._query_frame(returns_query()))
             
             # 檢查是否有資料
             if df is None or df.empty:
@@ -65,86 +399,137 @@ class DatabaseManager:
             # 返回空的 DataFrame 而不是 None
             return pd.DataFrame()
     
+    def get_returns_page(self, limit=None, cursor=None, store_name=None, product=None,
+                         start_date=None, end_date=None):
+        """以 keyset 分頁獲取退貨記錄（依 return_date, id 由新到舊），每頁成本與頁數深度無關"""
+        limit = normalize_page_size(limit)
+        where, params = self._returns_filters(cursor, store_name, product, start_date, end_date)
+        # 多取一筆用來判斷是否還有下一頁
+        params.append(limit + 1)
+        
+        return self._cached(
+            'get_returns_page',
+            (limit, cursor, store_name, product, start_date, end_date),
+            lambda: self._fetch_page(where, params, limit)
+        )
+    
+    def iter_returns(self, cursor=None, store_name=None, product=None, start_date=None, end_date=None,
+                     batch_size=STREAM_BATCH_SIZE):
+        """依 get_returns_page 的順序與條件逐批產生全部符合的記錄（不分頁、不快取）"""
+        where, params = self._returns_filters(cursor, store_name, product, start_date, end_date)
+        return self.iter_records(returns_query(where), params, batch_size=batch_size)
+    
+    def iter_records(self, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+        """在唯讀連線上以 fetchmany 逐批產生字典列表，記憶體用量與總筆數無關"""
+        with self.pool.reader() as conn:
+            yield from self._iter_cursor(conn, sql, params, batch_size)
+    
+    def _iter_cursor(self, conn, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+        return iter_cursor(conn, sql, params, batch_size)
+    
+    def export_snapshot(self, batch_size=STREAM_BATCH_SIZE, partition_by=None):
+        """在同一個讀取交易中提供資料版本、統計資料與逐批產生的全部記錄，見 read_export_snapshot"""
+        return read_export_snapshot(self.pool, batch_size, partition_by)
+    
+    def iter_export(self, partition_by=None, batch_size=STREAM_BATCH_SIZE):
+        """依 export_snapshot 的順序逐批產生全部記錄（CSV/NDJSON 匯出使用），讀取交易在迭代結束時關閉"""
+        with self.export_snapshot(batch_size, partition_by) as snapshot:
+            yield from snapshot['batches']
+    
+    def _returns_filters(self, cursor=None, store_name=None, product=None, start_date=None, end_date=None):
+        """組合退貨記錄查詢的 WHERE 子句與參數"""
+        conditions = []
+        params = []
+        
+        # 不存在的名稱對應到 NULL，不會符合任何記錄
+        if store_name:
+            conditions.append("r.store_id = ?")
+            params.append(self.stores.lookup(store_name))
+        if product:
+            conditions.append("r.product_id = ?")
+            params.append(self.products.lookup(product))
+        if start_date:
+            conditions.append("r.return_date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("r.return_date <= ?")
+            params.append(end_date)
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            conditions.append("(r.return_date, r.id) < (?, ?)")
+            params.extend([last_date, last_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+    
+    def _fetch_page(self, where, params, limit):
+        """執行分頁查詢並組合下一頁游標"""
+        with self.pool.reader() as conn:
+            return self._read_page(conn, where, params, limit)
+    
+    def _read_page(self, conn, where, params, limit):
+        result = conn.execute(returns_query(where, "ORDER BY r.return_date DESC, r.id DESC LIMIT ?"), list(params))
+        columns = [col[0] for col in result.description]
+        rows = [dict(zip(columns, values)) for values in result.fetchall()]
+        
+        has_more = len(rows) > limit
+        records = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = records[-1]
+            next_cursor = encode_cursor(last['return_date'], last['id'])
+        
+        return {
+            'records': records,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'limit': limit
+        }
+    
+    def _fetch_records(self, sql, params=()):
+        """在唯讀連線上執行查詢並返回字典列表"""
+        with self.pool.reader() as conn:
+            result = conn.execute(sql, list(params))
+            columns = [col[0] for col in result.description]
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+    
+    def query_records(self, sql, params=()):
+        """執行參數化唯讀查詢並返回字典列表（依資料版本快取）"""
+        return self._cached('query_records', (sql, tuple(params)), lambda: self._fetch_records(sql, params))
+    
+    def explain_query(self, sql, params=()):
+        """取得查詢的 EXPLAIN QUERY PLAN 結果"""
+        with self.pool.reader() as conn:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", list(params)).fetchall()
+        return [row[3] for row in rows]
+    
     def get_returns_by_date_range(self, start_date, end_date):
         """根據日期範圍獲取退貨記錄"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query('''
-            SELECT * FROM returns 
-            WHERE return_date BETWEEN ? AND ?
-            ORDER BY return_date DESC
-        ''', conn, params=[start_date, end_date])
-        conn.close()
-        return df
+        return self._cached('get_returns_by_date_range', (start_date, end_date), lambda: self._query_frame(
+            returns_query("WHERE r.return_date BETWEEN ? AND ?"), [start_date, end_date]
+        ))
     
     def get_returns_by_store(self, store_name):
         """根據商店名稱獲取退貨記錄"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query('''
-            SELECT * FROM returns 
-            WHERE store_name = ?
-            ORDER BY return_date DESC
-        ''', conn, params=[store_name])
-        conn.close()
-        return df
+        return self._cached('get_returns_by_store', (store_name,), lambda: self._query_frame(
+            returns_query("WHERE r.store_id = ?"), [self.stores.lookup(store_name)]
+        ))
     
     def get_returns_by_product(self, product):
         """根據產品名稱獲取退貨記錄"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query('''
-            SELECT * FROM returns 
-            WHERE product = ?
-            ORDER BY return_date DESC
-        ''', conn, params=[product])
-        conn.close()
-        return df
-    
-    def import_csv_data(self, csv_file_path):
-        """從 CSV 檔案導入資料"""
+        return self._cached('get_returns_by_product', (product,), lambda: self._query_frame(
+            returns_query("WHERE r.product_id = ?"), [self.products.lookup(product)]
+        ))
+    
+    def import_csv_data(self, csv_file_path, chunk_size=None):
+        """從 CSV 檔案導入資料，返回成功導入的筆數"""
         try:
-            # 檢查檔案是否存在
-            if not os.path.exists(csv_file_path):
-                raise FileNotFoundError(f"CSV 檔案不存在: {csv_file_path}")
-            
-            # 讀取 CSV 檔案
-            df = pd.read_csv(csv_file_path, encoding='utf-8')
-            required_columns = ['order_id', 'product', 'store_name', 'date']
+            result = self.import_csv_stream(csv_file_path, chunk_size=chunk_size)
             
-            # 檢查必要欄位
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"CSV 檔案缺少必要欄位: {missing_columns}")
-            
-            # 清理資料
-            df = df.dropna(subset=required_columns)
-            
-            if len(df) == 0:
+            if result['inserted_count'] == 0:
                 raise ValueError("CSV 檔案中沒有有效資料")
             
-            # 重新命名欄位以匹配資料庫結構
-            df = df.rename(columns={'date': 'return_date'})
-            
-            # 插入資料到資料庫
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 逐行插入資料
-            inserted_count = 0
-            for _, row in df.iterrows():
-                try:
-                    cursor.execute('''
-                        INSERT INTO returns (order_id, product, store_name, return_date)
-                        VALUES (?, ?, ?, ?)
-                    ''', (row['order_id'], row['product'], row['store_name'], row['return_date']))
-                    inserted_count += 1
-                except Exception as row_error:
-                    print(f"插入行資料失敗: {row_error}, 資料: {row}")
-                    continue
-            
-            conn.commit()
-            conn.close()
-            
-            print(f"成功導入 {inserted_count} 筆記錄")
-            return inserted_count
+            return result['inserted_count']
             
         except Exception as e:
             print(f"導入 CSV 資料失敗: {e}")
@@ -152,130 +537,177 @@ class DatabaseManager:
             traceback.print_exc()
             raise Exception(f"導入 CSV 資料失敗: {str(e)}")
     
-    def get_statistics(self):
-        """獲取統計資料"""
-        try:
-            print("🔍 開始獲取統計資料...")
-            
-            # 檢查資料庫檔案是否存在
-            if not os.path.exists(self.db_path):
-                print(f"❌ 資料庫檔案不存在: {self.db_path}")
-                default_stats = {
-                    'total_returns': 0,
-                    'store_stats': [],
-                    'product_stats': [],
-                    'monthly_stats': []
-                }
-                print(f"返回預設統計資料: {default_stats}")
-                return default_stats
-            
-            conn = sqlite3.connect(self.db_path)
-            
-            # 檢查表格是否存在
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='returns'")
-            if not cursor.fetchone():
-                print("❌ returns 表格不存在")
-                conn.close()
-                default_stats = {
-                    'total_returns': 0,
-                    'store_stats': [],
-                    'product_stats': [],
-                    'monthly_stats': []
-                }
-                print(f"返回預設統計資料: {default_stats}")
-                return default_stats
-            
-            print("✅ returns 表格存在，開始查詢統計資料...")
+    def import_csv_stream(self, csv_file_path, chunk_size=None, max_errors=1000):
+        """以固定大小的區塊串流導入 CSV，每個區塊以 executemany 在一個交易中寫入"""
+        # 檢查檔案是否存在
+        if not os.path.exists(csv_file_path):
+            raise FileNotFoundError(f"CSV 檔案不存在: {csv_file_path}")
+        
+        chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        
+        # 只讀取標題列來檢查必要欄位
+        header = pd.read_csv(csv_file_path, encoding='utf-8', nrows=0)
+        missing_columns = [col for col in REQUIRED_CSV_COLUMNS if col not in header.columns]
+        if missing_columns:
+            raise ValueError(f"CSV 檔案缺少必要欄位: {missing_columns}")
+        
+        start_time = time.perf_counter()
+        total_rows = 0
+        inserted_count = 0
+        error_count = 0
+        errors = []
+        
+        reader = pd.read_csv(
+            csv_file_path,
+            encoding='utf-8',
+            usecols=REQUIRED_CSV_COLUMNS,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=chunk_size
+        )
+        for chunk in reader:
+            # CSV 第 1 行是標題，資料從第 2 行開始
+            chunk.index = chunk.index + 2
+            total_rows += len(chunk)
             
-            # 總退貨數量
-            try:
-                total_result = pd.read_sql_query("SELECT COUNT(*) as total FROM returns", conn)
-                total_returns = int(total_result.iloc[0]['total']) if not total_result.empty else 0
-                print(f"✅ 總退貨數量: {total_returns}")
-            except Exception as e:
-                print(f"❌ 獲取總退貨數量失敗: {e}")
-                total_returns = 0
+            chunk = chunk.rename(columns={'date': 'return_date'})
+            clean, chunk_errors = self._clean_returns_frame(chunk, CSV_DATE_FORMATS)
             
-            # 按商店統計
-            try:
-                store_stats = pd.read_sql_query('''
-                    SELECT store_name, COUNT(*) as count 
-                    FROM returns 
-                    GROUP BY store_name 
-                    ORDER BY count DESC
-                ''', conn)
-                if not store_stats.empty:
-                    # 轉換 numpy.int64 為 Python int
-                    store_stats_list = []
-                    for _, row in store_stats.iterrows():
-                        store_stats_list.append({
-                            'store_name': str(row['store_name']),
-                            'count': int(row['count'])
-                        })
-                else:
-                    store_stats_list = []
-                print(f"✅ 商店統計: {len(store_stats_list)} 項")
-            except Exception as e:
-                print(f"❌ 獲取商店統計失敗: {e}")
-                store_stats_list = []
+            error_count += len(chunk_errors)
+            if len(errors) < max_errors:
+                errors.extend(chunk_errors[:max_errors - len(errors)])
             
-            # 按產品統計
-            try:
-                product_stats = pd.read_sql_query('''
-                    SELECT product, COUNT(*) as count 
-                    FROM returns 
-                    GROUP BY product 
-                    ORDER BY count DESC
-                ''', conn)
-                if not product_stats.empty:
-                    # 轉換 numpy.int64 為 Python int
-                    product_stats_list = []
-                    for _, row in product_stats.iterrows():
-                        product_stats_list.append({
-                            'product': str(row['product']),
-                            'count': int(row['count'])
-                        })
-                else:
-                    product_stats_list = []
-                print(f"✅ 產品統計: {len(product_stats_list)} 項")
-            except Exception as e:
-                print(f"❌ 獲取產品統計失敗: {e}")
-                product_stats_list = []
+            if not clean.empty:
+                with self.pool.transaction() as conn:
+                    self._insert_returns_frame(conn, clean)
+                inserted_count += len(clean)
+        
+        elapsed = time.perf_counter() - start_time
+        rows_per_sec = round(inserted_count / elapsed, 1) if elapsed > 0 else 0.0
+        print(f"成功導入 {inserted_count} 筆記錄（共 {total_rows} 行，{error_count} 行失敗，{rows_per_sec} 筆/秒）")
+        
+        return {
+            'inserted_count': inserted_count,
+            'total_rows': total_rows,
+            'error_count': error_count,
+            'errors': errors,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_sec': rows_per_sec
+        }
+    
+    def _clean_returns_frame(self, df, date_formats=(RETURN_DATE_FORMAT,)):
+        """以向量化方式驗證並清理退貨資料，返回 (有效資料, 錯誤列表)；
+        日期依序以 date_formats 中的格式整欄解析，都不符合的列為錯誤（與 normalize_return_date 一致）"""
+        df = df[RETURN_FIELDS].copy()
+        reasons = pd.Series('', index=df.index)
+        
+        for col in RETURN_FIELDS:
+            values = df[col].astype('string').str.strip()
+            df[col] = values
+            empty = values.isna() | (values == '')
+            reasons = reasons.mask(empty & (reasons == ''), f'缺少欄位 {col}')
+        
+        dates = pd.to_datetime(df['return_date'], format=date_formats[0], errors='coerce')
+        for date_format in date_formats[1:]:
+            dates = dates.fillna(pd.to_datetime(df['return_date'], format=date_format, errors='coerce'))
+        reasons = reasons.mask(dates.isna() & (reasons == ''), '日期格式錯誤')
+        df['return_date'] = dates.dt.strftime(RETURN_DATE_FORMAT)
+        
+        invalid = reasons != ''
+        errors = [
+            {'row': int(row), 'error': reason}
+            for row, reason in reasons[invalid].items()
+        ]
+        return df[~invalid], errors
+    
+    def insert_returns_bulk(self, items, positions=None, chunk_size=None):
+        """以向量化驗證並分批交易寫入多筆退貨記錄（JSON 物件列表），返回筆數、記錄ID與逐筆錯誤"""
+        # positions 為每個項目在原始請求中的位置，用於錯誤回報
+        positions = list(positions) if positions is not None else list(range(len(items)))
+        chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        
+        start_time = time.perf_counter()
+        record_ids = []
+        errors = []
+        
+        for start in range(0, len(items), chunk_size):
+            chunk, chunk_errors = self._records_frame(
+                items[start:start + chunk_size], positions[start:start + chunk_size]
+            )
+            errors.extend(chunk_errors)
             
-            # 按月份統計
-            try:
-                monthly_stats = pd.read_sql_query('''
-                    SELECT strftime('%Y-%m', return_date) as month, COUNT(*) as count 
-                    FROM returns 
-                    GROUP BY month 
-                    ORDER BY month DESC
-                ''', conn)
-                if not monthly_stats.empty:
-                    # 轉換 numpy.int64 為 Python int
-                    monthly_stats_list = []
-                    for _, row in monthly_stats.iterrows():
-                        monthly_stats_list.append({
-                            'month': str(row['month']),
-                            'count': int(row['count'])
-                        })
-                else:
-                    monthly_stats_list = []
-                print(f"✅ 月份統計: {len(monthly_stats_list)} 項")
-            except Exception as e:
-                print(f"❌ 獲取月份統計失敗: {e}")
-                monthly_stats_list = []
+            if chunk.empty:
+                continue
+            clean, clean_errors = self._clean_returns_frame(chunk)
+            errors.extend({'index': e['row'], 'error': e['error']} for e in clean_errors)
             
-            conn.close()
+            if not clean.empty:
+                with self.pool.transaction() as conn:
+                    record_ids.extend(self._insert_returns_frame(conn, clean))
+        
+        elapsed = time.perf_counter() - start_time
+        errors.sort(key=lambda e: e['index'])
+        print(f"批次新增 {len(record_ids)} 筆記錄（共 {len(items)} 筆，{len(errors)} 筆失敗，{elapsed:.3f} 秒）")
+        
+        return {
+            'inserted_count': len(record_ids),
+            'total_rows': len(items),
+            'error_count': len(errors),
+            'errors': errors,
+            'ids': record_ids,
+            'elapsed_seconds': round(elapsed, 3)
+        }
+    
+    def _records_frame(self, items, positions):
+        """將 JSON 物件列表轉為以原始位置為索引的 DataFrame，非物件項目列為錯誤"""
+        errors = [
+            {'index': position, 'error': '項目必須是 JSON 物件'}
+            for item, position in zip(items, positions) if not isinstance(item, dict)
+        ]
+        valid = [(item, position) for item, position in zip(items, positions) if isinstance(item, dict)]
+        
+        df = pd.DataFrame.from_records(
+            [item for item, _ in valid], index=[position for _, position in valid]
+        )
+        # 與 CSV 相同，接受 date 作為 return_date 的別名
+        if 'date' in df.columns:
+            df['return_date'] = df['return_date'].fillna(df['date']) if 'return_date' in df.columns else df['date']
+        df = df.reindex(columns=RETURN_FIELDS)
+        return df, errors
+    
+    def _insert_returns_frame(self, conn, df):
+        """在目前的交易中批次寫入已清理的退貨資料，返回新記錄的ID"""
+        version = self._bump_data_version(conn)
+        store_ids = self.stores.resolve(conn, df['store_name'].unique().tolist())
+        product_ids = self.products.resolve(conn, df['product'].unique().tolist())
+        df = df.assign(
+            store_id=df['store_name'].map(store_ids).astype('int64'),
+            product_id=df['product'].map(product_ids).astype('int64'),
+            version=version
+        )
+        conn.executemany('''
+            INSERT INTO returns (order_id, store_id, product_id, return_date, version)
+            VALUES (?, ?, ?, ?, ?)
+        ''', df[['order_id', 'store_id', 'product_id', 'return_date', 'version']].itertuples(index=False, name=None))
+        # 單一寫入者加上 AUTOINCREMENT，同一個 executemany 產生的ID是連續的
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        record_ids = list(range(last_id - len(df) + 1, last_id + 1))
+        deltas = frame_deltas(df)
+        apply_summary_deltas(conn, *deltas)
+        self._publish_changes(conn, version, deltas, inserted_ids=record_ids)
+        return record_ids
+    
+    def get_statistics(self):
+        """獲取統計資料（讀取增量維護的彙總表）"""
+        try:
+            print("🔍 開始獲取統計資料...")
             
-            final_stats = {
-                'total_returns': total_returns,
-                'store_stats': store_stats_list,
-                'product_stats': product_stats_list,
-                'monthly_stats': monthly_stats_list
-            }
+            final_stats = self._cached('get_statistics', (), self._read_statistics)
             
-            print(f"🎉 統計資料獲取成功: {final_stats}")
+            print(f"🎉 統計資料獲取成功: 總退貨數 {final_stats['total_returns']}，"
+                  f"商店 {len(final_stats['store_stats'])} 項，"
+                  f"產品 {len(final_stats['product_stats'])} 項，"
+                  f"月份 {len(final_stats['monthly_stats'])} 項")
             return final_stats
             
         except Exception as e:
@@ -291,3 +723,33 @@ class DatabaseManager:
             }
             print(f"🔄 返回預設統計資料: {default_stats}")
             return default_stats
+    
+    def _read_statistics(self):
+        with self.pool.reader() as conn:
+            return read_statistics(conn)
+    
+    def verify_statistics(self, repair=False):
+        """檢查彙總表是否與 returns 表格一致，repair 為 True 時從頭重建"""
+        with self.pool.reader() as conn:
+            mismatches = check_summary_consistency(conn)
+        
+        if mismatches:
+            print(f"❌ 彙總表不一致: {list(mismatches.keys())}")
+            if repair:
+                self.rebuild_statistics()
+        
+        return {
+            'consistent': not mismatches,
+            'mismatches': mismatches,
+            'repaired': bool(mismatches) and repair
+        }
+    
+    def rebuild_statistics(self):
+        """從 returns 表格重建所有彙總表"""
+        with self.pool.transaction() as conn:
+            self._bump_data_version(conn)
+            total = rebuild_summary_tables(conn)
+            # 彙總表整個重算，通知儀表板重新載入
+            self.pool.on_commit(lambda: self.events.publish('reset', {}))
+        print(f"✅ 彙總表已重建，共 {total} 筆記錄")
+        return total
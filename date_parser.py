@@ -0,0 +1,184 @@
+import re
+import calendar
+from datetime import date, timedelta
+
+# 解析自然語言中的日期表達式，轉換為 (開始日期, 結束日期) 的閉區間
+
+MONTH_NAMES = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+    'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7,
+    'august': 8, 'aug': 8, 'september': 9, 'sep': 9, 'sept': 9,
+    'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12,
+}
+
+# 也是常見英文單字的月份名稱（may、march），只有帶年份或日期時才視為月份
+AMBIGUOUS_MONTH_NAMES = {'may', 'mar', 'march'}
+# 沒有年份與日期時，月份名稱前需要 in / during 才視為日期條件（"show returns in june"）
+MONTH_CONTEXT_PATTERN = r'\b(?:in|during)\s+$'
+MONTH_NAME_PATTERN = (
+    r'\b(' + '|'.join(sorted(MONTH_NAMES, key=len, reverse=True)) + r')\b\.?'
+    r'(?:\s+(\d{1,2})(?:st|nd|rd|th)?\b(?!\s*[:：]))?,?(?:\s*(\d{4})\b)?'
+)
+
+CHINESE_NUMERALS = {
+    '零': 0, '一': 1, '二': 2, '兩': 2, '三': 3, '四': 4, '五': 5,
+    '六': 6, '七': 7, '八': 8, '九': 9, '十': 10,
+}
+
+DATE_PATTERN = r'(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})'
+RANGE_SEPARATOR = r'\s*(?:到|至|~|～|－|—|-|to|until|through)\s*'
+
+
+def _chinese_number(text):
+    """將阿拉伯數字或簡單中文數字（至九十九）轉為整數"""
+    if text.isdigit():
+        return int(text)
+    if text == '十':
+        return 10
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return CHINESE_NUMERALS.get(tens, 1) * 10 + CHINESE_NUMERALS.get(ones, 0)
+    return CHINESE_NUMERALS.get(text)
+
+
+def _month_range(year, month):
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def _shift_month(year, month, offset):
+    index = year * 12 + (month - 1) + offset
+    return index // 12, index % 12 + 1
+
+
+def _to_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _format(start, end):
+    if start > end:
+        start, end = end, start
+    return start.isoformat(), end.isoformat()
+
+
+def _parse_month_name(lower, today):
+    """英文月份名稱：有年份或日期時直接採用；都沒有時需要 in / during 前綴，且不接受 may、march 這類一般單字"""
+    for match in re.finditer(MONTH_NAME_PATTERN, lower):
+        name, day, year = match.groups()
+        month = MONTH_NAMES[name]
+        if not day and not year:
+            if name in AMBIGUOUS_MONTH_NAMES or not re.search(MONTH_CONTEXT_PATTERN, lower[:match.start()]):
+                continue
+        year = int(year) if year else today.year
+        if day:
+            single = _to_date(year, month, day)
+            if single:
+                return _format(single, single)
+            continue
+        return _format(*_month_range(year, month))
+    return None
+
+
+def parse_date_range(text, today=None):
+    """從文字中解析日期範圍，返回 ('YYYY-MM-DD', 'YYYY-MM-DD')，無法解析時返回 None"""
+    today = today or date.today()
+    lower = text.lower()
+
+    # 明確的起訖日期：2024-01-01 到 2024-01-31、from 2024/1/1 to 2024/2/1
+    range_match = re.search(DATE_PATTERN + RANGE_SEPARATOR + DATE_PATTERN, lower)
+    if range_match:
+        start = _to_date(*range_match.group(1, 2, 3))
+        end = _to_date(*range_match.group(4, 5, 6))
+        if start and end:
+            return _format(start, end)
+
+    # 單一起點或終點：2024-01-01 之後 / since 2024-01-01 / 2024-01-01 以前
+    since_match = re.search(r'(?:since|after|from|自|從)\s*' + DATE_PATTERN, lower) \
+        or re.search(DATE_PATTERN + r'\s*(?:之後|以後|起|開始)', lower)
+    if since_match:
+        start = _to_date(*since_match.group(1, 2, 3))
+        if start:
+            return _format(start, max(start, today))
+    before_match = re.search(r'(?:before|until|截至|至)\s*' + DATE_PATTERN, lower) \
+        or re.search(DATE_PATTERN + r'\s*(?:之前|以前|為止)', lower)
+    if before_match:
+        end = _to_date(*before_match.group(1, 2, 3))
+        if end:
+            return _format(date.min, end)
+
+    # 單一日期
+    single_match = re.search(DATE_PATTERN, lower)
+    if single_match:
+        day = _to_date(*single_match.group(1, 2, 3))
+        if day:
+            return _format(day, day)
+
+    # 最近 N 天 / 週 / 個月：last 7 days、最近30天、過去兩週
+    recent_match = re.search(r'(?:last|past|最近|過去|近)\s*([0-9一二兩三四五六七八九十]+)\s*(days?|weeks?|months?|天|日|週|周|星期|個月|月)', lower)
+    if recent_match:
+        amount = _chinese_number(recent_match.group(1))
+        unit = recent_match.group(2)
+        if amount:
+            if unit.startswith('week') or unit in ('週', '周', '星期'):
+                start = today - timedelta(days=amount * 7 - 1)
+            elif unit.startswith('month') or unit in ('個月', '月'):
+                year, month = _shift_month(today.year, today.month, -amount)
+                start = _to_date(year, month, min(today.day, calendar.monthrange(year, month)[1])) + timedelta(days=1)
+            else:
+                start = today - timedelta(days=amount - 1)
+            return _format(start, today)
+
+    # 相對日期
+    if '今天' in lower or '今日' in lower or 'today' in lower:
+        return _format(today, today)
+    if '昨天' in lower or '昨日' in lower or 'yesterday' in lower:
+        day = today - timedelta(days=1)
+        return _format(day, day)
+
+    week_start = today - timedelta(days=today.weekday())
+    if any(word in lower for word in ['上週', '上周', '上星期', '上個星期', 'last week']):
+        start = week_start - timedelta(days=7)
+        return _format(start, start + timedelta(days=6))
+    if any(word in lower for word in ['本週', '本周', '這週', '這周', '這星期', '這個星期', 'this week']):
+        return _format(week_start, week_start + timedelta(days=6))
+
+    if any(word in lower for word in ['上個月', '上月', 'last month']):
+        return _format(*_month_range(*_shift_month(today.year, today.month, -1)))
+    if any(word in lower for word in ['本月', '這個月', '這月', 'this month']):
+        return _format(*_month_range(today.year, today.month))
+
+    if any(word in lower for word in ['去年', 'last year']):
+        return _format(date(today.year - 1, 1, 1), date(today.year - 1, 12, 31))
+    if any(word in lower for word in ['今年', '本年', 'this year']):
+        return _format(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    # 年月：2024年1月、2024-01、一月、1月
+    year_month_match = re.search(r'(\d{4})\s*年\s*(\d{1,2})\s*月', lower) \
+        or re.search(r'(\d{4})[-/](\d{1,2})(?![\d])', lower)
+    if year_month_match:
+        year, month = int(year_month_match.group(1)), int(year_month_match.group(2))
+        if 1 <= month <= 12:
+            return _format(*_month_range(year, month))
+
+    # 英文月份名稱：January 2024、May 5, 2024、Jan 15、in june
+    month_name_range = _parse_month_name(lower, today)
+    if month_name_range:
+        return month_name_range
+
+    chinese_month_match = re.search(r'([0-9一二三四五六七八九十]{1,3})\s*月(?:份)?', lower)
+    if chinese_month_match:
+        month = _chinese_number(chinese_month_match.group(1))
+        if month and 1 <= month <= 12:
+            return _format(*_month_range(today.year, month))
+
+    # 年份：2024年
+    year_match = re.search(r'(\d{4})\s*年', lower)
+    if year_match:
+        year = int(year_match.group(1))
+        return _format(date(year, 1, 1), date(year, 12, 31))
+
+    return None
+
@@ -0,0 +1,243 @@
+import sqlite3
+import threading
+import queue
+import time
+import os
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """等待連線逾時"""
+    pass
+
+
+class ConnectionPool:
+    """SQLite 連線池：有上限的唯讀連線 + 單一寫入連線"""
+
+    def __init__(self, db_path, max_readers=8, timeout=30.0,
+                 cache_size_kb=65536, mmap_size=268435456):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+
+        # 寫入連線只有一條，以 RLock 序列化所有寫入
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._writer_depth = 0
+        self._after_commit = []
+
+        # 使用統計
+        self._stats = {
+            'acquisitions': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'writer_acquisitions': 0,
+            'writer_total_wait_ms': 0.0,
+            'writer_max_wait_ms': 0.0,
+        }
+
+    def _connect(self, readonly):
+        """建立並調校一條連線（每條連線只調校一次）"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        if not readonly:
+            # WAL 設定會寫入資料庫檔案，由寫入連線負責
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _record_wait(self, prefix, waited_ms):
+        self._stats[f'{prefix}total_wait_ms'] += waited_ms
+        if waited_ms > self._stats[f'{prefix}max_wait_ms']:
+            self._stats[f'{prefix}max_wait_ms'] = waited_ms
+
+    def acquire(self, timeout=None):
+        """取得一條唯讀連線，timeout 為等待上限（預設使用連線池的 timeout）"""
+        timeout = self.timeout if timeout is None else timeout
+        if self._closed:
+            raise RuntimeError("連線池已關閉")
+
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.max_readers:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect(readonly=True)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._stats['waits'] += 1
+                try:
+                    conn = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"等待資料庫連線超過 {timeout} 秒")
+
+        waited_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._in_use += 1
+            self._stats['acquisitions'] += 1
+            self._record_wait('', waited_ms)
+        return conn
+
+    def release(self, conn):
+        """歸還唯讀連線"""
+        with self._lock:
+            self._in_use -= 1
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def reader(self):
+        """唯讀連線的 context manager"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def snapshot(self):
+        """唯讀連線上的讀取交易，區塊內的所有查詢看到同一個資料版本"""
+        with self.reader() as conn:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def transaction(self):
+        """在單一寫入連線上執行交易，巢狀呼叫會併入外層交易"""
+        start = time.perf_counter()
+        with self._writer_lock:
+            waited_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats['writer_acquisitions'] += 1
+                self._record_wait('writer_', waited_ms)
+
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            conn = self._writer
+
+            if self._writer_depth > 0:
+                self._writer_depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._writer_depth -= 1
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            self._writer_depth = 1
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._writer_depth = 0
+                callbacks, self._after_commit = self._after_commit, []
+
+            # 交易成功提交後才執行的回呼（回滾時直接丟棄）
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"交易提交後回呼執行失敗: {e}")
+
+    def on_commit(self, callback):
+        """登記在目前寫入交易成功提交後執行的回呼"""
+        if self._writer_depth == 0:
+            raise RuntimeError("on_commit 只能在寫入交易中呼叫")
+        self._after_commit.append(callback)
+
+    def vacuum(self):
+        """在交易之外以寫入連線執行 VACUUM，回收已刪除資料的空間"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            self._writer.execute("VACUUM")
+
+    def get_stats(self):
+        """取得連線池使用狀況"""
+        with self._lock:
+            stats = dict(self._stats)
+            acquisitions = stats['acquisitions']
+            writer_acquisitions = stats['writer_acquisitions']
+            stats.update({
+                'max_readers': self.max_readers,
+                'readers_created': self._created,
+                'readers_in_use': self._in_use,
+                'readers_idle': self._idle.qsize(),
+                'avg_wait_ms': round(stats['total_wait_ms'] / acquisitions, 3) if acquisitions else 0.0,
+                'writer_avg_wait_ms': round(stats['writer_total_wait_ms'] / writer_acquisitions, 3) if writer_acquisitions else 0.0,
+            })
+        for key in ('total_wait_ms', 'max_wait_ms', 'writer_total_wait_ms', 'writer_max_wait_ms'):
+            stats[key] = round(stats[key], 3)
+        return stats
+
+    def close(self):
+        """關閉所有連線"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **kwargs):
+    """取得（或建立）指定資料庫檔案共用的連線池"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,80 @@
+import os
+import threading
+
+# 商店、產品維度表：returns 只儲存整數鍵，名稱集中存放在維度表中
+DIMENSION_TABLES = {
+    'store_name': 'stores',
+    'product': 'products',
+}
+
+# SQLite 單一查詢可綁定的參數數量有限，分批查詢
+LOOKUP_BATCH_SIZE = 500
+
+
+class DimensionCache:
+    """行程內的名稱 → 整數鍵對照快取，避免每筆寫入都查詢維度表"""
+
+    def __init__(self, pool, table):
+        self.pool = pool
+        self.table = table
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, mapping):
+        with self._lock:
+            self._ids.update(mapping)
+
+    def _select_ids(self, conn, names):
+        found = {}
+        for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+            batch = names[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            for record_id, name in conn.execute(
+                f"SELECT id, name FROM {self.table} WHERE name IN ({placeholders})", batch
+            ):
+                found[name] = record_id
+        return found
+
+    def resolve(self, conn, names):
+        """在目前寫入交易中取得名稱的整數鍵，不存在的名稱會新增"""
+        with self._lock:
+            mapping = {name: self._ids[name] for name in names if name in self._ids}
+        missing = sorted(set(names) - set(mapping))
+        if not missing:
+            return mapping
+
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {self.table} (name) VALUES (?)",
+            [(name,) for name in missing]
+        )
+        resolved = self._select_ids(conn, missing)
+        mapping.update(resolved)
+        # 只有在交易提交後才寫入快取，避免回滾後留下不存在的鍵
+        self.pool.on_commit(lambda: self._remember(resolved))
+        return mapping
+
+    def lookup(self, name):
+        """查詢名稱的整數鍵（唯讀），名稱不存在時返回 None"""
+        with self._lock:
+            if name in self._ids:
+                return self._ids[name]
+        with self.pool.reader() as conn:
+            found = self._select_ids(conn, [name])
+        if name in found:
+            self._remember(found)
+        return found.get(name)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_dimension_cache(pool, column):
+    """取得（或建立）指定資料庫與欄位共用的維度快取"""
+    key = (os.path.abspath(pool.db_path), column)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None or cache.pool is not pool:
+            cache = DimensionCache(pool, DIMENSION_TABLES[column])
+            _caches[key] = cache
+        return cache
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from fastapi.responses import StreamingResponse
+
+from serialization import dumps
+
+# 保留最近的事件，斷線重連時依 Last-Event-ID 補送
+EVENT_HISTORY_SIZE = 256
+# 每個連線最多暫存的未送出事件，超過時改送 reset 要求客戶端重新載入
+SUBSCRIBER_QUEUE_SIZE = 100
+# 沒有事件時送出註解行，避免代理伺服器關閉閒置連線
+HEARTBEAT_SEC = 15
+# 單一連線的最長時間，到期後由 EventSource 自動重連（以 Last-Event-ID 補送期間的事件）
+EVENT_STREAM_MAX_SEC = 300
+# 客戶端斷線後等待多久重連
+RETRY_MS = 3000
+# 一次寫入超過此筆數時事件只帶筆數，不帶記錄內容
+EVENT_MAX_RECORDS = 100
+
+EVENT_STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+_RESET = object()
+
+
+def encode_event(event_id, event_type, data):
+    """編碼為 SSE 格式（dumps 的輸出不含換行，可直接放在一行 data 中）"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: ".encode('utf-8') + dumps(data) + b"\n\n"
+
+
+class _Subscriber:
+    """一個事件串流連線：事件由發布端執行緒放入所屬事件迴圈的佇列"""
+
+    def __init__(self, loop, queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, frame):
+        self.loop.call_soon_threadsafe(self._put, frame)
+
+    def _put(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # 客戶端跟不上時丟棄暫存的事件，只留下 reset
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESET)
+
+
+class EventBus:
+    """資料變更事件的發布與訂閱：寫入交易提交後發布，推送給所有開啟的儀表板"""
+
+    def __init__(self, history_size=EVENT_HISTORY_SIZE, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._stats = {
+            'published': 0,
+            'connections': 0,
+            'resets': 0,
+        }
+
+    def publish(self, event_type, data):
+        """發布事件（可在任何執行緒呼叫），每個事件只序列化一次"""
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            frame = encode_event(event_id, event_type, data)
+            self._history.append((event_id, frame))
+            self._stats['published'] += 1
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put(frame)
+            except RuntimeError:
+                # 事件迴圈已關閉
+                self.unsubscribe(subscriber)
+        return event_id
+
+    def subscribe(self, loop, last_event_id=None):
+        """登記一個連線，返回 (訂閱者, 需補送的事件, 是否需要 reset)"""
+        subscriber = _Subscriber(loop, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self._stats['connections'] += 1
+            backlog, reset = self._replay(last_event_id)
+            if reset:
+                self._stats['resets'] += 1
+        return subscriber, backlog, reset
+
+    def _replay(self, last_event_id):
+        if last_event_id is None:
+            return [], False
+        latest = self._next_id - 1
+        oldest = self._history[0][0] if self._history else self._next_id
+        # 事件編號不在保留範圍內（已被淘汰或來自重新啟動前的行程）時無法補送
+        if last_event_id > latest or last_event_id < oldest - 1:
+            return [], True
+        return [frame for event_id, frame in self._history if event_id > last_event_id], False
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def get_stats(self):
+        """取得事件推送統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+            stats['last_event_id'] = self._next_id - 1
+        return stats
+
+    async def stream(self, last_event_id=None, heartbeat_sec=HEARTBEAT_SEC, max_duration_sec=EVENT_STREAM_MAX_SEC):
+        """產生 SSE 內容：先補送斷線期間的事件，之後持續推送新事件"""
+        subscriber, backlog, reset = self.subscribe(asyncio.get_running_loop(), last_event_id)
+        deadline = time.monotonic() + max_duration_sec
+        try:
+            head = [f"retry: {RETRY_MS}\n\n".encode('utf-8')]
+            if reset:
+                head.append(self._reset_frame())
+            yield b''.join(head + backlog)
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), min(heartbeat_sec, remaining))
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if frame is _RESET:
+                    with self._lock:
+                        self._stats['resets'] += 1
+                    frame = self._reset_frame()
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _reset_frame(self):
+        # 以目前最新的事件編號作為 id，重新載入後從這裡繼續
+        with self._lock:
+            latest = self._next_id - 1
+        return encode_event(latest, 'reset', {})
+
+
+def event_stream_response(bus, last_event_id=None):
+    """以 text/event-stream 回應推送事件"""
+    return StreamingResponse(bus.stream(last_event_id), media_type='text/event-stream',
+                             headers=EVENT_STREAM_HEADERS)
+
+
+def parse_last_event_id(value):
+    """解析 Last-Event-ID 標頭，無效時返回 None"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_event_bus(db_path, **kwargs):
+    """取得（或建立）指定資料庫檔案共用的事件匯流排"""
+    key = os.path.abspath(db_path)
+    with _buses_lock:
+        bus = _buses.get(key)
+        if bus is None:
+            bus = EventBus(**kwargs)
+            _buses[key] = bus
+        return bus
@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# 阻塞的 SQLite 操作在有上限的執行緒池中執行，數量與連線池的讀取連線數一致
+DB_WORKERS = 8
+# 報告產生是 CPU 密集工作，在獨立行程中執行，避免佔用 Web 行程的 GIL
+REPORT_WORKERS = 2
+
+_db_executor = None
+_report_executor = None
+# 報告行程以此佇列回報進度，由 Web 行程的執行緒讀取
+_progress_queue = None
+_lock = threading.Lock()
+_stats = {
+    'db_submitted': 0,
+    'db_active': 0,
+    'report_submitted': 0,
+    'report_active': 0,
+}
+
+
+def get_db_executor():
+    """取得（或建立）共用的資料庫執行緒池"""
+    global _db_executor
+    with _lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+        return _db_executor
+
+
+def _get_progress_queue_locked():
+    global _progress_queue
+    if _progress_queue is None:
+        _progress_queue = multiprocessing.get_context("spawn").Queue()
+    return _progress_queue
+
+
+def get_progress_queue():
+    """取得報告進度佇列，項目為 (job_id, percent, stage)"""
+    with _lock:
+        return _get_progress_queue_locked()
+
+
+def get_report_executor(db_path=None):
+    """取得（或建立）共用的報告行程池；db_path 為建立時報告行程預先開啟唯讀連線池的資料庫"""
+    global _report_executor
+    with _lock:
+        if _report_executor is None:
+            # 使用 spawn，避免 fork 複製已開啟的 SQLite 連線與執行緒鎖
+            _report_executor = ProcessPoolExecutor(
+                max_workers=REPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_report_worker,
+                initargs=(_get_progress_queue_locked(), db_path)
+            )
+        return _report_executor
+
+
+_worker_progress_queue = None
+# 報告行程中各資料庫的連線池（只使用唯讀連線）
+_worker_pools = {}
+
+
+def _init_report_worker(progress_queue, db_path=None):
+    """報告行程啟動時保存進度佇列，並開啟資料庫的唯讀連線池"""
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+    if db_path is not None:
+        _worker_pool(db_path)
+
+
+def _worker_pool(db_path):
+    """報告行程中指定資料庫的連線池，每個行程只建立一次；
+    報告只讀取資料，不建立 DatabaseManager（不套用遷移、不取得寫入鎖、不啟動寫入佇列）"""
+    from db_pool import get_pool
+
+    pool = _worker_pools.get(db_path)
+    if pool is None:
+        pool = get_pool(db_path, max_readers=1)
+        _worker_pools[db_path] = pool
+    return pool
+
+
+def _progress_reporter(job_id):
+    """返回在報告行程中回報進度的函式，沒有工作 ID 時返回 None"""
+    if job_id is None or _worker_progress_queue is None:
+        return None
+
+    def report(percent, stage):
+        try:
+            _worker_progress_queue.put_nowait((job_id, int(percent), stage))
+        except Exception:
+            pass
+
+    return report
+
+
+def _track(kind, delta):
+    with _lock:
+        _stats[f'{kind}_active'] += delta
+        if delta > 0:
+            _stats[f'{kind}_submitted'] += 1
+
+
+def _run_tracked(kind, func):
+    _track(kind, 1)
+    try:
+        return func()
+    finally:
+        _track(kind, -1)
+
+
+async def run_db(func, *args, **kwargs):
+    """在資料庫執行緒池中執行阻塞操作，不佔用事件迴圈"""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    return await loop.run_in_executor(get_db_executor(), _run_tracked, 'db', call)
+
+
+def generate_report_job(db_path, report_type="comprehensive", job_id=None, params=None):
+    """在報告行程中讀取資料並產生報告（行程內建立自己的資料庫連線）"""
+    from database import read_export_snapshot
+    from report_agent import ReportAgent, normalize_report_params
+
+    progress = _progress_reporter(job_id)
+    if progress:
+        progress(0, "開始產生報告")
+
+    report_agent = ReportAgent()
+    params = normalize_report_params(params)
+
+    # 在同一個讀取交易中讀取版本、統計與記錄，報告內容對應單一資料版本；記錄由游標逐批寫入報告
+    with read_export_snapshot(_worker_pool(db_path), partition_by=params['partition_by']) as snapshot:
+        data_version = snapshot['data_version']
+        statistics_data = snapshot['statistics']
+        if progress:
+            progress(5, "讀取退貨資料")
+
+        if report_type == "simple":
+            report = report_agent.generate_simple_report(
+                snapshot['batches'], progress=progress, data_version=data_version,
+                returns_count=statistics_data['total_returns'], params=params)
+        else:
+            report = report_agent.generate_excel_report(
+                snapshot['batches'], statistics_data, progress=progress, data_version=data_version,
+                returns_count=statistics_data['total_returns'], params=params)
+
+    return {
+        'report': report,
+        'returns_count': report.get('data', {}).get('returns_count'),
+        'statistics': statistics_data,
+        'data_version': data_version
+    }
+
+
+def submit_report(db_path, report_type="comprehensive", job_id=None, params=None):
+    """將報告工作送到報告行程池，返回 concurrent.futures.Future"""
+    global _report_executor
+    try:
+        future = get_report_executor(db_path).submit(generate_report_job, db_path, report_type, job_id, params)
+    except BrokenProcessPool:
+        # 子行程異常結束後行程池無法再使用，重新建立一次
+        with _lock:
+            _report_executor = None
+        future = get_report_executor(db_path).submit(generate_report_job, db_path, report_type, job_id, params)
+
+    _track('report', 1)
+    future.add_done_callback(lambda _: _track('report', -1))
+    return future
+
+
+async def run_report(db_path, report_type="comprehensive", params=None):
+    """非同步等待報告行程完成"""
+    return await asyncio.wrap_future(submit_report(db_path, report_type, params=params))
+
+
+def get_executor_stats():
+    """取得執行緒池與行程池的使用狀況"""
+    with _lock:
+        stats = dict(_stats)
+    stats.update({'db_workers': DB_WORKERS, 'report_workers': REPORT_WORKERS})
+    return stats
+
+
+def shutdown_executors():
+    """關閉執行緒池與行程池"""
+    global _db_executor, _report_executor, _progress_queue
+    with _lock:
+        db_executor, _db_executor = _db_executor, None
+        report_executor, _report_executor = _report_executor, None
+        progress_queue, _progress_queue = _progress_queue, None
+    if db_executor is not None:
+        db_executor.shutdown(wait=True)
+    if report_executor is not None:
+        report_executor.shutdown(wait=True)
+    if progress_queue is not None:
+        # 通知讀取進度的執行緒結束
+        progress_queue.put(None)
@@ -0,0 +1,132 @@
+import threading
+import time
+
+from db_pool import PoolTimeoutError
+
+# 詳細系統狀態的背景更新間隔
+STATUS_REFRESH_SEC = 5.0
+# 就緒檢查等待資料庫連線的上限
+READY_PING_TIMEOUT_SEC = 1.0
+# 狀態超過幾個更新間隔未更新時視為背景更新已停止
+STATUS_STALE_INTERVALS = 3
+
+
+class StatusMonitor:
+    """在背景定期更新詳細系統狀態，狀態查詢與健康檢查只讀取最近一次的結果，每次請求的成本固定"""
+
+    def __init__(self, build_status, db_manager, refresh_sec=STATUS_REFRESH_SEC):
+        # build_status() 返回 {'status': ..., 'data': ...}，由背景執行緒呼叫
+        self.build_status = build_status
+        self.db_manager = db_manager
+        self.refresh_sec = refresh_sec
+        self._status = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'last_refresh_ms': 0.0,
+        }
+
+    def start(self):
+        """啟動背景更新執行緒"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="status-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景更新執行緒"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.refresh_sec)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_sec)
+
+    def refresh(self):
+        """重新產生詳細狀態（同時只有一個更新在執行）"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            try:
+                status = self.build_status()
+            except Exception as e:
+                print(f"系統狀態更新失敗: {e}")
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+                return
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._status = status
+                self._refreshed_at = time.time()
+                self._stats['refreshes'] += 1
+                self._stats['last_refresh_ms'] = round(elapsed_ms, 3)
+
+    def get_status(self):
+        """取得最近一次的詳細狀態（尚未產生過時先同步產生一次），附上更新時間"""
+        with self._lock:
+            status, refreshed_at = self._status, self._refreshed_at
+        if status is None:
+            self.refresh()
+            with self._lock:
+                status, refreshed_at = self._status, self._refreshed_at
+            if status is None:
+                return {'status': 'error', 'message': '系統狀態尚未產生'}, None
+
+        result = dict(status)
+        if isinstance(result.get('data'), dict):
+            data = dict(result['data'])
+            data['monitor'] = self._monitor_info(refreshed_at)
+            result['data'] = data
+        return result, refreshed_at
+
+    def _monitor_info(self, refreshed_at):
+        with self._lock:
+            info = dict(self._stats)
+        age = time.time() - refreshed_at if refreshed_at else None
+        info.update({
+            'refresh_sec': self.refresh_sec,
+            'refreshed_at': refreshed_at,
+            'age_sec': round(age, 3) if age is not None else None,
+            'stale': age is None or age > self.refresh_sec * STATUS_STALE_INTERVALS,
+        })
+        return info
+
+    def cached_reports_count(self):
+        """最近一次狀態中的報告數量，尚未產生時返回 None"""
+        with self._lock:
+            status = self._status
+        try:
+            return status['data']['reports']['reports_count']
+        except (TypeError, KeyError):
+            return None
+
+    def check_readiness(self, ping_timeout=READY_PING_TIMEOUT_SEC):
+        """就緒檢查：一次連線池 ping（讀取 metadata 中的記錄總數）加上快取的報告數量，返回 (是否就緒, 詳細結果)"""
+        checks = {}
+        try:
+            returns_count, latency_ms = self.db_manager.ping(timeout=ping_timeout)
+            checks['database'] = {'status': 'ok', 'returns_count': returns_count, 'latency_ms': latency_ms}
+        except PoolTimeoutError as e:
+            checks['database'] = {'status': 'timeout', 'error': str(e)}
+        except Exception as e:
+            checks['database'] = {'status': 'error', 'error': str(e)}
+
+        with self._lock:
+            refreshed_at = self._refreshed_at
+        monitor = self._monitor_info(refreshed_at)
+        # 背景狀態停止更新不影響處理請求，只標記為 stale
+        checks['status_monitor'] = {
+            'status': 'stale' if monitor['stale'] else 'ok',
+            'age_sec': monitor['age_sec'],
+        }
+        checks['reports'] = {'reports_count': self.cached_reports_count()}
+
+        ready = checks['database']['status'] == 'ok'
+        return ready, {'status': 'ready' if ready else 'unavailable', 'checks': checks}
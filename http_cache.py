@@ -0,0 +1,62 @@
+import hashlib
+import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Response
+
+# 回應可以快取，但每次使用前都必須以 ETag 向伺服器確認
+CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts):
+    """以資料版本與請求參數組成弱 ETag"""
+    raw = json.dumps(parts, ensure_ascii=False, default=str, sort_keys=True)
+    return 'W/"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def _strip_weak(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def _etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    # 弱比較：忽略 W/ 前綴
+    return _strip_weak(etag) in [_strip_weak(tag) for tag in header.split(',')]
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """依 If-None-Match（優先）或 If-Modified-Since 判斷客戶端的副本是否仍有效"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    # Last-Modified 只到秒，同一秒內可能還有寫入，不以時間判斷
+    if if_modified_since and last_modified is not None and int(last_modified) < int(time.time()):
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cache_headers(etag, last_modified=None):
+    """返回 ETag、Last-Modified 與 Cache-Control 標頭"""
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if last_modified is not None:
+        headers['Last-Modified'] = formatdate(int(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified_response(etag, last_modified=None):
+    """304 Not Modified 回應（不含內容）"""
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
+
+
+def set_cache_headers(response, etag, last_modified=None):
+    """將驗證標頭加到回應上"""
+    response.headers.update(cache_headers(etag, last_modified))
+    return response
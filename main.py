@@ -2,25 +2,58 @@ from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi import Request
+from fastapi import Request, Response
 import uvicorn
+import asyncio
 import os
 import json
 from datetime import datetime
+from typing import Optional
+from contextlib import asynccontextmanager
 
-from mcp_coordinator import MCPCoordinator
-from database import DatabaseManager
+from mcp_coordinator import MCPCoordinator, normalize_dashboard_fields
+from database import DatabaseManager, MAX_BULK_ITEMS, RETURNS_COLUMNS, normalize_return_date
+from executors import run_db, shutdown_executors
+from streaming import negotiate_stream_format, stream_rows, stream_writer, StreamWritersBusyError
+from http_cache import make_etag, is_not_modified, not_modified_response, set_cache_headers
+from serialization import FastJSONResponse, json_response
+from compression import CompressionMiddleware
+from report_jobs import get_job_manager, describe_submission, JobQueueFullError
+from report_agent import normalize_report_params, REPORT_PREFIXES, DETAIL_COLUMNS, SIMPLE_COLUMNS
+from report_catalog import get_report_catalog
+from events import event_stream_response, parse_last_event_id
+from health import StatusMonitor
+
+@asynccontextmanager
+async def lifespan(app):
+    """啟動時開始背景更新系統狀態與報告保留政策，結束時停止並關閉資料庫執行緒池與報告行程池"""
+    status_monitor.start()
+    report_catalog.start()
+    yield
+    report_catalog.stop()
+    status_monitor.stop()
+    shutdown_executors()
 
 # 建立 FastAPI 應用程式
 app = FastAPI(
     title="退貨與保固分析系統",
     description="基於 MCP 風格的 Python 應用程式，包含兩個協作的 agent",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# 依 Accept-Encoding 壓縮回應（brotli / gzip），小於門檻的回應不壓縮
+app.add_middleware(CompressionMiddleware)
+
 # 初始化 MCP Coordinator
 coordinator = MCPCoordinator()
 db_manager = DatabaseManager()
+job_manager = get_job_manager(db_manager.db_path)
+# 報告列表查詢報告目錄表格，舊報告由背景執行緒依保留政策刪除
+report_catalog = get_report_catalog(db_manager.db_path)
+# 詳細系統狀態由背景執行緒定期更新，/api/status 與 /readyz 只讀取最近的結果
+status_monitor = StatusMonitor(coordinator.get_system_status, db_manager)
 
 # 建立必要的目錄
 os.makedirs("reports", exist_ok=True)
@@ -41,13 +74,28 @@ async def root(request: Request):
     """首頁"""
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/healthz")
+async def liveness():
+    """存活檢查：不存取資料庫或檔案，只確認服務可以回應"""
+    return json_response({"status": "ok"}, headers={"Cache-Control": "no-store"})
+
+@app.get("/readyz")
+async def readiness():
+    """就緒檢查：一次連線池 ping 與快取的報告數量，成本與資料量無關；資料庫無法使用時返回 503"""
+    ready, result = await run_db(status_monitor.check_readiness)
+    return json_response(result, status_code=200 if ready else 503, headers={"Cache-Control": "no-store"})
+
 @app.get("/api/status")
-async def get_status():
-    """獲取系統狀態"""
+async def get_status(request: Request, response: Response):
+    """獲取系統狀態（由背景定期更新，請求只讀取最近一次的結果；結果未更新時返回 304）"""
     try:
-        print("獲取系統狀態...")
-        status = coordinator.get_system_status()
-        print(f"系統狀態: {status}")
+        status, refreshed_at = await run_db(status_monitor.get_status)
+        etag = make_etag('status', refreshed_at)
+        last_modified = int(refreshed_at) if refreshed_at is not None else None
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        set_cache_headers(response, etag, last_modified)
         return status
     except Exception as e:
         print(f"獲取系統狀態失敗: {e}")
@@ -59,6 +107,38 @@ async def get_status():
             "details": str(e)
         }
 
+def dashboard_last_modified(updated_at, refreshed_at):
+    """儀表板的最後修改時間：資料寫入時間與系統狀態更新時間中較晚者"""
+    times = [int(value) for value in (updated_at, refreshed_at) if value is not None]
+    return max(times) if times else None
+
+@app.get("/api/dashboard")
+async def get_dashboard(request: Request, fields: Optional[str] = None, limit: Optional[int] = None):
+    """一次返回儀表板需要的區塊（fields 以逗號選擇 status、statistics、returns、reports，預設全部），
+    資料區塊來自同一個讀取交易，status 來自背景更新的系統狀態；資料、報告目錄與系統狀態都未變更時返回 304"""
+    try:
+        fields = normalize_dashboard_fields(fields)
+        data_version, updated_at = await run_db(db_manager.get_data_validators)
+        reports_version = await run_db(report_catalog.get_version) if 'reports' in fields else None
+        status, refreshed_at = None, None
+        if 'status' in fields:
+            status, refreshed_at = await run_db(status_monitor.get_status)
+            status = status.get('data')
+        etag = make_etag('dashboard', data_version, reports_version, refreshed_at, fields, limit)
+        last_modified = dashboard_last_modified(updated_at, refreshed_at)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        result = await run_db(coordinator.get_dashboard, fields, limit, status)
+        # 以快照實際讀到的版本產生 ETag（可能比上面檢查時更新）
+        data = result['data']
+        etag = make_etag('dashboard', data['data_version'], data.get('reports_version'), refreshed_at, fields, limit)
+        return set_cache_headers(json_response(result), etag, dashboard_last_modified(data['updated_at'], refreshed_at))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/help")
 async def get_help():
     """獲取使用說明"""
@@ -66,18 +146,36 @@ async def get_help():
 
 @app.post("/api/process")
 async def process_request(request: Request):
-    """處理自然語言請求"""
+    """處理自然語言請求（查詢可依 Accept 或 format 以 NDJSON/CSV 串流返回全部結果）"""
     try:
         body = await request.json()
         user_input = body.get("input", "")
         operation_type = body.get("operation_type")
+        limit = body.get("limit")
+        cursor = body.get("cursor")
+        since_version = body.get("since_version")
         
         if not user_input:
             raise HTTPException(status_code=400, detail="請提供輸入內容")
         
-        result = coordinator.process_request(user_input, operation_type)
-        return result
-        
+        try:
+            stream_format = negotiate_stream_format(request.headers.get("accept"), body.get("format"))
+            if stream_format:
+                batches = await run_db(coordinator.stream_request, user_input, operation_type, cursor=cursor)
+                if batches is not None:
+                    return stream_rows(batches, stream_format, filename="query", columns=RETURNS_COLUMNS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        result = await run_db(coordinator.process_request, user_input, operation_type, limit=limit, cursor=cursor)
+        
+        # 寫入操作附上客戶端版本之後的變更，供增量更新
+        if since_version is not None and isinstance(result.get('data'), dict) and 'data_version' in result['data']:
+            result['data']['changes'] = await run_db(db_manager.get_changes_since, since_version)
+        return json_response(result)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -86,49 +184,184 @@ async def add_return(
     order_id: str = Form(...),
     product: str = Form(...),
     store_name: str = Form(...),
-    return_date: str = Form(...)
+    return_date: str = Form(...),
+    since_version: Optional[int] = Form(None)
 ):
-    """新增退貨記錄"""
+    """新增退貨記錄，返回新記錄與資料版本（提供 since_version 時一併返回之後的變更）"""
     try:
-        # 驗證日期格式
-        datetime.strptime(return_date, '%Y-%m-%d')
+        # 驗證日期格式（與批次新增相同的規則）
+        return_date = normalize_return_date(return_date)
+        
+        # 插入資料庫（等待寫入佇列提交，不佔用資料庫執行緒）
+        record_id = await asyncio.wrap_future(db_manager.submit_return(order_id, product, store_name, return_date))
+        
+        # 只返回新記錄，不再序列化整個表格
+        record = await run_db(db_manager.get_return, record_id)
+        data = {
+            "record_id": record_id,
+            "record": record,
+            "data_version": record['version'] if record else await run_db(db_manager.get_data_version)
+        }
+        if since_version is not None:
+            data["changes"] = await run_db(db_manager.get_changes_since, since_version)
         
-        # 插入資料庫
-        record_id = db_manager.insert_return(order_id, product, store_name, return_date)
+        return {
+            "status": "success",
+            "message": f"成功新增退貨記錄，記錄ID: {record_id}",
+            "data": data
+        }
         
-        # 獲取當前所有退貨記錄
-        all_returns = db_manager.get_all_returns()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/returns")
+async def get_returns(request: Request, limit: Optional[int] = None, cursor: Optional[str] = None,
+                      format: Optional[str] = None):
+    """分頁獲取退貨記錄（以 next_cursor 取得下一頁）；Accept 或 format 為 NDJSON/CSV 時串流返回全部記錄"""
+    try:
+        stream_format = negotiate_stream_format(request.headers.get("accept"), format)
+        data_version, updated_at = await run_db(db_manager.get_data_validators)
+        etag = make_etag('returns', data_version, limit, cursor, stream_format)
+        if is_not_modified(request, etag, updated_at):
+            return not_modified_response(etag, updated_at)
+        
+        if stream_format:
+            batches = db_manager.iter_returns(cursor=cursor)
+            streaming_response = stream_rows(batches, stream_format, filename="returns", columns=RETURNS_COLUMNS)
+            return set_cache_headers(streaming_response, etag, updated_at)
+        
+        page = await run_db(db_manager.get_returns_page, limit=limit, cursor=cursor)
+        # 直接序列化，略過 jsonable_encoder
+        return set_cache_headers(json_response({
+            "status": "success",
+            "data": page['records'],
+            "pagination": {
+                "limit": page['limit'],
+                "has_more": page['has_more'],
+                "next_cursor": page['next_cursor']
+            }
+        }), etag, updated_at)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def parse_bulk_body(body, content_type=""):
+    """解析 JSON 陣列或 NDJSON（每行一個物件），返回 (項目, 原始位置, 解析錯誤)"""
+    text = body.decode("utf-8-sig")
+    if "ndjson" not in content_type and "jsonl" not in content_type and text.lstrip().startswith("["):
+        items = json.loads(text)
+        return items, list(range(len(items))), []
+    
+    items, positions, errors = [], [], []
+    for index, line in enumerate(line for line in text.splitlines() if line.strip()):
+        try:
+            items.append(json.loads(line))
+            positions.append(index)
+        except json.JSONDecodeError as e:
+            errors.append({"index": index, "error": f"JSON 格式錯誤: {e.msg}"})
+    return items, positions, errors
+
+@app.post("/api/returns/bulk")
+async def bulk_insert_returns(request: Request):
+    """批次新增退貨記錄（JSON 陣列或 NDJSON），只返回筆數、記錄ID與錯誤"""
+    try:
+        body = await request.body()
+        try:
+            items, positions, parse_errors = parse_bulk_body(body, request.headers.get("content-type", ""))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"無法解析請求內容: {e}")
+        
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="請提供 JSON 陣列或 NDJSON")
+        if len(items) + len(parse_errors) > MAX_BULK_ITEMS:
+            raise HTTPException(status_code=413, detail=f"單次最多 {MAX_BULK_ITEMS} 筆")
+        
+        result = await run_db(db_manager.insert_returns_bulk, items, positions)
+        errors = sorted(parse_errors + result['errors'], key=lambda e: e['index'])
+        
+        return {
+            "status": "success" if result['inserted_count'] else "error",
+            "message": f"成功新增 {result['inserted_count']} 筆退貨記錄，{len(errors)} 筆失敗",
+            "data": {
+                "inserted_count": result['inserted_count'],
+                "total_rows": result['total_rows'] + len(parse_errors),
+                "error_count": len(errors),
+                "errors": errors[:1000],
+                "ids": result['ids'],
+                "data_version": await run_db(db_manager.get_data_version)
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/returns/changes")
+async def get_returns_changes(since_version: int, limit: Optional[int] = None):
+    """獲取資料版本 since_version 之後新增與刪除的記錄"""
+    try:
+        return json_response({
+            "status": "success",
+            "data": await run_db(db_manager.get_changes_since, since_version, limit)
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/events")
+async def stream_events(request: Request, last_event_id: Optional[int] = None):
+    """以 Server-Sent Events 推送寫入提交後的變更（新增/刪除的記錄、統計數量、新報告）；
+    重連時依 Last-Event-ID 補送期間的事件，無法補送時送出 reset 要求重新載入"""
+    if last_event_id is None:
+        last_event_id = parse_last_event_id(request.headers.get("last-event-id"))
+    return event_stream_response(db_manager.events, last_event_id)
+
+@app.delete("/api/returns/{record_id}")
+async def delete_return(record_id: int):
+    """刪除退貨記錄"""
+    try:
+        if not await run_db(db_manager.delete_return, record_id):
+            raise HTTPException(status_code=404, detail="退貨記錄不存在")
         
         return {
             "status": "success",
-            "message": f"成功新增退貨記錄，記錄ID: {record_id}",
+            "message": f"成功刪除退貨記錄，記錄ID: {record_id}",
             "data": {
                 "record_id": record_id,
-                "all_returns": all_returns.to_dict('records')
+                "data_version": await run_db(db_manager.get_data_version)
             }
         }
         
-    except ValueError:
-        raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/returns")
-async def get_returns():
-    """獲取所有退貨記錄"""
+@app.post("/api/statistics/verify")
+async def verify_statistics(repair: bool = False):
+    """檢查統計彙總表一致性（repair=true 時重建）"""
     try:
-        returns = db_manager.get_all_returns()
         return {
             "status": "success",
-            "data": returns.to_dict('records')
+            "data": await run_db(db_manager.verify_statistics, repair=repair)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/statistics")
-async def get_statistics():
-    """獲取統計資料"""
+async def get_statistics(request: Request):
+    """獲取統計資料（資料版本未變更時返回 304）"""
     try:
+        data_version, updated_at = await run_db(db_manager.get_data_validators)
+        etag = make_etag('statistics', data_version)
+        if is_not_modified(request, etag, updated_at):
+            return not_modified_response(etag, updated_at)
+        
         print("🔍 開始獲取統計資料...")
         
         # 檢查資料庫管理器是否正常
@@ -143,7 +376,7 @@ async def get_statistics():
         # 獲取統計資料
         print("📊 調用資料庫統計方法...")
         try:
-            stats = db_manager.get_statistics()
+            stats = await run_db(db_manager.get_statistics)
             print(f"📈 資料庫返回的統計資料: {stats}")
         except Exception as db_error:
             print(f"❌ 資料庫統計方法調用失敗: {db_error}")
@@ -183,7 +416,7 @@ async def get_statistics():
                     "data": stats
                 }
                 print(f"🎉 返回成功結果: {result}")
-                return result
+                return set_cache_headers(json_response(result), etag, updated_at)
             else:
                 print(f"❌ 統計資料缺少欄位: {missing_fields}")
                 return {
@@ -217,74 +450,122 @@ async def upload_csv(file: UploadFile = File(...)):
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="只支援 CSV 檔案")
         
-        # 儲存檔案
+        # 分段儲存檔案，避免整個檔案載入記憶體
         file_path = os.path.join("uploads", file.filename)
         with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+            while True:
+                chunk = await file.read(1024 * 1024)
+                if not chunk:
+                    break
+                buffer.write(chunk)
         
-        # 導入資料
-        imported_count = db_manager.import_csv_data(file_path)
+        # 串流導入資料
+        import_result = await run_db(db_manager.import_csv_stream, file_path)
+        imported_count = import_result['inserted_count']
         
         return {
             "status": "success",
             "message": f"成功導入 {imported_count} 筆退貨記錄",
             "data": {
                 "filename": file.filename,
-                "imported_count": imported_count
+                "imported_count": imported_count,
+                "total_rows": import_result['total_rows'],
+                "error_count": import_result['error_count'],
+                "errors": import_result['errors'][:100],
+                "rows_per_sec": import_result['rows_per_sec']
             }
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/generate_report")
-async def generate_report(report_type: str = Form("comprehensive")):
-    """生成報告"""
+@app.post("/api/generate_report", status_code=202)
+async def generate_report(
+    report_type: str = Form("comprehensive"),
+    partition_by: Optional[str] = Form(None),
+    sheet_row_limit: Optional[int] = Form(None)
+):
+    """提交報告工作並立即返回工作 ID（以 /api/jobs/{job_id} 查詢進度）
+    
+    partition_by 可為 store 或 month，讓每個商店或月份的詳細資料各自使用工作表；
+    sheet_row_limit 為每個詳細資料工作表的列數上限，超過時分到新的工作表
+    """
     try:
-        print(f"開始生成報告，類型: {report_type}")
-        
-        # 獲取退貨資料和統計資料
-        returns_data = db_manager.get_all_returns()
-        statistics_data = db_manager.get_statistics()
+        report_type = "simple" if report_type == "simple" else "comprehensive"
+        params = normalize_report_params({'partition_by': partition_by, 'sheet_row_limit': sheet_row_limit})
+        print(f"提交報告工作，類型: {report_type}，參數: {params}")
         
-        print(f"退貨資料類型: {type(returns_data)}")
-        print(f"退貨資料長度: {len(returns_data) if returns_data is not None else 'None'}")
-        print(f"統計資料: {statistics_data}")
+        # 同一資料版本與參數已有進行中的工作時，併入該工作
+        data_version = await run_db(db_manager.get_data_version)
+        job, created = await run_db(job_manager.submit, report_type, data_version, params)
         
-        # 將 DataFrame 轉換為字典列表
-        if returns_data is not None and not returns_data.empty:
-            returns_list = returns_data.to_dict('records')
-            print(f"轉換後的資料長度: {len(returns_list)}")
-        else:
-            returns_list = []
-            print("沒有退貨資料")
-        
-        if report_type == "simple":
-            print("生成簡單報告...")
-            result = coordinator.report_agent.generate_simple_report(returns_list)
-        else:
-            print("生成完整報告...")
-            result = coordinator.report_agent.generate_excel_report(returns_list, statistics_data)
-        
-        print(f"報告生成結果: {result}")
+        return {
+            "status": "success",
+            "message": describe_submission(job, created),
+            "data": job.to_dict()
+        }
         
-        if result['status'] == 'success':
-            return {
-                "status": "success",
-                "message": result['message'],
-                "data": result['data']
-            }
-        else:
-            print(f"報告生成失敗: {result['message']}")
-            raise HTTPException(status_code=500, detail=result['message'])
-            
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"生成報告時發生錯誤: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/jobs")
+async def list_jobs(limit: int = 50):
+    """列出最近的報告工作"""
+    return {
+        "status": "success",
+        "data": {
+            "jobs": job_manager.list_jobs(max(1, min(limit, 200))),
+            "stats": job_manager.get_stats()
+        }
+    }
+
+def get_job_or_404(job_id):
+    """取得報告工作，不存在時返回 404"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="報告工作不存在")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查詢報告工作狀態，完成時包含下載連結"""
+    return {
+        "status": "success",
+        "data": get_job_or_404(job_id).to_dict()
+    }
+
+@app.get("/api/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str):
+    """查詢報告工作進度（輕量，適合輪詢）"""
+    return {
+        "status": "success",
+        "data": get_job_or_404(job_id).progress_dict()
+    }
+
+@app.get("/api/jobs/{job_id}/download")
+async def download_job_report(job_id: str):
+    """下載已完成工作的報告檔案"""
+    job = get_job_or_404(job_id)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"報告尚未完成（目前狀態: {job.status}）")
+    
+    file_path = job_manager.report_path(job)
+    if file_path is None:
+        raise HTTPException(status_code=410, detail="報告檔案已不存在")
+    
+    return FileResponse(
+        path=file_path,
+        filename=job.result['filename'],
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
 @app.get("/api/download_report/{filename}")
 async def download_report(filename: str):
     """下載報告檔案"""
@@ -303,32 +584,68 @@ async def download_report(filename: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/reports")
-async def list_reports():
-    """列出所有報告檔案"""
+async def list_reports(request: Request, limit: Optional[int] = None, cursor: Optional[str] = None,
+                       report_type: Optional[str] = None):
+    """分頁列出報告（依建立時間由新到舊，以 next_cursor 取得下一頁，可依 report_type 篩選）；
+    報告目錄未變更時返回 304"""
     try:
-        reports_dir = "reports"
-        if not os.path.exists(reports_dir):
-            return {"status": "success", "data": []}
-        
-        reports = []
-        for filename in os.listdir(reports_dir):
-            if filename.endswith('.xlsx'):
-                file_path = os.path.join(reports_dir, filename)
-                file_stat = os.stat(file_path)
-                reports.append({
-                    "filename": filename,
-                    "size": file_stat.st_size,
-                    "created_at": datetime.fromtimestamp(file_stat.st_ctime).isoformat()
-                })
-        
-        # 按建立時間排序
-        reports.sort(key=lambda x: x['created_at'], reverse=True)
+        reports_version = await run_db(report_catalog.get_version)
+        etag = make_etag('reports', reports_version, limit, cursor, report_type)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
         
-        return {
+        page = await run_db(report_catalog.list_reports, limit=limit, cursor=cursor, report_type=report_type)
+        return set_cache_headers(json_response({
             "status": "success",
-            "data": reports
-        }
+            "data": page['reports'],
+            "pagination": {
+                "limit": page['limit'],
+                "has_more": page['has_more'],
+                "next_cursor": page['next_cursor']
+            }
+        }), etag)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/reports/export")
+async def export_report(
+    report_type: str = "comprehensive",
+    format: str = "xlsx",
+    partition_by: Optional[str] = None,
+    sheet_row_limit: Optional[int] = None
+):
+    """產生報告並直接串流到回應（不儲存到 reports/、不需再下載一次），適合一次性匯出
+    
+    format 為 xlsx（預設，與 /api/generate_report 相同的工作簿）、csv 或 ndjson（只有記錄，邊讀邊送）；
+    內容來自同一個讀取交易，記憶體用量與筆數無關
+    """
+    try:
+        report_type = "simple" if report_type == "simple" else "comprehensive"
+        params = normalize_report_params({'partition_by': partition_by, 'sheet_row_limit': sheet_row_limit})
+        filename = f"{REPORT_PREFIXES[report_type]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
+        if format.lower() == "xlsx":
+            print(f"串流匯出報告，類型: {report_type}，參數: {params}")
+            return stream_writer(
+                lambda out: coordinator.export_report(out, report_type, params),
+                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                filename=f"{filename}.xlsx"
+            )
+        
+        stream_format = negotiate_stream_format(None, format)
+        if stream_format is None:
+            raise ValueError(f"不支援的輸出格式: {format}")
+        columns = [field for field, _, _ in (SIMPLE_COLUMNS if report_type == "simple" else DETAIL_COLUMNS)]
+        batches = db_manager.iter_export(partition_by=params['partition_by'])
+        return stream_rows(batches, stream_format, filename=filename, columns=columns)
+        
+    except StreamWritersBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -342,7 +659,7 @@ async def execute_workflow(request: Request):
         if not workflow_steps:
             raise HTTPException(status_code=400, detail="請提供工作流程步驟")
         
-        result = coordinator.execute_workflow(workflow_steps)
+        result = await run_db(coordinator.execute_workflow, workflow_steps)
         return result
         
     except Exception as e:
@@ -370,7 +687,7 @@ async def create_sample_data():
         df.to_csv(csv_path, index=False, encoding='utf-8')
         
         # 導入到資料庫
-        imported_count = db_manager.import_csv_data(csv_path)
+        imported_count = await run_db(db_manager.import_csv_data, csv_path)
         
         return {
             "status": "success",
@@ -1,14 +1,34 @@
 from retrieval_agent import RetrievalAgent
-from report_agent import ReportAgent
+from report_agent import ReportAgent, normalize_report_params
+from report_catalog import get_report_catalog, read_reports_page, read_catalog_totals
 from database import DatabaseManager
+from executors import get_executor_stats
+from report_jobs import get_job_manager, describe_submission
 import json
 
+# 儀表板可選擇的區塊
+DASHBOARD_SECTIONS = ['status', 'statistics', 'returns', 'reports']
+
+
+def normalize_dashboard_fields(fields=None):
+    """解析儀表板區塊（逗號分隔字串或列表），未指定時返回全部區塊，有不支援的區塊時拋出 ValueError"""
+    if not fields:
+        return list(DASHBOARD_SECTIONS)
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    requested = {field.strip() for field in fields if field.strip()}
+    unknown = requested - set(DASHBOARD_SECTIONS)
+    if unknown:
+        raise ValueError(f"不支援的儀表板區塊: {', '.join(sorted(unknown))}（可用: {', '.join(DASHBOARD_SECTIONS)}）")
+    return [field for field in DASHBOARD_SECTIONS if field in requested] or list(DASHBOARD_SECTIONS)
+
 class MCPCoordinator:
     def __init__(self):
         """初始化 MCP Coordinator 和兩個 agent"""
         self.retrieval_agent = RetrievalAgent()
         self.report_agent = ReportAgent()
         self.db_manager = DatabaseManager()
+        self.report_catalog = get_report_catalog(self.db_manager.db_path)
         
         # 定義可用的操作類型
         self.available_operations = {
@@ -24,7 +44,7 @@ class MCPCoordinator:
             ]
         }
     
-    def process_request(self, user_input, operation_type=None):
+    def process_request(self, user_input, operation_type=None, limit=None, cursor=None):
         """處理使用者請求，協調兩個 agent"""
         try:
             # 如果沒有指定操作類型，嘗試自動識別
@@ -33,7 +53,7 @@ class MCPCoordinator:
             
             # 根據操作類型分發給相應的 agent
             if operation_type in self.available_operations['retrieval']:
-                return self._handle_retrieval_operation(user_input, operation_type)
+                return self._handle_retrieval_operation(user_input, operation_type, limit=limit, cursor=cursor)
             elif operation_type in self.available_operations['report']:
                 return self._handle_report_operation(user_input, operation_type)
             else:
@@ -49,6 +69,14 @@ class MCPCoordinator:
                 'message': f'處理請求時發生錯誤: {str(e)}'
             }
     
+    def stream_request(self, user_input, operation_type=None, cursor=None):
+        """查詢請求以逐批產生結果的迭代器返回（串流輸出），其他操作返回 None"""
+        if not operation_type:
+            operation_type = self._identify_operation_type(user_input)
+        if operation_type != 'query_returns':
+            return None
+        return self.retrieval_agent.stream_query(user_input, cursor=cursor)
+    
     def _identify_operation_type(self, user_input):
         """自動識別操作類型"""
         input_lower = user_input.lower()
@@ -70,12 +98,12 @@ class MCPCoordinator:
         # 預設為查詢操作
         return 'query_returns'
     
-    def _handle_retrieval_operation(self, user_input, operation_type):
+    def _handle_retrieval_operation(self, user_input, operation_type, limit=None, cursor=None):
         """處理 Retrieval Agent 相關操作"""
         if operation_type == 'add_return':
             return self.retrieval_agent.process_natural_language(user_input)
         elif operation_type == 'query_returns':
-            return self.retrieval_agent.process_natural_language(user_input)
+            return self.retrieval_agent.process_natural_language(user_input, limit=limit, cursor=cursor)
         elif operation_type == 'import_csv':
             return self.retrieval_agent.process_natural_language(user_input)
         elif operation_type == 'get_statistics':
@@ -89,62 +117,18 @@ class MCPCoordinator:
     def _handle_report_operation(self, user_input, operation_type):
         """處理 Report Agent 相關操作"""
         try:
-            if operation_type == 'generate_report':
-                # 獲取退貨資料和統計資料
-                returns_result = self.retrieval_agent.get_current_returns()
-                statistics_result = self.retrieval_agent._get_statistics()
-                
-                if returns_result['status'] == 'success' and statistics_result['status'] == 'success':
-                    returns_data = returns_result['data']
-                    statistics_data = statistics_result['data']
-                    
-                    # 生成完整報告
-                    report_result = self.report_agent.generate_excel_report(
-                        returns_data, statistics_data
-                    )
-                    
-                    return {
-                        'status': 'success',
-                        'message': '報告生成完成',
-                        'data': {
-                            'report': report_result,
-                            'returns_count': len(returns_data),
-                            'statistics': statistics_data
-                        }
-                    }
-                else:
-                    return {
-                        'status': 'error',
-                        'message': '無法獲取資料來生成報告',
-                        'details': {
-                            'returns_status': returns_result.get('status'),
-                            'statistics_status': statistics_result.get('status')
-                        }
-                    }
-            
-            elif operation_type == 'generate_simple_report':
-                # 獲取退貨資料
-                returns_result = self.retrieval_agent.get_current_returns()
+            # 報告交給背景工作佇列產生，這裡只返回工作 ID 與查詢進度的連結
+            if operation_type in ('generate_report', 'generate_simple_report'):
+                report_type = 'simple' if operation_type == 'generate_simple_report' else 'comprehensive'
+                job_manager = get_job_manager(self.db_manager.db_path)
+                job, created = job_manager.submit(report_type, self.db_manager.get_data_version())
+                label = '簡單報告' if report_type == 'simple' else '報告'
                 
-                if returns_result['status'] == 'success':
-                    returns_data = returns_result['data']
-                    
-                    # 生成簡單報告
-                    report_result = self.report_agent.generate_simple_report(returns_data)
-                    
-                    return {
-                        'status': 'success',
-                        'message': '簡單報告生成完成',
-                        'data': {
-                            'report': report_result,
-                            'returns_count': len(returns_data)
-                        }
-                    }
-                else:
-                    return {
-                        'status': 'error',
-                        'message': '無法獲取退貨資料來生成報告'
-                    }
+                return {
+                    'status': 'success',
+                    'message': describe_submission(job, created, label),
+                    'data': job.to_dict()
+                }
             
             else:
                 return {
@@ -159,54 +143,25 @@ class MCPCoordinator:
             }
     
     def get_system_status(self):
-        """獲取系統狀態"""
+        """獲取系統狀態（由 StatusMonitor 在背景定期呼叫，成功時不輸出紀錄）"""
         try:
-            print("檢查系統狀態...")
-            
-            # 檢查資料庫狀態
+            # 檢查資料庫狀態（筆數讀取寫入時維護的 metadata，不掃描記錄）
             try:
-                returns_data = self.db_manager.get_all_returns()
-                returns_count = len(returns_data) if returns_data is not None else 0
+                returns_count = self.db_manager.get_returns_count()
                 db_status = 'connected'
-                print(f"資料庫狀態: {db_status}, 退貨記錄數: {returns_count}")
             except Exception as db_error:
                 print(f"資料庫檢查失敗: {db_error}")
                 returns_count = 0
                 db_status = 'error'
             
-            # 檢查報告目錄
-            import os
-            reports_dir = "reports"
+            # 報告數量與大小讀取報告目錄表格，不掃描 reports/ 目錄
             try:
-                if os.path.exists(reports_dir):
-                    reports_count = len([f for f in os.listdir(reports_dir) if f.endswith('.xlsx')])
-                    print(f"報告目錄: {reports_dir}, 報告數量: {reports_count}")
-                else:
-                    reports_count = 0
-                    print(f"報告目錄不存在: {reports_dir}")
-            except Exception as dir_error:
-                print(f"報告目錄檢查失敗: {dir_error}")
-                reports_count = 0
-            
-            # 檢查 agent 狀態
-            agents_status = {
-                'retrieval_agent': 'ready',
-                'report_agent': 'ready'
-            }
+                catalog = self.report_catalog.get_stats()
+            except Exception as catalog_error:
+                print(f"報告目錄檢查失敗: {catalog_error}")
+                catalog = {'reports_count': 0}
             
-            status_data = {
-                'database': {
-                    'status': db_status,
-                    'returns_count': returns_count
-                },
-                'reports': {
-                    'directory': reports_dir,
-                    'reports_count': reports_count
-                },
-                'agents': agents_status
-            }
-            
-            print(f"系統狀態檢查完成: {status_data}")
+            status_data = self._status_data(db_status, returns_count, catalog)
             
             return {
                 'status': 'success',
@@ -222,6 +177,93 @@ class MCPCoordinator:
                 'message': f'獲取系統狀態時發生錯誤: {str(e)}'
             }
     
+    def _status_data(self, db_status, returns_count, catalog):
+        """組合系統狀態：資料庫、報告目錄與工作佇列、agent 與執行緒池"""
+        # 檢查 agent 狀態
+        agents_status = {
+            'retrieval_agent': 'ready',
+            'report_agent': 'ready'
+        }
+        
+        return {
+            'database': {
+                'status': db_status,
+                'returns_count': returns_count,
+                'pool': self.db_manager.get_pool_stats(),
+                'cache': self.db_manager.get_cache_stats(),
+                'write_queue': self.db_manager.get_write_queue_stats(),
+                'events': self.db_manager.get_event_stats()
+            },
+            'reports': {
+                'directory': self.report_catalog.reports_dir,
+                'reports_count': catalog['reports_count'],
+                'catalog': catalog,
+                'jobs': get_job_manager(self.db_manager.db_path).get_stats()
+            },
+            'agents': agents_status,
+            'executors': get_executor_stats()
+        }
+    
+    def get_dashboard(self, fields=None, limit=None, status=None):
+        """在一次請求中組合儀表板的區塊（status、statistics、returns、reports），
+        資料區塊（包含報告目錄）來自同一個讀取交易；status 為 StatusMonitor 最近一次的系統狀態，
+        未提供時才即時產生"""
+        fields = normalize_dashboard_fields(fields)
+        sections = {}
+        if 'reports' in fields:
+            sections['catalog'] = read_catalog_totals
+            sections['reports'] = lambda conn: read_reports_page(conn, limit)
+        snapshot = self.db_manager.get_dashboard_data(
+            statistics='statistics' in fields, returns='returns' in fields, limit=limit, sections=sections
+        )
+        
+        dashboard = {
+            'fields': fields,
+            'data_version': snapshot['data_version'],
+            'updated_at': snapshot['updated_at']
+        }
+        if 'catalog' in snapshot:
+            dashboard['reports_version'] = snapshot['catalog']['version']
+        if 'status' in fields:
+            dashboard['status'] = status if status is not None else self.get_system_status().get('data')
+        if 'statistics' in fields:
+            dashboard['statistics'] = snapshot['statistics']
+        if 'returns' in fields:
+            page = snapshot['returns']
+            dashboard['returns'] = {
+                'records': page['records'],
+                'pagination': {
+                    'limit': page['limit'],
+                    'has_more': page['has_more'],
+                    'next_cursor': page['next_cursor']
+                }
+            }
+        if 'reports' in fields:
+            page = snapshot['reports']
+            dashboard['reports'] = {
+                'records': page['reports'],
+                'pagination': {
+                    'limit': page['limit'],
+                    'has_more': page['has_more'],
+                    'next_cursor': page['next_cursor']
+                }
+            }
+        
+        return {
+            'status': 'success',
+            'data': dashboard
+        }
+    
+    def export_report(self, out, report_type="comprehensive", params=None):
+        """在同一個讀取交易中讀取統計與記錄，將報告直接寫入 out（不儲存檔案），返回記錄筆數"""
+        params = normalize_report_params(params)
+        with self.db_manager.export_snapshot(partition_by=params['partition_by']) as snapshot:
+            statistics_data = snapshot['statistics']
+            return self.report_agent.write_report(
+                out, snapshot['batches'], statistics_data, report_type,
+                returns_count=statistics_data['total_returns'], params=params
+            )
+    
     def get_help(self):
         """獲取使用說明"""
         return {
@@ -241,6 +283,8 @@ class MCPCoordinator:
                     '使用自然語言描述您的需求',
                     '系統會自動識別操作類型',
                     '可以指定具體的操作類型來提高準確性',
+                    '查詢可指定日期範圍，例如：查詢上個月的退貨、查詢日期 2024-01-01 到 2024-01-31、查詢最近7天',
+                    '查詢條件可以組合，例如：查詢 台北店 iPhone 15 上個月 前10筆；加上「查詢計畫」可顯示索引使用情況',
                     '報告會自動儲存在 reports/ 目錄中'
                 ]
             }
@@ -0,0 +1,201 @@
+from datetime import datetime
+
+# 遷移步驟必須固定為當時的資料庫結構，不可引用之後會變動的程式碼
+
+
+def _create_text_summary_tables(conn):
+    """v3：以名稱為鍵的彙總表，並從現有資料計算"""
+    for table, key, expr in [
+        ('store_counts', 'store_name', 'store_name'),
+        ('product_counts', 'product', 'product'),
+        ('month_counts', 'month', 'substr(return_date, 1, 7)'),
+    ]:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key} TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f"INSERT INTO {table} ({key}, count) SELECT {expr}, COUNT(*) FROM returns GROUP BY {expr}")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("INSERT OR REPLACE INTO metadata (key, value) SELECT 'returns_count', COUNT(*) FROM returns")
+
+
+def _normalize_dimensions(conn):
+    """v5：建立 stores/products 維度表，returns 改存整數外鍵，彙總表改以整數鍵分組"""
+    for table in ('stores', 'products'):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+    conn.execute("INSERT OR IGNORE INTO stores (name) SELECT DISTINCT store_name FROM returns")
+    conn.execute("INSERT OR IGNORE INTO products (name) SELECT DISTINCT product FROM returns")
+
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'returns'").fetchone()
+    sequence = row[0] if row else 0
+
+    conn.execute('''
+        CREATE TABLE returns_normalized (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL,
+            store_id INTEGER NOT NULL REFERENCES stores (id),
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            return_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO returns_normalized (id, order_id, store_id, product_id, return_date, created_at)
+        SELECT r.id, r.order_id, s.id, p.id, r.return_date, r.created_at
+        FROM returns r
+        JOIN stores s ON s.name = r.store_name
+        JOIN products p ON p.name = r.product
+        ORDER BY r.id
+    ''')
+    conn.execute("DROP TABLE returns")
+    conn.execute("ALTER TABLE returns_normalized RENAME TO returns")
+    # 保留原本的 AUTOINCREMENT 序號，已刪除的 id 不會被重複使用
+    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'returns'", (sequence,))
+
+    conn.execute('CREATE INDEX idx_returns_date ON returns (return_date, id)')
+    conn.execute('CREATE INDEX idx_returns_store_date ON returns (store_id, return_date, id)')
+    conn.execute('CREATE INDEX idx_returns_product_date ON returns (product_id, return_date, id)')
+    conn.execute('CREATE INDEX idx_returns_order_id ON returns (order_id)')
+
+    conn.execute("DROP TABLE store_counts")
+    conn.execute("DROP TABLE product_counts")
+    for table, key in [('store_counts', 'store_id'), ('product_counts', 'product_id')]:
+        conn.execute(f'''
+            CREATE TABLE {table} (
+                {key} INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL
+            )
+        ''')
+        conn.execute(f"INSERT INTO {table} ({key}, count) SELECT {key}, COUNT(*) FROM returns GROUP BY {key}")
+
+
+# 版本化的資料庫結構遷移
+# 每個遷移為 (版本, 說明, 步驟列表)，步驟可以是 SQL 字串或接收連線的函式
+MIGRATIONS = [
+    (1, '建立退貨記錄表格', [
+        '''
+        CREATE TABLE IF NOT EXISTS returns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL,
+            product TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            return_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    # 複合索引的前綴即可服務單獨以商店或產品篩選、分組的查詢，
+    # 尾端的 id 讓 ORDER BY return_date DESC, id 不需要額外排序
+    (2, '建立退貨記錄查詢索引', [
+        'CREATE INDEX IF NOT EXISTS idx_returns_date ON returns (return_date, id)',
+        'CREATE INDEX IF NOT EXISTS idx_returns_store_date ON returns (store_name, return_date, id)',
+        'CREATE INDEX IF NOT EXISTS idx_returns_product_date ON returns (product, return_date, id)',
+    ]),
+    (3, '建立商店、產品、月份彙總表', [
+        _create_text_summary_tables,
+    ]),
+    (4, '建立訂單ID索引', [
+        'CREATE INDEX IF NOT EXISTS idx_returns_order_id ON returns (order_id)',
+    ]),
+    (5, '將商店與產品正規化為維度表', [
+        _normalize_dimensions,
+    ]),
+    # 每筆記錄保存寫入時的資料版本，刪除的記錄留下墓碑，讓客戶端可以增量同步
+    (6, '新增記錄版本欄位與刪除記錄表', [
+        'ALTER TABLE returns ADD COLUMN version INTEGER NOT NULL DEFAULT 0',
+        'CREATE INDEX IF NOT EXISTS idx_returns_version ON returns (version)',
+        '''
+        CREATE TABLE IF NOT EXISTS deleted_returns (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_deleted_returns_version ON deleted_returns (version)',
+        # 既有記錄沒有版本，早於此版本的客戶端必須重新載入
+        '''
+        INSERT INTO metadata (key, value) VALUES ('data_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+        ''',
+        '''
+        INSERT OR REPLACE INTO metadata (key, value)
+        SELECT 'changes_base_version', value FROM metadata WHERE key = 'data_version'
+        ''',
+    ]),
+    # 報告目錄：產生報告時記錄，列表分頁與保留政策只查詢此表，不掃描 reports/ 目錄
+    (7, '建立報告目錄表格', [
+        '''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL UNIQUE,
+            report_type TEXT NOT NULL,
+            params TEXT,
+            data_version INTEGER,
+            size INTEGER NOT NULL,
+            returns_count INTEGER,
+            created_at TEXT NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_reports_type_created ON reports (report_type, created_at, id)',
+    ]),
+    # 產生報告時記錄工作表名稱，快取命中時不需要重新開啟活頁簿
+    (8, '報告目錄記錄工作表名稱', [
+        'ALTER TABLE reports ADD COLUMN sheets TEXT',
+    ]),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    ''')
+
+
+def get_schema_version(conn):
+    """取得目前資料庫結構版本"""
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn, target_version=None):
+    """在目前交易中套用所有尚未執行的遷移，返回套用的版本列表"""
+    current = get_schema_version(conn)
+    applied = []
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        if target_version is not None and version > target_version:
+            break
+
+        print(f"🔧 套用資料庫遷移 v{version}: {description}")
+        for step in steps:
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+
+        conn.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+            (version, description, datetime.now().isoformat())
+        )
+        applied.append(version)
+
+    return applied
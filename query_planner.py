@@ -0,0 +1,235 @@
+import re
+
+from database import encode_cursor, decode_cursor, normalize_page_size, returns_query
+from date_parser import parse_date_range
+
+# 各篩選條件可使用的索引（見 migrations.py）
+INDEX_BY_ORDER_ID = 'idx_returns_order_id'
+INDEX_BY_STORE = 'idx_returns_store_date'
+INDEX_BY_PRODUCT = 'idx_returns_product_date'
+INDEX_BY_DATE = 'idx_returns_date'
+
+ORDER_ID_PATTERNS = [
+    # 有明確的 ID 字樣或分隔符號：訂單ID 12345、訂單編號：A-1、order id X1、order #A1
+    r'(?:訂單\s*(?:ID|編號|號碼)\s*[:：#]?|訂單\s*[:：#]|(?<![A-Za-z0-9_])order\s*(?:id(?![A-Za-z0-9_])\s*[:：#]?|[:：#]))\s*([A-Za-z0-9_-]+)',
+    # 沒有分隔符號時值必須包含數字（"orders"、"order by" 不是訂單ID），日期不算：訂單 12345、order 12345
+    r'(?:訂單|(?<![A-Za-z0-9_])order(?![A-Za-z0-9_]))\s*(?!\d{4}[-/.]\d{1,2})([A-Za-z0-9_-]*\d[A-Za-z0-9_-]*)',
+    r'(?<![A-Za-z0-9_])(ORD[A-Za-z0-9_-]*\d[A-Za-z0-9_-]*)(?![A-Za-z0-9_])',
+]
+LIMIT_PATTERNS = [
+    r'(?:前|最新|最近|最舊|最早)\s*(\d+)\s*筆',
+    r'(?:top|limit|first)\s+(\d+)',
+    r'(\d+)\s*筆',
+]
+ASCENDING_WORDS = ['最舊', '最早', '由舊到新', '舊到新', 'oldest', 'ascending']
+EXPLAIN_WORDS = ['執行計畫', '查詢計畫', 'explain', 'query plan']
+
+
+def _name_pattern(name):
+    """已知名稱的比對樣式：名稱開頭或結尾是英數字時需要在字詞邊界上（"S" 不會符合 "list"），
+    中文字沒有空白分隔，可以直接與前後文字相連"""
+    pattern = re.escape(name)
+    if re.match(r'\w', name[0], re.ASCII):
+        pattern = r'(?<![A-Za-z0-9_])' + pattern
+    if re.match(r'\w', name[-1], re.ASCII):
+        pattern += r'(?![A-Za-z0-9_])'
+    return pattern
+
+
+class QueryPlan:
+    """由自然語言篩選條件產生的單一參數化查詢"""
+
+    def __init__(self, filters, index, estimated_rows, descending, limit, top_n, sql, params):
+        self.filters = filters
+        self.index = index
+        self.estimated_rows = estimated_rows
+        self.descending = descending
+        self.limit = limit
+        self.top_n = top_n
+        self.sql = sql
+        self.params = params
+
+    def describe(self):
+        """以文字描述篩選條件"""
+        parts = []
+        if self.filters.get('order_id'):
+            parts.append(f"訂單 {self.filters['order_id']}")
+        if self.filters.get('store_name'):
+            parts.append(f"商店 \"{self.filters['store_name']}\"")
+        if self.filters.get('product'):
+            parts.append(f"產品 \"{self.filters['product']}\"")
+        if self.filters.get('start_date'):
+            parts.append(f"{self.filters['start_date']} 至 {self.filters['end_date']}")
+        return '、'.join(parts)
+
+    def export_params(self):
+        """串流輸出用的參數：沒有指定前 N 筆時不限制筆數（LIMIT -1）"""
+        return self.params[:-1] + [self.top_n or -1]
+
+    def to_dict(self):
+        return {
+            'filters': self.filters,
+            'index': self.index,
+            'estimated_rows': self.estimated_rows,
+            'order': 'return_date DESC, id DESC' if self.descending else 'return_date ASC, id ASC',
+            'limit': self.limit,
+            'sql': ' '.join(self.sql.split()),
+            'params': list(self.params)
+        }
+
+
+class QueryPlanner:
+    """從提示詞擷取所有篩選條件，組成一個查詢並選擇最具選擇性的索引"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def _match_known(self, text, names):
+        """在文字中尋找最長的已知名稱（不分大小寫，英數字名稱需在字詞邊界上）"""
+        matches = [name for name in names if name and re.search(_name_pattern(name), text, re.IGNORECASE)]
+        return max(matches, key=len) if matches else None
+
+    def extract_filters(self, prompt, statistics=None):
+        """擷取訂單ID、商店、產品與日期範圍篩選條件"""
+        statistics = statistics or self.db_manager.get_statistics()
+        filters = {}
+        remaining = prompt
+
+        for pattern in ORDER_ID_PATTERNS:
+            match = re.search(pattern, remaining, re.IGNORECASE)
+            if match:
+                filters['order_id'] = match.group(1)
+                remaining = remaining.replace(match.group(0), ' ')
+                break
+
+        store_name = self._match_known(remaining, [s['store_name'] for s in statistics.get('store_stats', [])])
+        if not store_name:
+            match = re.search(r'商店\s*([^，,\s]+)', remaining)
+            store_name = match.group(1).strip() if match else None
+        if store_name:
+            filters['store_name'] = store_name
+            remaining = re.sub(_name_pattern(store_name), ' ', remaining, flags=re.IGNORECASE)
+
+        product = self._match_known(remaining, [p['product'] for p in statistics.get('product_stats', [])])
+        if not product:
+            match = re.search(r'產品\s*([^，,]+)', remaining)
+            product = match.group(1).strip() if match else None
+        if product:
+            filters['product'] = product
+            remaining = re.sub(_name_pattern(product), ' ', remaining, flags=re.IGNORECASE)
+
+        date_range = parse_date_range(remaining)
+        if date_range:
+            filters['start_date'], filters['end_date'] = date_range
+
+        return filters
+
+    def _extract_top_n(self, prompt):
+        for pattern in LIMIT_PATTERNS:
+            match = re.search(pattern, prompt, re.IGNORECASE)
+            if match:
+                return int(match.group(1))
+        return None
+
+    def _estimate_rows(self, filters, statistics):
+        """以彙總表估算每個候選索引會掃描的列數，返回 (索引, 估計列數)"""
+        total = max(statistics.get('total_returns', 0), 1)
+
+        date_fraction = 1.0
+        if filters.get('start_date'):
+            start_month = filters['start_date'][:7]
+            end_month = filters['end_date'][:7]
+            in_range = sum(
+                m['count'] for m in statistics.get('monthly_stats', [])
+                if start_month <= m['month'] <= end_month
+            )
+            date_fraction = in_range / total
+
+        candidates = []
+        if filters.get('order_id'):
+            candidates.append((INDEX_BY_ORDER_ID, 1))
+        if filters.get('store_name'):
+            count = next((s['count'] for s in statistics.get('store_stats', [])
+                          if s['store_name'] == filters['store_name']), 0)
+            candidates.append((INDEX_BY_STORE, int(count * date_fraction)))
+        if filters.get('product'):
+            count = next((p['count'] for p in statistics.get('product_stats', [])
+                          if p['product'] == filters['product']), 0)
+            candidates.append((INDEX_BY_PRODUCT, int(count * date_fraction)))
+        candidates.append((INDEX_BY_DATE, int(total * date_fraction)))
+
+        return min(candidates, key=lambda candidate: candidate[1])
+
+    def plan(self, prompt, limit=None, cursor=None):
+        """為提示詞建立查詢計畫"""
+        statistics = self.db_manager.get_statistics()
+        filters = self.extract_filters(prompt, statistics)
+
+        top_n = self._extract_top_n(prompt)
+        page_size = normalize_page_size(top_n or limit)
+        descending = not any(word in prompt.lower() for word in ASCENDING_WORDS)
+        index, estimated_rows = self._estimate_rows(filters, statistics)
+
+        conditions = []
+        params = []
+        if filters.get('order_id'):
+            conditions.append("r.order_id = ?")
+            params.append(filters['order_id'])
+        # 名稱先轉為整數鍵；不存在的名稱對應到 NULL，不會符合任何記錄
+        if filters.get('store_name'):
+            conditions.append("r.store_id = ?")
+            params.append(self.db_manager.stores.lookup(filters['store_name']))
+        if filters.get('product'):
+            conditions.append("r.product_id = ?")
+            params.append(self.db_manager.products.lookup(filters['product']))
+        if filters.get('start_date'):
+            conditions.append("r.return_date BETWEEN ? AND ?")
+            params.extend([filters['start_date'], filters['end_date']])
+        if cursor and not top_n:
+            last_date, last_id = decode_cursor(cursor)
+            conditions.append("(r.return_date, r.id) < (?, ?)" if descending else "(r.return_date, r.id) > (?, ?)")
+            params.extend([last_date, last_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = 'DESC' if descending else 'ASC'
+        # 多取一筆用來判斷是否還有下一頁
+        params.append(page_size + 1)
+        sql = returns_query(
+            where,
+            f"ORDER BY r.return_date {direction}, r.id {direction} LIMIT ?",
+            hint=f"INDEXED BY {index}"
+        )
+
+        return QueryPlan(filters, index, estimated_rows, descending, page_size, top_n, sql, params)
+
+    def execute(self, plan, explain=False):
+        """執行查詢計畫並返回分頁結果"""
+        rows = self.db_manager.query_records(plan.sql, plan.params)
+
+        # 指定前 N 筆時不提供下一頁
+        has_more = len(rows) > plan.limit and not plan.top_n
+        records = rows[:plan.limit]
+        next_cursor = None
+        if has_more:
+            last = records[-1]
+            next_cursor = encode_cursor(last['return_date'], last['id'])
+
+        page = {
+            'records': records,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'limit': plan.limit,
+            'plan': plan.to_dict()
+        }
+        if explain:
+            page['plan']['explain'] = self.db_manager.explain_query(plan.sql, plan.params)
+        return page
+
+    def stream(self, plan):
+        """逐批產生查詢計畫的全部結果，不分頁"""
+        return self.db_manager.iter_records(plan.sql, plan.export_params())
+
+    def wants_explain(self, prompt):
+        """提示詞是否要求顯示執行計畫"""
+        lower = prompt.lower()
+        return any(word in lower for word in EXPLAIN_WORDS)
@@ -1,10 +1,105 @@
 import pandas as pd
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.chart import BarChart, Reference, PieChart
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.hyperlink import Hyperlink
 from openpyxl.utils.dataframe import dataframe_to_rows
 from datetime import datetime
+import hashlib
+import json
 import os
+import re
+import time
+
+# 寫入資料列時每隔多少筆回報一次進度
+PROGRESS_EVERY_ROWS = 5000
+# 傳入記錄列表時，每批交給工作表的筆數
+RECORD_BATCH_SIZE = 1000
+
+# 詳細資料與簡單報告的欄位：(記錄欄位, 標題, 欄寬)
+DETAIL_COLUMNS = [
+    ('id', 'ID', 15),
+    ('order_id', '訂單ID', 20),
+    ('product', '產品名稱', 25),
+    ('store_name', '商店名稱', 15),
+    ('return_date', '退貨日期', 20),
+    ('created_at', '建立時間', 20),
+]
+SIMPLE_COLUMNS = [
+    ('order_id', '訂單ID', 20),
+    ('product', '產品', 25),
+    ('store_name', '商店名稱', 15),
+    ('return_date', '日期', 15),
+]
+
+# Excel 單一工作表的列數上限；詳細資料超過每表上限時分散到多個工作表
+EXCEL_MAX_ROWS = 1048576
+DEFAULT_SHEET_ROW_LIMIT = 1000000
+MIN_SHEET_ROW_LIMIT = 1000
+# 保留給報告標題與表頭的列數
+SHEET_RESERVED_ROWS = 3
+# 詳細資料可選的分區方式：每個商店或每個月份各自使用工作表
+REPORT_PARTITIONS = {
+    'store': '商店',
+    'month': '月份',
+}
+SHEET_TITLE_MAX_LENGTH = 31
+INVALID_SHEET_TITLE_CHARS = re.compile(r'[\\/*?:\[\]]')
+
+# 報告快取：相同類型、參數與資料版本的報告只產生一次
+# 報告版面改變時遞增，讓舊版面的快取檔案不再命中
+REPORT_LAYOUT_VERSION = 3
+# 超過此時間的報告不再命中快取（檔案由 report_catalog 的保留政策清除）
+REPORT_CACHE_MAX_AGE_SEC = 7 * 24 * 3600
+REPORT_PREFIXES = {
+    'comprehensive': 'returns_report',
+    'simple': 'simple_report',
+}
+
+
+def normalize_report_params(params=None):
+    """驗證並補齊報告參數（partition_by、sheet_row_limit），參數無效時拋出 ValueError"""
+    params = dict(params or {})
+    partition_by = params.get('partition_by') or None
+    if partition_by in ('none', 'all'):
+        partition_by = None
+    if partition_by is not None and partition_by not in REPORT_PARTITIONS:
+        raise ValueError(f"不支援的分區方式: {partition_by}（可用: {', '.join(REPORT_PARTITIONS)}）")
+    
+    sheet_row_limit = params.get('sheet_row_limit') or DEFAULT_SHEET_ROW_LIMIT
+    try:
+        sheet_row_limit = int(sheet_row_limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"每個工作表的列數上限必須是整數: {sheet_row_limit}")
+    max_limit = EXCEL_MAX_ROWS - SHEET_RESERVED_ROWS
+    if not MIN_SHEET_ROW_LIMIT <= sheet_row_limit <= max_limit:
+        raise ValueError(f"每個工作表的列數上限必須介於 {MIN_SHEET_ROW_LIMIT} 與 {max_limit} 之間")
+    
+    return {'partition_by': partition_by, 'sheet_row_limit': sheet_row_limit}
+
+
+class _DetailShard:
+    """詳細資料分片：一個工作表及其記錄範圍"""
+    
+    def __init__(self, sheet, partition, number):
+        self.sheet = sheet
+        self.partition = partition
+        self.number = number
+        self.rows = 0
+        self.first_date = None
+        self.last_date = None
+    
+    def add(self, record):
+        self.rows += 1
+        return_date = record.get('return_date')
+        if return_date:
+            if self.first_date is None or return_date < self.first_date:
+                self.first_date = return_date
+            if self.last_date is None or return_date > self.last_date:
+                self.last_date = return_date
+
 
 class ReportAgent:
     def __init__(self):
@@ -16,45 +111,88 @@ class ReportAgent:
         if not os.path.exists(self.reports_dir):
             os.makedirs(self.reports_dir)
     
-    def generate_excel_report(self, returns_data, statistics_data=None, report_type="comprehensive"):
-        """生成 Excel 報告"""
+    def report_cache_key(self, report_type, data_version, params=None):
+        """由報告類型、參數與資料版本計算快取鍵"""
+        raw = json.dumps({
+            'type': report_type,
+            'params': normalize_report_params(params),
+            'data_version': data_version,
+            'layout': REPORT_LAYOUT_VERSION,
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+    
+    def _report_filename(self, report_type, data_version=None, params=None):
+        """有資料版本時以快取鍵命名（相同內容同一檔名），否則以時間戳記命名"""
+        prefix = REPORT_PREFIXES.get(report_type, REPORT_PREFIXES['comprehensive'])
+        if data_version is None:
+            return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return f"{prefix}_{self.report_cache_key(report_type, data_version, params)}.xlsx"
+    
+    def find_cached_report(self, report_type, data_version, params=None):
+        """返回相同類型、參數與資料版本的既有報告，不存在或已過期時返回 None；
+        只檢查檔案狀態，不重新開啟活頁簿（工作表名稱記錄在報告目錄中）"""
+        if data_version is None:
+            return None
+        filename = self._report_filename(report_type, data_version, params)
+        filepath = os.path.join(self.reports_dir, filename)
+        try:
+            file_stat = os.stat(filepath)
+        except OSError:
+            return None
+        if time.time() - file_stat.st_mtime > REPORT_CACHE_MAX_AGE_SEC:
+            return None
+        
+        return {
+            'status': 'success',
+            'message': '報告內容未變更，使用已產生的報告',
+            'data': {
+                'filename': filename,
+                'filepath': filepath,
+                'cached': True,
+                'cache_key': self.report_cache_key(report_type, data_version, params)
+            }
+        }
+    
+    def _save_workbook(self, wb, filepath):
+        """先寫入暫存檔再改名，快取查詢不會讀到寫到一半的檔案"""
+        temp_path = f"{filepath}.{os.getpid()}.tmp"
+        try:
+            wb.save(temp_path)
+            os.replace(temp_path, filepath)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def generate_excel_report(self, returns_data, statistics_data=None, report_type="comprehensive", progress=None,
+                              data_version=None, returns_count=None, params=None):
+        """生成 Excel 報告（progress(percent, stage) 可選，用於回報產生進度；提供 data_version 時使用報告快取）
+        
+        returns_data 可以是記錄列表、DataFrame，或逐批產生記錄列表的迭代器（例如資料庫游標），
+        以唯寫模式逐列寫入，記憶體用量與筆數無關；returns_count 為預估筆數，只用於回報進度。
+        params 見 normalize_report_params：詳細資料依 partition_by 分區，並在 sheet_row_limit 筆後換到新的工作表
+        """
         try:
+            params = normalize_report_params(params)
+            cached = self.find_cached_report('comprehensive', data_version, params)
+            if cached:
+                print(f"使用已快取的報告: {cached['data']['filename']}")
+                return cached
+            
             print(f"開始生成 Excel 報告，資料類型: {type(returns_data)}")
-            print(f"資料長度: {len(returns_data) if returns_data is not None else 'None'}")
             
             # 確保報告目錄存在
             self._ensure_reports_directory()
             
-            # 建立工作簿
-            wb = Workbook()
-            
-            # 移除預設工作表
-            wb.remove(wb.active)
-            
-            # 建立摘要工作表
-            summary_sheet = wb.create_sheet("摘要")
-            self._create_summary_sheet(summary_sheet, returns_data, statistics_data)
-            
-            # 建立詳細資料工作表
-            details_sheet = wb.create_sheet("詳細資料")
-            self._create_details_sheet(details_sheet, returns_data)
-            
-            # 建立分析工作表
-            analysis_sheet = wb.create_sheet("分析")
-            self._create_analysis_sheet(analysis_sheet, statistics_data)
-            
-            # 建立發現工作表
-            findings_sheet = wb.create_sheet("發現")
-            self._create_findings_sheet(findings_sheet, returns_data, statistics_data)
+            wb, row_count = self._build_excel_workbook(returns_data, statistics_data, progress, returns_count, params)
             
             # 生成檔案名稱
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"returns_report_{timestamp}.xlsx"
+            filename = self._report_filename('comprehensive', data_version, params)
             filepath = os.path.join(self.reports_dir, filename)
             
             print(f"儲存報告到: {filepath}")
             # 儲存檔案
-            wb.save(filepath)
+            self._report_progress(progress, 90, "儲存報告檔案")
+            self._save_workbook(wb, filepath)
             print("報告儲存成功")
             
             return {
@@ -63,7 +201,9 @@ class ReportAgent:
                 'data': {
                     'filename': filename,
                     'filepath': filepath,
-                    'sheets': ['摘要', '詳細資料', '分析', '發現']
+                    'sheets': wb.sheetnames,
+                    'returns_count': row_count,
+                    'cached': False
                 }
             }
             
@@ -76,111 +216,301 @@ class ReportAgent:
                 'message': f'生成 Excel 報告時發生錯誤: {str(e)}'
             }
     
-    def _create_summary_sheet(self, sheet, returns_data, statistics_data):
-        """建立摘要工作表"""
-        # 設定欄寬
-        sheet.column_dimensions['A'].width = 20
-        sheet.column_dimensions['B'].width = 30
+    def _build_excel_workbook(self, returns_data, statistics_data, progress=None, returns_count=None, params=None):
+        """建立完整報告的工作簿（尚未儲存），返回 (工作簿, 記錄筆數)"""
+        params = normalize_report_params(params)
         
-        # 標題樣式
-        title_font = Font(bold=True, size=16)
-        header_font = Font(bold=True, size=12)
+        # 建立唯寫模式工作簿（每個工作表各自串流到暫存檔）
+        wb = self._create_workbook()
         
-        # 標題
-        sheet['A1'] = "退貨分析報告摘要"
-        sheet['A1'].font = title_font
-        sheet.merge_cells('A1:B1')
+        # 工作表依顯示順序建立；詳細資料先寫入，才能在摘要與索引中填入實際筆數
+        summary_sheet = wb.create_sheet("摘要")
+        index_sheet = wb.create_sheet("詳細資料索引")
         
-        # 報告資訊
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        sheet['A3'] = "報告生成時間"
-        sheet['B3'] = current_time
-        sheet['A3'].font = header_font
+        # 建立詳細資料工作表（可能分成多個）
+        self._report_progress(progress, 30, "寫入詳細資料")
+        shards = self._create_details_sheets(wb, returns_data, params, progress, returns_count)
+        row_count = sum(shard.rows for shard in shards)
+        print(f"資料長度: {row_count}，詳細資料工作表 {max(len(shards), 1)} 個")
         
-        sheet['A4'] = "總退貨記錄數"
-        sheet['B4'] = len(returns_data) if returns_data else 0
-        sheet['A4'].font = header_font
+        analysis_sheet = wb.create_sheet("分析")
+        findings_sheet = wb.create_sheet("發現")
         
-        if statistics_data:
-            sheet['A5'] = "總退貨數量"
-            sheet['B5'] = statistics_data.get('total_returns', 0)
-            sheet['A5'].font = header_font
-            
-            sheet['A6'] = "涉及商店數量"
-            sheet['B6'] = len(statistics_data.get('store_stats', []))
-            sheet['A6'].font = header_font
-            
-            sheet['A7'] = "涉及產品數量"
-            sheet['B7'] = len(statistics_data.get('product_stats', []))
-            sheet['A7'].font = header_font
+        # 建立摘要與索引工作表
+        self._report_progress(progress, 80, "建立摘要工作表")
+        self._create_summary_sheet(summary_sheet, row_count, statistics_data, max(len(shards), 1))
+        self._create_index_sheet(index_sheet, shards, params['partition_by'])
+        
+        # 建立分析工作表
+        self._report_progress(progress, 85, "建立分析工作表")
+        self._create_analysis_sheet(analysis_sheet, statistics_data)
         
-        # 樣式設定
-        for row in range(3, 8):
-            sheet[f'A{row}'].font = Font(bold=True)
-            sheet[f'B{row}'].font = Font(size=11)
+        # 建立發現工作表
+        self._create_findings_sheet(findings_sheet, row_count, statistics_data)
+        return wb, row_count
+    
+    def _build_simple_workbook(self, returns_data, progress=None, returns_count=None, params=None):
+        """建立簡單報告的工作簿（尚未儲存），返回 (工作簿, 記錄筆數)"""
+        params = normalize_report_params(params)
+        wb = self._create_workbook()
+        
+        # 每個工作表開頭都有報告標題
+        def write_title(sheet):
+            sheet.append([self._cell(sheet, "退貨記錄報告", 'report_title')])
+            sheet.append([])
+        
+        # 標題行與資料（超過列數上限或分區改變時換到新的工作表）
+        self._report_progress(progress, 30, "寫入退貨記錄")
+        shards = self._write_sharded_records(
+            wb, returns_data, SIMPLE_COLUMNS, 'label', None, params,
+            progress, self._estimate_count(returns_data, returns_count), 30, 85, "寫入退貨記錄",
+            preamble=write_title
+        )
+        row_count = sum(shard.rows for shard in shards)
+        if not shards:
+            print("沒有退貨資料，建立空報告")
+            ws = wb.create_sheet("退貨記錄")
+            write_title(ws)
+            ws.append(["暫無退貨記錄"])
+        else:
+            self._name_shards(wb, shards, "退貨記錄", params['partition_by'])
+            print(f"處理 {row_count} 筆記錄，工作表 {len(shards)} 個")
+        return wb, row_count
+    
+    def write_report(self, out, returns_data, statistics_data=None, report_type="comprehensive",
+                     returns_count=None, params=None):
+        """產生報告並直接寫入 out（可寫入的檔案物件，不需支援 seek），不儲存到 reports/ 也不使用報告快取；
+        returns_data 與 params 同 generate_excel_report，返回記錄筆數"""
+        if report_type == "simple":
+            wb, row_count = self._build_simple_workbook(returns_data, returns_count=returns_count, params=params)
+        else:
+            wb, row_count = self._build_excel_workbook(returns_data, statistics_data, returns_count=returns_count,
+                                                       params=params)
+        wb.save(out)
+        return row_count
+    
+    def _report_progress(self, progress, percent, stage):
+        """回報進度（未提供 progress 時不做任何事）"""
+        if progress is not None:
+            progress(percent, stage)
     
-    def _create_details_sheet(self, sheet, returns_data):
-        """建立詳細資料工作表"""
-        if not returns_data or len(returns_data) == 0:
-            sheet['A1'] = "無退貨資料"
+    def _report_rows_progress(self, progress, row_count, total, start, end, stage):
+        """寫入資料列時，每 PROGRESS_EVERY_ROWS 筆依比例回報 start~end 之間的進度"""
+        if progress is not None and total and row_count % PROGRESS_EVERY_ROWS == 0:
+            progress(min(end, start + (end - start) * row_count // total), stage)
+    
+    def _create_workbook(self):
+        """建立唯寫模式工作簿並註冊共用的具名樣式（每個儲存格只引用樣式，不各自建立 Font/Border）"""
+        wb = Workbook(write_only=True)
+        thin = Side(style='thin')
+        thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        for style in (
+            NamedStyle(name='report_title', font=Font(bold=True, size=16)),
+            NamedStyle(name='sheet_title', font=Font(bold=True, size=14)),
+            NamedStyle(name='section_title', font=Font(bold=True, size=12)),
+            NamedStyle(name='label', font=Font(bold=True)),
+            NamedStyle(name='value', font=Font(size=11)),
+            NamedStyle(name='table_header', font=Font(bold=True),
+                       fill=PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")),
+            NamedStyle(name='detail_header', font=Font(bold=True), border=thin_border,
+                       fill=PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")),
+            NamedStyle(name='detail_cell', border=thin_border),
+        ):
+            wb.add_named_style(style)
+        return wb
+    
+    def _cell(self, sheet, value, style=None):
+        """建立唯寫模式的儲存格，套用具名樣式"""
+        cell = WriteOnlyCell(sheet, value)
+        if style:
+            cell.style = style
+        return cell
+    
+    def _record_batches(self, returns_data, partition_by=None):
+        """將記錄列表、DataFrame 或逐批產生的記錄統一為逐批迭代；
+        記錄列表與 DataFrame 依 partition_by 分組（依分區首次出現的順序，分區內保留原順序），
+        逐批產生的記錄（例如資料庫匯出）應已依分區排序"""
+        if returns_data is None:
             return
+        if isinstance(returns_data, pd.DataFrame):
+            returns_data = returns_data.to_dict('records') if partition_by else returns_data
+        if isinstance(returns_data, (list, tuple)) and partition_by:
+            groups = {}
+            for record in returns_data:
+                groups.setdefault(self._partition_key(record, partition_by), []).append(record)
+            returns_data = [record for group in groups.values() for record in group]
+        if isinstance(returns_data, pd.DataFrame):
+            for start in range(0, len(returns_data), RECORD_BATCH_SIZE):
+                yield returns_data.iloc[start:start + RECORD_BATCH_SIZE].to_dict('records')
+        elif isinstance(returns_data, (list, tuple)):
+            for start in range(0, len(returns_data), RECORD_BATCH_SIZE):
+                yield returns_data[start:start + RECORD_BATCH_SIZE]
+        else:
+            yield from returns_data
+    
+    def _estimate_count(self, returns_data, returns_count):
+        if returns_count is not None:
+            return returns_count
+        if isinstance(returns_data, (list, tuple, pd.DataFrame)):
+            return len(returns_data)
+        return None
+    
+    def _partition_key(self, record, partition_by):
+        if partition_by == 'store':
+            return record.get('store_name') or ''
+        if partition_by == 'month':
+            return str(record.get('return_date') or '')[:7]
+        return None
+    
+    def _write_sharded_records(self, wb, returns_data, columns, header_style, cell_style, params,
+                               progress, total, start, end, stage, preamble=None):
+        """逐批寫入記錄；每個分區寫入自己目前的工作表，達到列數上限時換到新的工作表，返回各分片
         
+        唯寫模式的每個工作表各自串流到暫存檔，未依分區排序的記錄也不會因分區交錯而產生多餘的工作表；
+        分片先以暫時名稱建立，全部寫完後再由 _name_shards 依分片數量命名
+        """
+        partition_by = params['partition_by']
+        row_limit = params['sheet_row_limit']
+        shards = []
+        # 每個分區目前寫入中的分片
+        current = {}
+        partition_counts = {}
+        row_count = 0
+        for batch in self._record_batches(returns_data, partition_by):
+            for record in batch:
+                partition = self._partition_key(record, partition_by)
+                shard = current.get(partition)
+                if shard is None or shard.rows >= row_limit:
+                    sheet = wb.create_sheet(f"_shard{len(shards) + 1}")
+                    # 唯寫模式下欄寬必須在寫入第一列之前設定
+                    for index, (_, _, width) in enumerate(columns):
+                        sheet.column_dimensions[get_column_letter(index + 1)].width = width
+                    if preamble:
+                        preamble(sheet)
+                    sheet.append([self._cell(sheet, title, header_style) for _, title, _ in columns])
+                    partition_counts[partition] = partition_counts.get(partition, 0) + 1
+                    shard = _DetailShard(sheet, partition, partition_counts[partition])
+                    current[partition] = shard
+                    shards.append(shard)
+                try:
+                    shard.sheet.append([self._cell(shard.sheet, record.get(field), cell_style) for field, _, _ in columns])
+                except Exception as row_error:
+                    print(f"處理第 {row_count + 1} 筆資料時發生錯誤: {row_error}")
+                    continue
+                shard.add(record)
+                row_count += 1
+                self._report_rows_progress(progress, row_count, total, start, end, stage)
+        return shards
+    
+    def _sheet_title(self, base, used):
+        """產生合法且不重複的工作表名稱（最多 31 字元、不含 \\ / * ? : [ ]）"""
+        title = INVALID_SHEET_TITLE_CHARS.sub('_', base).strip("'")[:SHEET_TITLE_MAX_LENGTH] or "Sheet"
+        candidate = title
+        number = 2
+        while candidate.lower() in used:
+            suffix = f" ({number})"
+            candidate = title[:SHEET_TITLE_MAX_LENGTH - len(suffix)] + suffix
+            number += 1
+        used.add(candidate.lower())
+        return candidate
+    
+    def _name_shards(self, wb, shards, base_title, partition_by):
+        """依分區與分片數量命名工作表：只有一個分片時不加編號"""
+        shard_sheets = {id(shard.sheet) for shard in shards}
+        used = {sheet.title.lower() for sheet in wb.worksheets if id(sheet) not in shard_sheets}
+        counts = {}
+        for shard in shards:
+            counts[shard.partition] = counts.get(shard.partition, 0) + 1
+        
+        for shard in shards:
+            if partition_by is None:
+                title = base_title
+            else:
+                title = f"{REPORT_PARTITIONS[partition_by]}-{shard.partition or '未分類'}"
+            if counts[shard.partition] > 1:
+                title = f"{title} {shard.number}"
+            shard.sheet.title = self._sheet_title(title, used)
+    
+    def _create_summary_sheet(self, sheet, row_count, statistics_data, detail_sheet_count=1):
+        """建立摘要工作表"""
         # 設定欄寬
-        sheet.column_dimensions['A'].width = 15
-        sheet.column_dimensions['B'].width = 20
-        sheet.column_dimensions['C'].width = 25
-        sheet.column_dimensions['D'].width = 15
-        sheet.column_dimensions['E'].width = 20
-        sheet.column_dimensions['F'].width = 20
+        sheet.column_dimensions['A'].width = 20
+        sheet.column_dimensions['B'].width = 30
         
         # 標題
-        headers = ['ID', '訂單ID', '產品名稱', '商店名稱', '退貨日期', '建立時間']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+        sheet.append([self._cell(sheet, "退貨分析報告摘要", 'report_title')])
+        sheet.merged_cells.add('A1:B1')
+        sheet.append([])
         
-        # 資料
-        for row_idx, record in enumerate(returns_data, 2):
-            try:
-                # 安全地獲取資料
-                record_id = str(record.get('id', '')) if record.get('id') is not None else ''
-                order_id = str(record.get('order_id', '')) if record.get('order_id') is not None else ''
-                product = str(record.get('product', '')) if record.get('product') is not None else ''
-                store_name = str(record.get('store_name', '')) if record.get('store_name') is not None else ''
-                return_date = str(record.get('return_date', '')) if record.get('return_date') is not None else ''
-                created_at = str(record.get('created_at', '')) if record.get('created_at') is not None else ''
-                
-                sheet.cell(row=row_idx, column=1, value=record_id)
-                sheet.cell(row=row_idx, column=2, value=order_id)
-                sheet.cell(row=row_idx, column=3, value=product)
-                sheet.cell(row=row_idx, column=4, value=store_name)
-                sheet.cell(row=row_idx, column=5, value=return_date)
-                sheet.cell(row=row_idx, column=6, value=created_at)
-                
-            except Exception as row_error:
-                print(f"處理第 {row_idx} 行資料時發生錯誤: {row_error}")
-                continue
+        # 報告資訊
+        items = [
+            ("報告生成時間", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            ("總退貨記錄數", row_count),
+            ("詳細資料工作表數", detail_sheet_count),
+        ]
+        if statistics_data:
+            items.extend([
+                ("總退貨數量", statistics_data.get('total_returns', 0)),
+                ("涉及商店數量", len(statistics_data.get('store_stats', []))),
+                ("涉及產品數量", len(statistics_data.get('product_stats', []))),
+            ])
         
-        # 邊框樣式
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        for label, value in items:
+            sheet.append([self._cell(sheet, label, 'label'), self._cell(sheet, value, 'value')])
+    
+    def _create_details_sheets(self, wb, returns_data, params=None, progress=None, returns_count=None):
+        """建立詳細資料工作表（依分區與列數上限分成多個），返回各分片"""
+        params = normalize_report_params(params)
+        shards = self._write_sharded_records(
+            wb, returns_data, DETAIL_COLUMNS, 'detail_header', 'detail_cell', params,
+            progress, self._estimate_count(returns_data, returns_count), 30, 80, "寫入詳細資料"
         )
+        if not shards:
+            wb.create_sheet("詳細資料").append(["無退貨資料"])
+            return shards
         
-        for row in range(1, len(returns_data) + 2):
-            for col in range(1, len(headers) + 1):
-                try:
-                    sheet.cell(row=row, column=col).border = thin_border
-                except:
-                    pass
+        self._name_shards(wb, shards, "詳細資料", params['partition_by'])
+        return shards
+    
+    def _create_index_sheet(self, sheet, shards, partition_by=None):
+        """建立詳細資料索引：列出每個詳細資料工作表的分區、筆數與日期範圍，並連結到該工作表"""
+        for column, width in zip('ABCD', (30, 20, 12, 28)):
+            sheet.column_dimensions[column].width = width
+        
+        sheet.append([self._cell(sheet, "詳細資料索引", 'sheet_title')])
+        sheet.append([])
+        sheet.append([
+            self._cell(sheet, "分區方式", 'label'),
+            self._cell(sheet, REPORT_PARTITIONS.get(partition_by, "不分區"), 'value')
+        ])
+        sheet.append([])
+        
+        headers = ['工作表', REPORT_PARTITIONS.get(partition_by, '分區'), '筆數', '退貨日期範圍']
+        sheet.append([self._cell(sheet, header, 'table_header') for header in headers])
+        if not shards:
+            sheet.append(["無退貨資料"])
+            return
+        
+        for shard in shards:
+            title = shard.sheet.title
+            link = self._cell(sheet, title, 'Hyperlink')
+            link.hyperlink = Hyperlink(ref="", location="'{}'!A1".format(title.replace("'", "''")))
+            date_range = f"{shard.first_date} ~ {shard.last_date}" if shard.first_date else ""
+            partition = "全部" if partition_by is None else (shard.partition or "未分類")
+            sheet.append([link, partition, shard.rows, date_range])
+    
+    def _append_stats_table(self, sheet, title, headers, stats, key):
+        """寫入一個統計區塊：區塊標題、表頭與各列，之後空一列"""
+        sheet.append([self._cell(sheet, title, 'section_title')])
+        sheet.append([self._cell(sheet, header, 'table_header') for header in headers])
+        for stat in stats:
+            sheet.append([stat.get(key, ''), stat.get('count', 0)])
+        sheet.append([])
     
     def _create_analysis_sheet(self, sheet, statistics_data):
         """建立分析工作表"""
         if not statistics_data:
-            sheet['A1'] = "無統計資料"
+            sheet.append(["無統計資料"])
             return
         
         # 設定欄寬
@@ -188,70 +518,29 @@ class ReportAgent:
         sheet.column_dimensions['B'].width = 15
         
         # 標題
-        sheet['A1'] = "退貨分析"
-        sheet['A1'].font = Font(bold=True, size=14)
-        
-        # 商店統計
-        sheet['A3'] = "按商店統計"
-        sheet['A3'].font = Font(bold=True, size=12)
+        sheet.append([self._cell(sheet, "退貨分析", 'sheet_title')])
+        sheet.append([])
         
         headers = ['商店名稱', '退貨數量']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=4, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
-        
-        store_stats = statistics_data.get('store_stats', [])
-        for row_idx, stat in enumerate(store_stats, 5):
-            sheet.cell(row=row_idx, column=1, value=stat.get('store_name', ''))
-            sheet.cell(row=row_idx, column=2, value=stat.get('count', 0))
-        
-        # 產品統計
-        start_row = 5 + len(store_stats) + 2
-        sheet[f'A{start_row}'] = "按產品統計"
-        sheet[f'A{start_row}'].font = Font(bold=True, size=12)
-        
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=start_row + 1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
-        
-        product_stats = statistics_data.get('product_stats', [])
-        for row_idx, stat in enumerate(product_stats, start_row + 2):
-            sheet.cell(row=row_idx, column=1, value=stat.get('product', ''))
-            sheet.cell(row=row_idx, column=2, value=stat.get('count', 0))
-        
-        # 月份統計
-        month_start_row = start_row + 2 + len(product_stats) + 2
-        sheet[f'A{month_start_row}'] = "按月份統計"
-        sheet[f'A{month_start_row}'].font = Font(bold=True, size=12)
-        
-        month_headers = ['月份', '退貨數量']
-        for col, header in enumerate(month_headers, 1):
-            cell = sheet.cell(row=month_start_row + 1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
-        
-        monthly_stats = statistics_data.get('monthly_stats', [])
-        for row_idx, stat in enumerate(monthly_stats, month_start_row + 2):
-            sheet.cell(row=row_idx, column=1, value=stat.get('month', ''))
-            sheet.cell(row=row_idx, column=2, value=stat.get('count', 0))
+        self._append_stats_table(sheet, "按商店統計", headers, statistics_data.get('store_stats', []), 'store_name')
+        self._append_stats_table(sheet, "按產品統計", headers, statistics_data.get('product_stats', []), 'product')
+        self._append_stats_table(sheet, "按月份統計", ['月份', '退貨數量'], statistics_data.get('monthly_stats', []), 'month')
     
-    def _create_findings_sheet(self, sheet, returns_data, statistics_data):
+    def _create_findings_sheet(self, sheet, row_count, statistics_data):
         """建立發現工作表"""
         # 設定欄寬
         sheet.column_dimensions['A'].width = 20
         sheet.column_dimensions['B'].width = 50
         
         # 標題
-        sheet['A1'] = "主要發現"
-        sheet['A1'].font = Font(bold=True, size=14)
+        sheet.append([self._cell(sheet, "主要發現", 'sheet_title')])
+        sheet.append([])
         
         findings = []
         
-        if returns_data:
+        if row_count:
             findings.append("退貨記錄總覽")
-            findings.append(f"系統中共有 {len(returns_data)} 筆退貨記錄")
+            findings.append(f"系統中共有 {row_count} 筆退貨記錄")
             
             if statistics_data:
                 total_returns = statistics_data.get('total_returns', 0)
@@ -273,19 +562,14 @@ class ReportAgent:
                     findings.append(f"最近月份退貨數量: {recent_month.get('month', '')} ({recent_month.get('count', 0)} 筆)")
         
         # 寫入發現內容
-        for row_idx, finding in enumerate(findings, 3):
-            if row_idx == 3:  # 第一個發現
-                sheet.cell(row=row_idx, column=1, value="發現項目").font = Font(bold=True)
-                sheet.cell(row=row_idx, column=2, value="內容").font = Font(bold=True)
-                row_idx += 1
-            
-            sheet.cell(row=row_idx, column=1, value=f"發現 {row_idx - 3}")
-            sheet.cell(row=row_idx, column=2, value=finding)
+        if findings:
+            sheet.append([self._cell(sheet, "發現項目", 'label'), self._cell(sheet, "內容", 'label')])
+            for index, finding in enumerate(findings, 1):
+                sheet.append([f"發現 {index}", finding])
+        sheet.append([])
         
         # 建議
-        suggestions_start_row = len(findings) + 5
-        sheet[f'A{suggestions_start_row}'] = "建議"
-        sheet[f'A{suggestions_start_row}'].font = Font(bold=True, size=12)
+        sheet.append([self._cell(sheet, "建議", 'section_title')])
         
         suggestions = [
             "定期分析退貨趨勢，識別問題產品",
@@ -295,64 +579,31 @@ class ReportAgent:
         ]
         
         for idx, suggestion in enumerate(suggestions, 1):
-            sheet.cell(row=suggestions_start_row + idx, column=1, value=f"建議 {idx}")
-            sheet.cell(row=suggestions_start_row + idx, column=2, value=suggestion)
+            sheet.append([f"建議 {idx}", suggestion])
     
-    def generate_simple_report(self, returns_data):
-        """生成簡單報告（用於快速測試）"""
+    def generate_simple_report(self, returns_data, progress=None, data_version=None, returns_count=None, params=None):
+        """生成簡單報告（用於快速測試；提供 data_version 時使用報告快取，returns_data 與 params 同 generate_excel_report）"""
         try:
+            params = normalize_report_params(params)
+            cached = self.find_cached_report('simple', data_version, params)
+            if cached:
+                print(f"使用已快取的報告: {cached['data']['filename']}")
+                return cached
+            
             print(f"開始生成簡單報告，資料類型: {type(returns_data)}")
-            print(f"資料長度: {len(returns_data) if returns_data is not None else 'None'}")
             
             # 確保報告目錄存在
             self._ensure_reports_directory()
             
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "退貨記錄"
-            
-            # 標題
-            ws['A1'] = "退貨記錄報告"
-            ws['A1'].font = Font(bold=True, size=16)
-            
-            # 檢查資料
-            if returns_data is not None and len(returns_data) > 0:
-                print(f"處理 {len(returns_data)} 筆記錄")
-                
-                # 標題行
-                headers = ['訂單ID', '產品', '商店名稱', '日期']
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=3, column=col, value=header)
-                    cell.font = Font(bold=True)
-                
-                # 資料
-                for row_idx, record in enumerate(returns_data, 4):
-                    try:
-                        # 安全地獲取資料
-                        order_id = str(record.get('order_id', '')) if record.get('order_id') is not None else ''
-                        product = str(record.get('product', '')) if record.get('product') is not None else ''
-                        store_name = str(record.get('store_name', '')) if record.get('store_name') is not None else ''
-                        return_date = str(record.get('return_date', '')) if record.get('return_date') is not None else ''
-                        
-                        ws.cell(row=row_idx, column=1, value=order_id)
-                        ws.cell(row=row_idx, column=2, value=product)
-                        ws.cell(row=row_idx, column=3, value=store_name)
-                        ws.cell(row=row_idx, column=4, value=return_date)
-                        
-                    except Exception as row_error:
-                        print(f"處理第 {row_idx} 行資料時發生錯誤: {row_error}")
-                        continue
-            else:
-                print("沒有退貨資料，建立空報告")
-                ws['A3'] = "暫無退貨記錄"
+            wb, row_count = self._build_simple_workbook(returns_data, progress, returns_count, params)
             
             # 儲存
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"simple_report_{timestamp}.xlsx"
+            filename = self._report_filename('simple', data_version, params)
             filepath = os.path.join(self.reports_dir, filename)
             
             print(f"儲存報告到: {filepath}")
-            wb.save(filepath)
+            self._report_progress(progress, 90, "儲存報告檔案")
+            self._save_workbook(wb, filepath)
             print("報告儲存成功")
             
             return {
@@ -360,7 +611,10 @@ class ReportAgent:
                 'message': '簡單報告生成成功',
                 'data': {
                     'filename': filename,
-                    'filepath': filepath
+                    'filepath': filepath,
+                    'sheets': wb.sheetnames,
+                    'returns_count': row_count,
+                    'cached': False
                 }
             }
             
@@ -0,0 +1,307 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from db_pool import get_pool
+from database import encode_cursor, decode_cursor, normalize_page_size
+from report_agent import REPORT_PREFIXES, REPORT_CACHE_MAX_AGE_SEC
+
+# 報告保留政策：超過數量、總大小或存放時間的舊報告由背景執行緒刪除（最新的一份永遠保留）
+REPORT_RETENTION_MAX_COUNT = 200
+REPORT_RETENTION_MAX_BYTES = 512 * 1024 * 1024
+# 超過報告快取有效期的檔案不會再被使用
+REPORT_RETENTION_MAX_AGE_SEC = REPORT_CACHE_MAX_AGE_SEC
+# 沒有新報告時的定期檢查間隔（有新報告時會立即檢查）
+REPORT_RETENTION_INTERVAL_SEC = 600
+
+# 報告先寫入暫存檔再改名；只清除超過此時間未更新的暫存檔（其他行程或重新啟動前的報告行程可能仍在寫入）
+REPORT_TMP_MAX_AGE_SEC = 24 * 3600
+
+REPORT_COLUMNS = 'id, filename, report_type, params, data_version, size, returns_count, sheets, created_at'
+
+
+def _report_row(columns, values):
+    report = dict(zip(columns, values))
+    report['params'] = json.loads(report['params']) if report['params'] else None
+    report['sheets'] = json.loads(report['sheets']) if report['sheets'] else None
+    return report
+
+
+def read_reports_page(conn, limit=None, cursor=None, report_type=None):
+    """以 keyset 分頁讀取報告目錄（依建立時間由新到舊），每頁成本與報告總數無關"""
+    limit = normalize_page_size(limit)
+    conditions = []
+    params = []
+    if report_type:
+        conditions.append("report_type = ?")
+        params.append(report_type)
+    if cursor:
+        last_created, last_id = decode_cursor(cursor)
+        conditions.append("(created_at, id) < (?, ?)")
+        params.extend([last_created, last_id])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit + 1)
+
+    result = conn.execute(
+        f"SELECT {REPORT_COLUMNS} FROM reports {where} ORDER BY created_at DESC, id DESC LIMIT ?", params
+    )
+    columns = [col[0] for col in result.description]
+    rows = [_report_row(columns, values) for values in result.fetchall()]
+
+    has_more = len(rows) > limit
+    reports = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = reports[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+
+    return {
+        'reports': reports,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'limit': limit
+    }
+
+
+def read_catalog_version(conn):
+    row = conn.execute("SELECT value FROM metadata WHERE key = 'reports_version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def read_catalog_totals(conn):
+    """報告目錄的份數、總大小與版本（目錄每次變更遞增）"""
+    count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reports").fetchone()
+    return {
+        'reports_count': count,
+        'total_bytes': total_bytes,
+        'version': read_catalog_version(conn)
+    }
+
+
+class ReportCatalog:
+    """報告目錄：產生報告時寫入 reports 表格，列表與保留政策只查詢表格；背景執行緒依保留政策刪除舊報告"""
+
+    def __init__(self, db_path, reports_dir="reports", max_count=REPORT_RETENTION_MAX_COUNT,
+                 max_bytes=REPORT_RETENTION_MAX_BYTES, max_age_sec=REPORT_RETENTION_MAX_AGE_SEC,
+                 interval_sec=REPORT_RETENTION_INTERVAL_SEC):
+        self.pool = get_pool(db_path)
+        self.reports_dir = reports_dir
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.interval_sec = interval_sec
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'recorded': 0,
+            'pruned': 0,
+            'pruned_bytes': 0,
+            'last_prune_at': None,
+        }
+
+    def _bump_version(self, conn):
+        conn.execute('''
+            INSERT INTO metadata (key, value) VALUES ('reports_version', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+        ''')
+
+    def record(self, filename, report_type, params=None, data_version=None, returns_count=None, sheets=None):
+        """記錄一份剛產生的報告（同名檔案重新產生時更新）與其工作表名稱，返回目錄中的資料"""
+        file_stat = os.stat(os.path.join(self.reports_dir, filename))
+        created_at = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                INSERT INTO reports (filename, report_type, params, data_version, size, returns_count, sheets, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    report_type = excluded.report_type, params = excluded.params,
+                    data_version = excluded.data_version, size = excluded.size,
+                    returns_count = excluded.returns_count, sheets = excluded.sheets,
+                    created_at = excluded.created_at
+            ''', (filename, report_type, json.dumps(params, ensure_ascii=False, sort_keys=True) if params else None,
+                  data_version, file_stat.st_size, returns_count,
+                  json.dumps(sheets, ensure_ascii=False) if sheets else None, created_at))
+            self._bump_version(conn)
+            result = conn.execute(f"SELECT {REPORT_COLUMNS} FROM reports WHERE filename = ?", (filename,))
+            report = _report_row([col[0] for col in result.description], result.fetchone())
+
+        with self._lock:
+            self._stats['recorded'] += 1
+        # 新報告可能讓份數或總大小超過上限，通知背景執行緒檢查
+        self._wake.set()
+        return report
+
+    def get_sheets(self, filename):
+        """報告產生時記錄的工作表名稱，沒有記錄時返回 None"""
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT sheets FROM reports WHERE filename = ?", (filename,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def list_reports(self, limit=None, cursor=None, report_type=None):
+        """分頁列出報告（依建立時間由新到舊）"""
+        with self.pool.reader() as conn:
+            return read_reports_page(conn, limit, cursor, report_type)
+
+    def get_version(self):
+        """報告目錄的版本（每次新增或刪除報告時遞增），作為列表的快取驗證值"""
+        with self.pool.reader() as conn:
+            return read_catalog_version(conn)
+
+    def get_totals(self):
+        """報告目錄的份數、總大小與版本"""
+        with self.pool.reader() as conn:
+            return read_catalog_totals(conn)
+
+    def get_stats(self):
+        """取得報告目錄與保留政策的狀況"""
+        stats = self.get_totals()
+        with self._lock:
+            stats.update(self._stats)
+        stats.update({
+            'max_count': self.max_count,
+            'max_bytes': self.max_bytes,
+            'max_age_sec': self.max_age_sec,
+        })
+        return stats
+
+    def _select_expired(self, conn, now):
+        """依保留政策選出要刪除的報告（由新到舊累計份數與大小，最新的一份保留）"""
+        cutoff = datetime.fromtimestamp(now - self.max_age_sec).isoformat()
+        rows = conn.execute(
+            "SELECT id, filename, size, created_at FROM reports ORDER BY created_at DESC, id DESC"
+        ).fetchall()
+        expired = []
+        total_bytes = 0
+        for position, (report_id, filename, size, created_at) in enumerate(rows, 1):
+            total_bytes += size
+            if position > 1 and (position > self.max_count or total_bytes > self.max_bytes or created_at < cutoff):
+                expired.append((report_id, filename, size, created_at))
+        return expired
+
+    def prune(self, now=None):
+        """刪除超出保留政策的報告檔案與目錄記錄，返回刪除的份數"""
+        now = time.time() if now is None else now
+        with self.pool.reader() as conn:
+            expired = self._select_expired(conn, now)
+
+        removed = []
+        for report_id, filename, size, created_at in expired:
+            try:
+                os.remove(os.path.join(self.reports_dir, filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # 檔案無法刪除時保留記錄，下次再試
+                print(f"刪除報告 {filename} 失敗: {e}")
+                continue
+            removed.append((report_id, size, created_at))
+
+        removed_bytes = sum(size for _, size, _ in removed)
+        if removed:
+            with self.pool.transaction() as conn:
+                # 比對建立時間，刪除期間重新產生的同名報告不會被移除
+                conn.executemany(
+                    "DELETE FROM reports WHERE id = ? AND created_at = ?",
+                    [(report_id, created_at) for report_id, _, created_at in removed]
+                )
+                self._bump_version(conn)
+            print(f"已依保留政策清除 {len(removed)} 份報告（{removed_bytes / 1024 / 1024:.1f} MB）")
+
+        with self._lock:
+            self._stats['pruned'] += len(removed)
+            self._stats['pruned_bytes'] += removed_bytes
+            self._stats['last_prune_at'] = datetime.fromtimestamp(now).isoformat()
+        return len(removed)
+
+    def sync(self, now=None):
+        """比對 reports/ 目錄與報告目錄：補上未記錄的既有報告、移除檔案已不存在的記錄、
+        清除超過 REPORT_TMP_MAX_AGE_SEC 的殘留暫存檔；只在啟動時執行一次，返回 (新增, 移除) 份數"""
+        now = time.time() if now is None else now
+        os.makedirs(self.reports_dir, exist_ok=True)
+        files = {}
+        for filename in os.listdir(self.reports_dir):
+            filepath = os.path.join(self.reports_dir, filename)
+            if filename.endswith('.tmp'):
+                try:
+                    if now - os.stat(filepath).st_mtime > REPORT_TMP_MAX_AGE_SEC:
+                        os.remove(filepath)
+                except OSError:
+                    pass
+            elif filename.endswith('.xlsx'):
+                try:
+                    files[filename] = os.stat(filepath)
+                except OSError:
+                    continue
+
+        with self.pool.transaction() as conn:
+            known = {filename for (filename,) in conn.execute("SELECT filename FROM reports")}
+            missing = known - set(files)
+            untracked = [
+                (filename, self._guess_report_type(filename), file_stat.st_size,
+                 datetime.fromtimestamp(file_stat.st_mtime).isoformat())
+                for filename, file_stat in files.items() if filename not in known
+            ]
+            conn.executemany("DELETE FROM reports WHERE filename = ?", [(filename,) for filename in missing])
+            conn.executemany(
+                "INSERT INTO reports (filename, report_type, size, created_at) VALUES (?, ?, ?, ?)", untracked
+            )
+            if missing or untracked:
+                self._bump_version(conn)
+
+        if missing or untracked:
+            print(f"報告目錄已同步：新增 {len(untracked)} 份，移除 {len(missing)} 份")
+        return len(untracked), len(missing)
+
+    def _guess_report_type(self, filename):
+        """依檔名前綴判斷未記錄的既有報告類型"""
+        for report_type, prefix in REPORT_PREFIXES.items():
+            if filename.startswith(prefix):
+                return report_type
+        return 'unknown'
+
+    def start(self):
+        """啟動背景保留政策執行緒（先與目錄同步一次）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="report-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景保留政策執行緒"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"報告目錄同步失敗: {e}")
+        while not self._stop.is_set():
+            try:
+                self.prune()
+            except Exception as e:
+                print(f"報告保留政策執行失敗: {e}")
+            self._wake.wait(self.interval_sec)
+            self._wake.clear()
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_report_catalog(db_path, **kwargs):
+    """取得（或建立）指定資料庫檔案共用的報告目錄"""
+    key = os.path.abspath(db_path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = ReportCatalog(db_path, **kwargs)
+            _catalogs[key] = catalog
+        return catalog
@@ -0,0 +1,319 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from events import get_event_bus
+from executors import submit_report, get_progress_queue
+from report_agent import ReportAgent, normalize_report_params
+from report_catalog import get_report_catalog
+
+# 同時排隊與執行中的報告工作上限（實際並行數由報告行程池的 REPORT_WORKERS 限制）
+MAX_ACTIVE_JOBS = 16
+# 保留在記憶體中供查詢的已結束工作數量
+MAX_FINISHED_JOBS = 200
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class JobQueueFullError(Exception):
+    """排隊中的報告工作已達上限"""
+    pass
+
+
+class ReportJob:
+    """一個報告產生工作的狀態"""
+
+    def __init__(self, report_type, data_version, params=None):
+        self.id = uuid.uuid4().hex
+        self.report_type = report_type
+        self.data_version = data_version
+        self.params = params or {}
+        self.status = JOB_QUEUED
+        self.progress = 0
+        self.stage = "等待報告行程"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def progress_dict(self):
+        """工作狀態與進度"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'stage': self.stage,
+        }
+
+    def to_dict(self):
+        """工作的完整資訊，完成時包含下載連結"""
+        data = self.progress_dict()
+        data.update({
+            'report_type': self.report_type,
+            'params': self.params,
+            'data_version': self.data_version,
+            'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+            'duration_sec': round(self.finished_at - (self.started_at or self.created_at), 3) if self.finished_at else None,
+            'result': self.result,
+            'error': self.error,
+            'status_url': f"/api/jobs/{self.id}",
+            'progress_url': f"/api/jobs/{self.id}/progress",
+            'download_url': f"/api/jobs/{self.id}/download" if self.status == JOB_COMPLETED else None,
+        })
+        return data
+
+
+def _job_key(report_type, data_version, params):
+    return (report_type, data_version, tuple(sorted(params.items())))
+
+
+def describe_submission(job, created, label="報告"):
+    """提交報告工作後返回給使用者的訊息"""
+    if job.status == JOB_COMPLETED and (job.result or {}).get('cached'):
+        return f"資料未變更，直接使用已產生的{label}"
+    if created:
+        return f"{label}工作已提交"
+    return f"相同資料版本的{label}工作已在進行中"
+
+
+class ReportJobManager:
+    """報告工作佇列：提交後立即返回工作 ID，由報告行程池在背景產生報告"""
+
+    def __init__(self, db_path, max_active_jobs=MAX_ACTIVE_JOBS, max_finished_jobs=MAX_FINISHED_JOBS):
+        self.db_path = db_path
+        self.max_active_jobs = max_active_jobs
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        # (report_type, data_version, 參數) -> 排隊或執行中的工作，重複提交會併入同一個工作
+        self._active = {}
+        self._lock = threading.Lock()
+        self._report_agent = ReportAgent()
+        self._stats = {
+            'submitted': 0,
+            'deduplicated': 0,
+            'cache_hits': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+        }
+
+    def submit(self, report_type, data_version, params=None):
+        """提交報告工作，返回 (job, created)；同一資料版本與參數已有進行中的工作時直接返回該工作，
+        已有相同資料版本與參數的報告時返回一個已完成的工作（params 無效時拋出 ValueError）；
+        會檢查報告檔案並讀取報告目錄，在事件迴圈中須以 run_db 呼叫"""
+        params = normalize_report_params(params)
+        key = _job_key(report_type, data_version, params)
+        cached = self._report_agent.find_cached_report(report_type, data_version, params)
+        if cached:
+            job = ReportJob(report_type, data_version, params)
+            with self._lock:
+                self._jobs[job.id] = job
+                self._stats['cache_hits'] += 1
+            result = dict(cached['data'])
+            result['data_version'] = data_version
+            result['sheets'] = self._cached_sheets(result['filename'])
+            self._finish(job, result=result)
+            return job, True
+
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id is not None:
+                self._stats['deduplicated'] += 1
+                return self._jobs[job_id], False
+            if len(self._active) >= self.max_active_jobs:
+                self._stats['rejected'] += 1
+                raise JobQueueFullError(f"進行中的報告工作已達上限 {self.max_active_jobs} 個，請稍後再試")
+
+            job = ReportJob(report_type, data_version, params)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+            self._stats['submitted'] += 1
+
+        _ensure_progress_listener()
+        try:
+            future = submit_report(self.db_path, report_type, job.id, params)
+        except Exception as e:
+            self._finish(job, error=str(e))
+            raise
+        future.add_done_callback(lambda f: self._on_done(job, f))
+        return job, True
+
+    def get(self, job_id):
+        """取得工作，不存在時返回 None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, limit=50):
+        """依提交時間由新到舊列出工作"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        jobs.reverse()
+        return [job.to_dict() for job in jobs[:limit]]
+
+    def get_stats(self):
+        """取得工作佇列統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            statuses = [job.status for job in self._jobs.values()]
+        for status in (JOB_QUEUED, JOB_RUNNING):
+            stats[status] = statuses.count(status)
+        stats['max_active_jobs'] = self.max_active_jobs
+        return stats
+
+    def _on_progress(self, job_id, percent, stage):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # 工作結束後才到達的進度訊息直接忽略
+            if job is None or job.finished:
+                return
+            if job.status == JOB_QUEUED:
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+            job.progress = max(job.progress, min(int(percent), 99))
+            job.stage = stage
+
+    def _on_done(self, job, future):
+        try:
+            job_result = future.result()
+        except Exception as e:
+            self._finish(job, error=f"報告行程執行失敗: {e}")
+            return
+
+        report = job_result['report']
+        if report.get('status') != 'success':
+            self._finish(job, error=report.get('message', '報告生成失敗'))
+            return
+
+        result = dict(report.get('data', {}))
+        if job_result['returns_count'] is not None:
+            result['returns_count'] = job_result['returns_count']
+        result['data_version'] = job_result.get('data_version')
+        if result.get('cached'):
+            # 報告行程在提交之後才命中快取（例如同時有另一個工作剛完成）
+            result['sheets'] = self._cached_sheets(result.get('filename'))
+        self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            job.finished_at = time.time()
+            if job.started_at is None:
+                job.started_at = job.finished_at
+            if error is None:
+                job.status = JOB_COMPLETED
+                job.progress = 100
+                job.stage = "報告已完成"
+                job.result = result
+                self._stats['completed'] += 1
+            else:
+                job.status = JOB_FAILED
+                job.stage = "報告產生失敗"
+                job.error = error
+                self._stats['failed'] += 1
+            key = _job_key(job.report_type, job.data_version, job.params)
+            if self._active.get(key) == job.id:
+                del self._active[key]
+            self._trim_finished()
+
+        if error is None:
+            print(f"報告工作 {job.id} 完成: {result.get('filename')}")
+            if not result.get('cached'):
+                self._record_report(job, result)
+        else:
+            print(f"報告工作 {job.id} 失敗: {error}")
+
+    def _cached_sheets(self, filename):
+        """已快取報告的工作表名稱（產生時記錄在報告目錄中），讀取失敗或沒有記錄時返回 None"""
+        try:
+            return get_report_catalog(self.db_path).get_sheets(filename)
+        except Exception as e:
+            print(f"讀取報告 {filename} 的工作表名稱失敗: {e}")
+            return None
+
+    def _record_report(self, job, result):
+        """將新報告寫入報告目錄，並通知開啟中的儀表板"""
+        filepath = result.get('filepath')
+        if not filepath or not os.path.exists(filepath):
+            return
+        try:
+            report = get_report_catalog(self.db_path).record(
+                result.get('filename'), job.report_type, params=job.params,
+                data_version=job.data_version, returns_count=result.get('returns_count'),
+                sheets=result.get('sheets')
+            )
+        except Exception as e:
+            print(f"記錄報告 {result.get('filename')} 失敗: {e}")
+            return
+        report['job_id'] = job.id
+        get_event_bus(self.db_path).publish('report', report)
+
+    def _trim_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def report_path(self, job):
+        """已完成工作的報告檔案路徑，檔案不存在時返回 None"""
+        if job.status != JOB_COMPLETED or not job.result:
+            return None
+        filepath = job.result.get('filepath')
+        if not filepath or not os.path.exists(filepath):
+            return None
+        return filepath
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+_listener = None
+_listener_queue = None
+
+
+def get_job_manager(db_path, **kwargs):
+    """取得（或建立）指定資料庫檔案共用的報告工作佇列"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ReportJobManager(db_path, **kwargs)
+            _managers[key] = manager
+        return manager
+
+
+def _listen_progress(progress_queue):
+    """讀取報告行程回報的進度，分派給對應的工作"""
+    while True:
+        try:
+            item = progress_queue.get()
+        except (EOFError, OSError):
+            return
+        if item is None:
+            return
+        job_id, percent, stage = item
+        with _managers_lock:
+            managers = list(_managers.values())
+        for manager in managers:
+            manager._on_progress(job_id, percent, stage)
+
+
+def _ensure_progress_listener():
+    global _listener, _listener_queue
+    progress_queue = get_progress_queue()
+    with _managers_lock:
+        if _listener is not None and _listener.is_alive() and _listener_queue is progress_queue:
+            return
+        _listener_queue = progress_queue
+        _listener = threading.Thread(target=_listen_progress, args=(progress_queue,),
+                                     name="report-progress", daemon=True)
+        _listener.start()
@@ -0,0 +1,129 @@
+import copy
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def estimate_size(obj):
+    """估算快取項目佔用的記憶體（位元組）"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_size(key) + estimate_size(value) for key, value in obj.items()
+        )
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_size(item) for item in obj)
+    return sys.getsizeof(obj)
+
+
+def copy_result(value):
+    """返回快取值的副本，避免呼叫端修改到快取內容"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+class ResultCache:
+    """以資料版本為鍵的一部分、具記憶體上限的 LRU 結果快取"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self._latest_version = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'oversized': 0,
+        }
+
+    def _remove(self, key):
+        size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+
+    def _observe_version(self, version):
+        """看到新的資料版本時，丟棄所有舊版本的項目"""
+        if self._latest_version is not None and version <= self._latest_version:
+            return
+        self._latest_version = version
+        stale = [key for key in self._entries if key[-1] < version]
+        for key in stale:
+            self._remove(key)
+        self._stats['invalidations'] += len(stale)
+
+    def get_or_compute(self, name, args, version, compute):
+        """以 (方法名稱, 參數, 資料版本) 查詢快取，未命中時執行 compute 並存入"""
+        key = (name, args, version)
+        with self._lock:
+            self._observe_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return copy_result(entry[1])
+            self._stats['misses'] += 1
+
+        value = compute()
+        size = estimate_size(value)
+
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats['oversized'] += 1
+                return value
+            if self._latest_version is not None and version < self._latest_version:
+                # 計算期間資料已更新，結果不再存入快取
+                return value
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (size, value)
+            self._current_bytes += size
+            while self._entries and (self._current_bytes > self.max_bytes
+                                     or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+        return copy_result(value)
+
+    def clear(self):
+        """清除所有快取項目"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def get_stats(self):
+        """取得快取使用狀況"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0,
+                'data_version': self._latest_version,
+            })
+        return stats
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path, **kwargs):
+    """取得（或建立）指定資料庫檔案共用的結果快取"""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResultCache(**kwargs)
+            _caches[key] = cache
+        return cache
@@ -2,14 +2,19 @@ import pandas as pd
 import re
 from datetime import datetime
 from database import DatabaseManager
+from query_planner import QueryPlanner
 import os
 
+# 無法解析日期範圍時的提示
+DATE_FORMAT_HINT = '無法解析日期範圍。請使用例如：2024-01-01 到 2024-01-31、最近7天、上個月、本週、2024年3月'
+
 class RetrievalAgent:
     def __init__(self):
         self.db_manager = DatabaseManager()
+        self.planner = QueryPlanner(self.db_manager)
         self.csv_data = None
     
-    def process_natural_language(self, prompt):
+    def process_natural_language(self, prompt, limit=None, cursor=None):
         """處理自然語言提示詞，識別意圖並執行相應操作"""
         prompt_lower = prompt.lower()
         
@@ -19,7 +24,7 @@ class RetrievalAgent:
         
         # 識別查詢退貨記錄的意圖
         elif any(word in prompt_lower for word in ['查詢', '顯示', '列出', '查詢', 'query', 'show', 'list']):
-            return self._query_returns(prompt)
+            return self._query_returns(prompt, limit=limit, cursor=cursor)
         
         # 識別導入 CSV 的意圖
         elif any(word in prompt_lower for word in ['導入', '上傳', 'import', 'upload']):
@@ -37,6 +42,11 @@ class RetrievalAgent:
     
     def _extract_and_insert_return(self, prompt):
         """從自然語言中提取退貨資訊並插入資料庫"""
+        # 多行（或以分號分隔）各含一筆訂單時，合併為一個批次交易寫入
+        segments = [segment for segment in re.split(r'[\n；;]+', prompt) if re.search(r'訂單ID', segment)]
+        if len(segments) > 1:
+            return self._insert_returns_batch(segments)
+        
         try:
             # 使用正則表達式提取資訊
             order_id_match = re.search(r'訂單ID\s*(\w+)', prompt)
@@ -67,20 +77,16 @@ class RetrievalAgent:
             # 插入資料庫
             record_id = self.db_manager.insert_return(order_id, product, store_name, return_date)
             
-            # 獲取當前所有退貨記錄
-            all_returns = self.db_manager.get_all_returns()
+            # 只返回新記錄與其資料版本，客戶端以此增量更新
+            new_record = self.db_manager.get_return(record_id)
             
             return {
                 'status': 'success',
                 'message': f'成功新增退貨記錄，記錄ID: {record_id}',
                 'data': {
-                    'new_record': {
-                        'order_id': order_id,
-                        'product': product,
-                        'store_name': store_name,
-                        'return_date': return_date
-                    },
-                    'all_returns': all_returns.to_dict('records')
+                    'record_id': record_id,
+                    'new_record': new_record,
+                    'data_version': new_record['version'] if new_record else self.db_manager.get_data_version()
                 }
             }
             
@@ -90,61 +96,65 @@ class RetrievalAgent:
                 'message': f'處理新增退貨記錄時發生錯誤: {str(e)}'
             }
     
-    def _query_returns(self, prompt):
-        """查詢退貨記錄"""
+    def _insert_returns_batch(self, segments):
+        """從多段文字各提取一筆退貨資訊，以批次交易寫入並返回筆數與記錄ID"""
         try:
-            prompt_lower = prompt.lower()
+            patterns = {
+                'order_id': r'訂單ID\s*(\w+)',
+                'product': r'產品名稱\s*([^，,]+)',
+                'store_name': r'商店名稱\s*([^，,]+)',
+                'return_date': r'日期\s*(\d{4}-\d{2}-\d{2})'
+            }
+            items = []
+            for segment in segments:
+                item = {}
+                for field, pattern in patterns.items():
+                    match = re.search(pattern, segment)
+                    item[field] = match.group(1).strip() if match else None
+                items.append(item)
             
-            # 根據查詢條件獲取資料
-            if '全部' in prompt_lower or '所有' in prompt_lower:
-                returns = self.db_manager.get_all_returns()
-                return {
-                    'status': 'success',
-                    'message': f'共找到 {len(returns)} 筆退貨記錄',
-                    'data': returns.to_dict('records')
-                }
+            result = self.db_manager.insert_returns_bulk(items)
             
-            # 按日期範圍查詢
-            elif '日期' in prompt_lower or '期間' in prompt_lower:
-                # 這裡可以進一步解析日期範圍
-                returns = self.db_manager.get_all_returns()
-                return {
-                    'status': 'success',
-                    'message': f'共找到 {len(returns)} 筆退貨記錄',
-                    'data': returns.to_dict('records')
+            return {
+                'status': 'success' if result['inserted_count'] else 'error',
+                'message': f'成功新增 {result["inserted_count"]} 筆退貨記錄，{result["error_count"]} 筆失敗',
+                'data': {
+                    'inserted_count': result['inserted_count'],
+                    'error_count': result['error_count'],
+                    'errors': result['errors'],
+                    'ids': result['ids'],
+                    'data_version': self.db_manager.get_data_version()
                 }
+            }
             
-            # 按商店查詢
-            elif '商店' in prompt_lower:
-                store_match = re.search(r'商店\s*([^，,]+)', prompt)
-                if store_match:
-                    store_name = store_match.group(1).strip()
-                    returns = self.db_manager.get_returns_by_store(store_name)
-                    return {
-                        'status': 'success',
-                        'message': f'商店 "{store_name}" 共有 {len(returns)} 筆退貨記錄',
-                        'data': returns.to_dict('records')
-                    }
-            
-            # 按產品查詢
-            elif '產品' in prompt_lower:
-                product_match = re.search(r'產品\s*([^，,]+)', prompt)
-                if product_match:
-                    product = product_match.group(1).strip()
-                    returns = self.db_manager.get_returns_by_product(product)
-                    return {
-                        'status': 'success',
-                        'message': f'產品 "{product}" 共有 {len(returns)} 筆退貨記錄',
-                        'data': returns.to_dict('records')
-                    }
-            
-            # 預設返回所有記錄
-            returns = self.db_manager.get_all_returns()
+        except Exception as e:
             return {
-                'status': 'success',
-                'message': f'共找到 {len(returns)} 筆退貨記錄',
-                'data': returns.to_dict('records')
+                'status': 'error',
+                'message': f'處理批次新增退貨記錄時發生錯誤: {str(e)}'
             }
+    
+    def _query_returns(self, prompt, limit=None, cursor=None):
+        """查詢退貨記錄：擷取所有篩選條件組成單一查詢（分頁返回）"""
+        try:
+            plan = self.planner.plan(prompt, limit=limit, cursor=cursor)
+            
+            if self._unparsed_date(prompt, plan):
+                return {
+                    'status': 'error',
+                    'message': DATE_FORMAT_HINT
+                }
+            
+            page = self.planner.execute(plan, explain=self.planner.wants_explain(prompt))
+            description = plan.describe()
+            prefix = f'{description} ' if description else ''
+            result = self._page_result(page, f'{prefix}本頁顯示 {len(page["records"])} 筆退貨記錄')
+            result['query_plan'] = page['plan']
+            if 'start_date' in plan.filters:
+                result['date_range'] = {
+                    'start_date': plan.filters['start_date'],
+                    'end_date': plan.filters['end_date']
+                }
+            return result
             
         except Exception as e:
             return {
@@ -152,6 +162,33 @@ class RetrievalAgent:
                 'message': f'查詢退貨記錄時發生錯誤: {str(e)}'
             }
     
+    def _unparsed_date(self, prompt, plan):
+        """提到日期但無法解析時返回 True"""
+        prompt_lower = prompt.lower()
+        return ('日期' in prompt_lower or '期間' in prompt_lower) and 'start_date' not in plan.filters
+    
+    def stream_query(self, prompt, cursor=None):
+        """以與 _query_returns 相同的條件逐批產生全部查詢結果（串流輸出用）"""
+        plan = self.planner.plan(prompt, cursor=cursor)
+        if self._unparsed_date(prompt, plan):
+            raise ValueError(DATE_FORMAT_HINT)
+        return self.planner.stream(plan)
+    
+    def _page_result(self, page, message):
+        """將分頁查詢結果包裝為回應格式"""
+        if page['has_more']:
+            message += '（還有更多，請以 next_cursor 取得下一頁）'
+        return {
+            'status': 'success',
+            'message': message,
+            'data': page['records'],
+            'pagination': {
+                'limit': page['limit'],
+                'has_more': page['has_more'],
+                'next_cursor': page['next_cursor']
+            }
+        }
+    
     def _handle_csv_import(self, prompt):
         """處理 CSV 檔案導入"""
         try:
@@ -199,17 +236,13 @@ class RetrievalAgent:
                 'message': f'獲取統計資料時發生錯誤: {str(e)}'
             }
     
-    def get_current_returns(self):
-        """獲取當前所有退貨記錄"""
+    def get_current_returns(self, limit=None, cursor=None):
+        """分頁獲取當前退貨記錄"""
         try:
-            returns = self.db_manager.get_all_returns()
-            return {
-                'status': 'success',
-                'data': returns.to_dict('records')
-            }
+            page = self.db_manager.get_returns_page(limit=limit, cursor=cursor)
+            return self._page_result(page, f'本頁顯示 {len(page["records"])} 筆退貨記錄')
         except Exception as e:
             return {
                 'status': 'error',
                 'message': f'獲取退貨記錄時發生錯誤: {str(e)}'
             }
-
@@ -0,0 +1,47 @@
+import json
+import decimal
+
+from fastapi.responses import JSONResponse
+
+# orjson 為選用套件：有安裝時使用，否則退回標準函式庫 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """處理 json 無法直接序列化的型別（pandas / numpy 純量、日期、Decimal）"""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"無法序列化的型別: {type(obj).__name__}")
+
+
+def dumps(obj):
+    """將物件序列化為 UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def serializer_name():
+    """目前使用的 JSON 序列化器"""
+    return 'orjson' if orjson is not None else 'json'
+
+
+class FastJSONResponse(JSONResponse):
+    """以 dumps 產生內容的 JSON 回應"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(content, status_code=200, headers=None):
+    """直接返回已序列化的回應，略過 FastAPI 的 jsonable_encoder 轉換"""
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
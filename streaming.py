@@ -0,0 +1,206 @@
+import csv
+import io
+import queue
+import threading
+import weakref
+
+from fastapi.responses import StreamingResponse
+
+from serialization import dumps
+
+# 支援的串流格式與對應的 Content-Type
+STREAM_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+# 直接寫入回應的檔案（例如 Excel 報告）每個區塊的大小，以及寫入端最多領先傳送端的區塊數，
+# 每個匯出佔用的記憶體上限約為兩者相乘
+PIPE_CHUNK_SIZE = 64 * 1024
+PIPE_MAX_CHUNKS = 16
+# 同時直接寫入回應的匯出數量上限（每個匯出佔用一個執行緒與一個讀取連線）
+MAX_STREAM_WRITERS = 2
+# 寫入端等待傳送端時，每隔多久檢查一次客戶端是否已中斷
+PIPE_POLL_SEC = 1.0
+ACCEPT_FORMATS = [
+    ('application/x-ndjson', 'ndjson'),
+    ('application/ndjson', 'ndjson'),
+    ('application/jsonl', 'ndjson'),
+    ('text/csv', 'csv'),
+]
+
+
+def negotiate_stream_format(accept=None, format_param=None):
+    """依 format 參數或 Accept 標頭決定串流格式，不需要串流時返回 None"""
+    if format_param:
+        format_param = format_param.lower()
+        if format_param == 'json':
+            return None
+        if format_param not in STREAM_MEDIA_TYPES:
+            raise ValueError(f"不支援的輸出格式: {format_param}")
+        return format_param
+
+    accept = (accept or '').lower()
+    for media_type, stream_format in ACCEPT_FORMATS:
+        if media_type in accept:
+            return stream_format
+    return None
+
+
+def ndjson_chunks(batches, columns=None):
+    """將每批字典列表編碼為 NDJSON，每批產生一個區塊；提供 columns 時只輸出這些欄位（與 CSV 相同）"""
+    for batch in batches:
+        if columns:
+            batch = [{column: row.get(column) for column in columns} for row in batch]
+        yield b''.join(dumps(row) + b'\n' for row in batch)
+
+
+def csv_chunks(batches, columns=None):
+    """將每批字典列表編碼為 CSV（含 BOM，Excel 可直接開啟中文），每批產生一個區塊"""
+    buffer = io.StringIO()
+    writer = None
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data.encode('utf-8')
+
+    buffer.write('\ufeff')
+    if columns:
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+
+    for batch in batches:
+        if not batch:
+            continue
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(batch[0].keys()), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerows(batch)
+        yield flush()
+
+    # 沒有任何資料時仍輸出 BOM 與標題列
+    remaining = flush()
+    if remaining:
+        yield remaining
+
+
+def stream_rows(batches, stream_format, filename="export", columns=None):
+    """以串流回應輸出逐批產生的資料列，第一批讀到就開始傳送"""
+    if stream_format == 'csv':
+        body = csv_chunks(batches, columns)
+    else:
+        body = ndjson_chunks(batches, columns)
+
+    extension = 'csv' if stream_format == 'csv' else 'ndjson'
+    return StreamingResponse(
+        body,
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{extension}"'}
+    )
+
+
+class StreamWritersBusyError(Exception):
+    """直接寫入回應的匯出數量已達上限"""
+    pass
+
+
+class StreamClosedError(Exception):
+    """客戶端已中斷連線，停止寫入"""
+    pass
+
+
+_writers = threading.BoundedSemaphore(MAX_STREAM_WRITERS)
+
+
+class _PipeWriter:
+    """寫入端執行緒的檔案物件：寫入的資料切成區塊放入有上限的佇列，由回應逐塊傳送；
+    不支援 seek，zipfile（openpyxl 儲存）會改用資料描述區塊依序寫出"""
+
+    def __init__(self, chunk_size=PIPE_CHUNK_SIZE, max_chunks=PIPE_MAX_CHUNKS):
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._closed = threading.Event()
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._put(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _put(self, item):
+        # 傳送端跟不上時等待（背壓），客戶端中斷後停止寫入
+        while True:
+            if self._closed.is_set():
+                raise StreamClosedError("客戶端已中斷連線")
+            try:
+                self.queue.put(item, timeout=PIPE_POLL_SEC)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, error=None):
+        """寫入完成（或失敗）時送出剩餘資料與結束標記"""
+        try:
+            if error is None and self._buffer:
+                self._put(bytes(self._buffer))
+            self._buffer = bytearray()
+            self._put(error)
+        except StreamClosedError:
+            pass
+
+    def close(self):
+        """傳送端結束（包含客戶端中斷），讓寫入端停止"""
+        self._closed.set()
+
+    def chunks(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+
+def _run_writer(write, pipe):
+    try:
+        write(pipe)
+    except StreamClosedError:
+        return
+    except Exception as e:
+        print(f"直接寫入回應時發生錯誤: {e}")
+        pipe.finish(e)
+    else:
+        pipe.finish()
+    finally:
+        _writers.release()
+
+
+def stream_writer(write, media_type, filename):
+    """在背景執行緒呼叫 write(fileobj) 產生檔案，寫入的內容直接以串流回應傳送，不寫入磁碟；
+    同時進行的匯出已達 MAX_STREAM_WRITERS 時拋出 StreamWritersBusyError"""
+    if not _writers.acquire(blocking=False):
+        raise StreamWritersBusyError(f"同時進行的匯出已達上限 {MAX_STREAM_WRITERS} 個，請稍後再試")
+    pipe = _PipeWriter()
+    body = pipe.chunks()
+    # 回應尚未開始傳送就被捨棄時（例如客戶端先中斷），產生器的 finally 不會執行，改在回收時停止寫入端
+    weakref.finalize(body, pipe.close)
+    try:
+        threading.Thread(target=_run_writer, args=(write, pipe), name="stream-writer", daemon=True).start()
+    except Exception:
+        _writers.release()
+        raise
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# 測試直接匯入專案根目錄的模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """在暫存目錄中執行（reports/、uploads/ 與資料庫都建立在這裡）"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def db_manager(workdir):
+    """暫存目錄中的新資料庫（連線池、快取等共用物件依路徑區分，每個測試各自獨立）"""
+    from database import DatabaseManager
+    return DatabaseManager(str(workdir / "returns.db"))
+
+
+@pytest.fixture
+def app_module(workdir):
+    """在暫存目錄中重新載入 main（模組層級的 coordinator、db_manager 等都指向新的資料庫）"""
+    import importlib
+    import main
+    main = importlib.reload(main)
+    # 測試期間不讓背景執行緒自行更新狀態，需要時由測試呼叫 refresh()
+    main.status_monitor.refresh_sec = 3600
+    return main
+
+
+@pytest.fixture
+def client(app_module):
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as test_client:
+        yield test_client
@@ -0,0 +1,67 @@
+import json
+
+
+def item(i, **overrides):
+    record = {'order_id': f'B{i}', 'product': '耳機', 'store_name': '台北店', 'return_date': '2024-02-01'}
+    record.update(overrides)
+    return record
+
+
+def test_bulk_json_reports_errors_by_index(client, app_module):
+    items = [item(0), item(1, return_date='bad'), 'not an object', item(3, date='2024-02-03', return_date=None)]
+    response = client.post("/api/returns/bulk", json=items)
+    data = response.json()['data']
+
+    assert response.status_code == 200
+    assert data['inserted_count'] == 2 and data['total_rows'] == 4
+    assert [e['index'] for e in data['errors']] == [1, 2]
+    assert len(data['ids']) == 2
+    assert data['data_version'] == app_module.db_manager.get_data_version()
+    assert app_module.db_manager.get_return(data['ids'][1])['return_date'] == '2024-02-03'
+
+
+def test_bulk_ndjson_keeps_line_positions(client):
+    body = "\n".join([json.dumps(item(0)), "{broken", json.dumps(item(2))]) + "\n"
+    response = client.post("/api/returns/bulk", content=body.encode("utf-8"),
+                           headers={"content-type": "application/x-ndjson"})
+    data = response.json()['data']
+
+    assert data['inserted_count'] == 2
+    assert data['total_rows'] == 3
+    assert [e['index'] for e in data['errors']] == [1]
+
+
+def test_bulk_rejects_the_same_dates_as_add_return(client):
+    dates = ['2024-02-01', '2024-2-3', '12:30', '2024', '2024/02/01', '2024-02-30', '2024-02-01T10:00']
+    response = client.post("/api/returns/bulk", json=[item(i, return_date=value) for i, value in enumerate(dates)])
+    data = response.json()['data']
+
+    assert data['inserted_count'] == 2
+    assert [e['index'] for e in data['errors']] == [2, 3, 4, 5, 6]
+    for i, value in enumerate(dates):
+        single = client.post("/api/add_return", data=dict(item(100 + i), return_date=value))
+        assert (single.status_code == 200) == (i < 2), value
+
+
+def test_bulk_rejects_invalid_and_oversized_bodies(client, app_module, monkeypatch):
+    assert client.post("/api/returns/bulk", content=b'[{"order_id": "x"},').status_code == 400
+    assert client.post("/api/returns/bulk", content=b'\xff\xfe').status_code == 400
+    monkeypatch.setattr(app_module, "MAX_BULK_ITEMS", 2)
+    assert client.post("/api/returns/bulk", json=[item(i) for i in range(3)]).status_code == 413
+
+
+def test_agent_batch_insert_uses_one_bulk_write(workdir):
+    from retrieval_agent import RetrievalAgent
+    agent = RetrievalAgent()
+    version = agent.db_manager.get_data_version()
+
+    result = agent._insert_returns_batch([
+        "訂單ID A1，產品名稱 耳機，商店名稱 台北店，日期 2024-01-05",
+        "訂單ID A2，產品名稱 滑鼠，商店名稱 台中店，日期 2024-01-06",
+        "訂單ID A3，產品名稱 滑鼠",
+    ])
+
+    assert result['status'] == 'success'
+    assert result['data']['inserted_count'] == 2
+    assert [e['index'] for e in result['data']['errors']] == [2]
+    assert agent.db_manager.get_data_version() == version + 1
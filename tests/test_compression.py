@@ -0,0 +1,58 @@
+import pytest
+
+from compression import choose_encoding, brotli
+
+ITEMS = [
+    {'order_id': f'ORD{i:03d}', 'product': 'iPhone', 'store_name': '台北店', 'return_date': '2024-05-01'}
+    for i in range(50)
+]
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('identity', None),
+    ('*', 'br' if brotli else 'gzip'),
+    ('br, gzip', 'br' if brotli else 'gzip'),
+    ('', None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def get(client, url, encoding, **headers):
+    # httpx 依 Content-Encoding 自動解壓，測試看到的內容與未壓縮時相同
+    return client.get(url, headers={'Accept-Encoding': encoding, **headers})
+
+
+def test_large_json_is_compressed(client):
+    client.post('/api/returns/bulk', json=ITEMS)
+    compressed = get(client, '/api/returns', 'gzip')
+    identity = get(client, '/api/returns', 'identity')
+
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert 'content-encoding' not in identity.headers
+    assert compressed.json() == identity.json()
+    assert int(compressed.headers['content-length']) < len(identity.content)
+
+
+@pytest.mark.parametrize('url', ['/api/returns', '/api/help', '/healthz'])
+@pytest.mark.parametrize('encoding', ['gzip', 'identity'])
+def test_eligible_responses_always_vary(client, url, encoding):
+    client.post('/api/returns/bulk', json=ITEMS)
+    response = get(client, url, encoding)
+    assert 'accept-encoding' in response.headers.get('vary', '').lower()
+
+
+def test_not_modified_responses_vary(client):
+    first = get(client, '/api/returns', 'identity')
+    response = get(client, '/api/returns', 'identity', **{'If-None-Match': first.headers['etag']})
+    assert response.status_code == 304
+    assert 'accept-encoding' in response.headers.get('vary', '').lower()
+
+
+def test_binary_downloads_are_left_alone(client):
+    response = get(client, '/api/reports/export', 'gzip')
+    assert response.status_code == 200
+    assert 'content-encoding' not in response.headers
+    assert 'vary' not in response.headers
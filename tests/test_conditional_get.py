@@ -0,0 +1,49 @@
+from email.utils import formatdate
+
+from starlette.requests import Request
+
+from http_cache import is_not_modified, make_etag
+
+
+def request_with(headers):
+    raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({'type': 'http', 'headers': raw})
+
+
+def test_etag_matching():
+    etag = make_etag('returns', 3, None)
+    assert etag.startswith('W/"') and etag != make_etag('returns', 4, None)
+    assert is_not_modified(request_with({'If-None-Match': f'"x", {etag[2:]}'}), etag)
+    assert is_not_modified(request_with({'If-None-Match': '*'}), etag)
+    assert not is_not_modified(request_with({'If-None-Match': '"x"'}), etag)
+
+
+def test_if_modified_since_ignores_current_second():
+    since = formatdate(2000, usegmt=True)
+    assert is_not_modified(request_with({'If-Modified-Since': since}), 'W/"a"', 1000)
+    assert not is_not_modified(request_with({'If-Modified-Since': since}), 'W/"a"', 3000)
+    assert not is_not_modified(request_with({'If-Modified-Since': 'garbage'}), 'W/"a"', 1000)
+    # If-None-Match 優先於 If-Modified-Since
+    assert not is_not_modified(request_with({'If-None-Match': '"x"', 'If-Modified-Since': since}), 'W/"a"', 1000)
+
+
+def test_read_endpoints_revalidate_until_write(client):
+    for url in ("/api/statistics", "/api/returns?limit=5"):
+        first = client.get(url)
+        assert first.headers['cache-control']
+        revalidated = client.get(url, headers={'If-None-Match': first.headers['etag']})
+        assert revalidated.status_code == 304 and revalidated.content == b''
+
+    statistics = client.get("/api/statistics")
+    client.post("/api/returns/bulk", json=[
+        {'order_id': 'E1', 'product': '耳機', 'store_name': '台北店', 'return_date': '2024-06-01'}
+    ])
+    changed = client.get("/api/statistics", headers={'If-None-Match': statistics.headers['etag']})
+    assert changed.status_code == 200
+    assert changed.headers['etag'] != statistics.headers['etag']
+
+
+def test_status_revalidates_until_refresh(client, app_module):
+    app_module.status_monitor.refresh()
+    first = client.get("/api/status")
+    assert client.get("/api/status", headers={'If-None-Match': first.headers['etag']}).status_code == 304
@@ -0,0 +1,60 @@
+import pytest
+
+
+def write_csv(path, rows, header="order_id,product,store_name,date"):
+    path.write_text("\n".join([header] + rows) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_stream_import_in_chunks_reports_bad_rows(db_manager, workdir):
+    rows = [f"ORD{i:04d},產品{i % 3},商店{i % 2},2024-01-{i % 28 + 1:02d}" for i in range(10)]
+    rows[3] = "ORD0003,,商店1,2024-01-04"
+    rows[6] = "ORD0006,產品0,商店0,not-a-date"
+    rows[8] = "ORD0008,產品2,商店0,2024/2/5"
+    path = write_csv(workdir / "returns.csv", rows)
+    version = db_manager.get_data_version()
+
+    result = db_manager.import_csv_stream(path, chunk_size=4)
+
+    assert result['total_rows'] == 10
+    assert result['inserted_count'] == 8
+    # 資料從 CSV 第 2 行開始
+    assert result['errors'] == [
+        {'row': 5, 'error': '缺少欄位 product'},
+        {'row': 8, 'error': '日期格式錯誤'},
+    ]
+    assert db_manager.get_returns_count() == 8
+    # 每個含有效資料的區塊是一個交易
+    assert db_manager.get_data_version() == version + 3
+    dates = {r['order_id']: r['return_date'] for r in db_manager.get_returns_page(limit=100)['records']}
+    assert dates['ORD0008'] == '2024-02-05'
+
+
+def test_only_listed_date_formats_are_accepted(db_manager, workdir):
+    dates = ['2024-01-05', '2024/1/6', '12:30', '2024', '2024-01-05 10:00', '05/01/2024', '2024-02-30']
+    path = write_csv(workdir / "dates.csv", [f"ORD{i},產品,商店,{value}" for i, value in enumerate(dates)])
+
+    result = db_manager.import_csv_stream(path)
+
+    assert result['inserted_count'] == 2
+    assert [e['row'] for e in result['errors']] == [4, 5, 6, 7, 8]
+    assert {e['error'] for e in result['errors']} == {'日期格式錯誤'}
+    stored = sorted(r['return_date'] for r in db_manager.get_returns_page(limit=100)['records'])
+    assert stored == ['2024-01-05', '2024-01-06']
+
+
+def test_error_list_is_capped(db_manager, workdir):
+    path = write_csv(workdir / "bad.csv", [f"ORD{i},產品,商店,bad" for i in range(5)])
+
+    result = db_manager.import_csv_stream(path, max_errors=2)
+
+    assert result['error_count'] == 5
+    assert len(result['errors']) == 2
+    assert result['inserted_count'] == 0
+
+
+def test_missing_columns_and_empty_import(db_manager, workdir):
+    with pytest.raises(ValueError, match="date"):
+        db_manager.import_csv_stream(write_csv(workdir / "cols.csv", ["1,a,b"], header="order_id,product,store_name"))
+    with pytest.raises(Exception, match="沒有有效資料"):
+        db_manager.import_csv_data(write_csv(workdir / "empty.csv", ["1,a,b,bad"]))
@@ -0,0 +1,67 @@
+import time
+
+
+def add_return(client, order_id='ORD001', return_date='2024-05-01'):
+    response = client.post('/api/add_return', data={
+        'order_id': order_id, 'product': 'iPhone', 'store_name': '台北店', 'return_date': return_date
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def revalidate(client, url, response):
+    return client.get(url, headers={'If-None-Match': response.headers['etag']})
+
+
+def test_dashboard_returns_all_sections(client, app_module):
+    add_return(client)
+    # status 是背景更新的系統狀態，寫入後要等下一次更新
+    app_module.status_monitor.refresh()
+    data = client.get('/api/dashboard').json()['data']
+    assert data['fields'] == ['status', 'statistics', 'returns', 'reports']
+    assert data['statistics']['total_returns'] == 1
+    assert [record['order_id'] for record in data['returns']['records']] == ['ORD001']
+    assert data['reports']['records'] == []
+    assert data['status']['database']['returns_count'] == 1
+    assert 'monitor' in data['status']
+
+
+def test_dashboard_not_modified_until_data_changes(client):
+    url = '/api/dashboard?fields=statistics,returns'
+    first = client.get(url)
+    assert revalidate(client, url, first).status_code == 304
+
+    add_return(client)
+    second = revalidate(client, url, first)
+    assert second.status_code == 200
+    assert second.json()['data']['statistics']['total_returns'] == 1
+
+
+def test_dashboard_status_follows_monitor_refresh(client, app_module):
+    url = '/api/dashboard?fields=status'
+    first = client.get(url)
+    assert revalidate(client, url, first).status_code == 304
+
+    time.sleep(0.01)
+    app_module.status_monitor.refresh()
+    refreshed = revalidate(client, url, first)
+    assert refreshed.status_code == 200
+    assert refreshed.headers['etag'] != first.headers['etag']
+
+
+def test_dashboard_rejects_unknown_fields(client):
+    assert client.get('/api/dashboard?fields=status,nope').status_code == 400
+
+
+def test_returns_and_reports_not_modified(client):
+    add_return(client)
+    for url in ('/api/returns', '/api/reports', '/api/statistics'):
+        first = client.get(url)
+        assert first.status_code == 200
+        assert revalidate(client, url, first).status_code == 304
+
+    first = client.get('/api/returns')
+    add_return(client, 'ORD002')
+    second = revalidate(client, '/api/returns', first)
+    assert second.status_code == 200
+    assert len(second.json()['data']) == 2
@@ -0,0 +1,56 @@
+from datetime import date
+
+import pytest
+
+from date_parser import parse_date_range
+
+TODAY = date(2026, 10, 17)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('查詢日期 2024-01-01 到 2024-01-31', ('2024-01-01', '2024-01-31')),
+    ('from 2024/1/1 to 2024/2/1', ('2024-01-01', '2024-02-01')),
+    ('2024-03-05 之後', ('2024-03-05', '2026-10-17')),
+    ('before 2024-03-05', ('0001-01-01', '2024-03-05')),
+    ('2024-3-5', ('2024-03-05', '2024-03-05')),
+    ('最近7天', ('2026-10-11', '2026-10-17')),
+    ('過去兩週', ('2026-10-04', '2026-10-17')),
+    ('昨天', ('2026-10-16', '2026-10-16')),
+    ('上個月', ('2026-09-01', '2026-09-30')),
+    ('last week', ('2026-10-05', '2026-10-11')),
+    ('去年', ('2025-01-01', '2025-12-31')),
+    ('2024年2月', ('2024-02-01', '2024-02-29')),
+    ('2024-02', ('2024-02-01', '2024-02-29')),
+    ('三月', ('2026-03-01', '2026-03-31')),
+    ('2023年', ('2023-01-01', '2023-12-31')),
+])
+def test_parses_expressions(text, expected):
+    assert parse_date_range(text, TODAY) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('January 2024', ('2024-01-01', '2024-01-31')),
+    ('Jan. 2024', ('2024-01-01', '2024-01-31')),
+    ('may 2024', ('2024-05-01', '2024-05-31')),
+    ('May 5, 2024', ('2024-05-05', '2024-05-05')),
+    ('jan 15', ('2026-01-15', '2026-01-15')),
+    ('sep 3rd', ('2026-09-03', '2026-09-03')),
+    ('returns in june', ('2026-06-01', '2026-06-30')),
+    ('during dec', ('2026-12-01', '2026-12-31')),
+])
+def test_month_names_with_year_day_or_context(text, expected):
+    assert parse_date_range(text, TODAY) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'show returns in may',
+    'i may return it',
+    'returns in march',
+    'show dec',
+    'june',
+    'mar',
+    'may 32',
+    'list all returns',
+])
+def test_bare_month_words_are_not_dates(text):
+    assert parse_date_range(text, TODAY) is None
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError, get_pool
+
+
+@pytest.fixture
+def pool(workdir):
+    pool = ConnectionPool(str(workdir / 'pool.db'), max_readers=2)
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE items (value INTEGER)")
+    yield pool
+    pool.close()
+
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+def test_wal_and_read_only_readers(pool):
+    with pool.reader() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO items VALUES (1)")
+
+
+def test_readers_are_reused_and_bounded(pool):
+    for _ in range(5):
+        with pool.reader():
+            pass
+    assert pool.get_stats()['readers_created'] == 1
+
+    first, second = pool.acquire(), pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0.05)
+    pool.release(first)
+    pool.release(second)
+    assert pool.get_stats()['timeouts'] == 1
+
+
+def test_nested_transactions_commit_once(pool):
+    committed = []
+    with pool.transaction() as outer:
+        outer.execute("INSERT INTO items VALUES (1)")
+        with pool.transaction() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO items VALUES (2)")
+            pool.on_commit(lambda: committed.append('done'))
+        assert committed == []
+    assert committed == ['done']
+    with pool.reader() as conn:
+        assert count(conn) == 2
+
+
+def test_rollback_discards_writes_and_callbacks(pool):
+    committed = []
+    with pytest.raises(ValueError):
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO items VALUES (1)")
+            pool.on_commit(lambda: committed.append('done'))
+            raise ValueError('abort')
+    assert committed == []
+    with pool.reader() as conn:
+        assert count(conn) == 0
+    with pytest.raises(RuntimeError):
+        pool.on_commit(lambda: None)
+
+
+def test_snapshot_sees_one_version(pool):
+    with pool.snapshot() as conn:
+        before = count(conn)
+        with pool.transaction() as writer:
+            writer.execute("INSERT INTO items VALUES (1)")
+        assert count(conn) == before
+    with pool.reader() as conn:
+        assert count(conn) == before + 1
+
+
+def test_registry_shares_pool_per_path(workdir):
+    pool = get_pool(str(workdir / 'shared.db'))
+    assert get_pool(str(workdir / 'shared.db')) is pool
+    pool.close()
+    assert get_pool(str(workdir / 'shared.db')) is not pool
@@ -0,0 +1,30 @@
+import pytest
+
+
+def test_names_are_stored_once_as_integer_keys(db_manager):
+    db_manager.insert_returns_bulk([
+        {'order_id': f'O{i}', 'product': '耳機', 'store_name': f'商店{i % 2}', 'return_date': '2024-01-01'}
+        for i in range(6)
+    ])
+    with db_manager.pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM stores").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 1
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(returns)")]
+    assert 'store_id' in columns and 'store_name' not in columns
+
+    store_id = db_manager.stores.lookup('商店1')
+    assert isinstance(store_id, int)
+    assert db_manager.stores.lookup('不存在') is None
+    assert len(db_manager.get_returns_by_store('商店1')) == 3
+
+
+def test_rolled_back_keys_are_not_cached(db_manager):
+    with pytest.raises(RuntimeError):
+        with db_manager.pool.transaction() as conn:
+            db_manager.products.resolve(conn, ['滑鼠'])
+            raise RuntimeError('abort')
+    assert db_manager.products.lookup('滑鼠') is None
+
+    with db_manager.pool.transaction() as conn:
+        mapping = db_manager.products.resolve(conn, ['滑鼠'])
+    assert db_manager.products.lookup('滑鼠') == mapping['滑鼠']
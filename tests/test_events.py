@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from events import EventBus, encode_event, parse_last_event_id
+
+ITEM = {'order_id': 'V1', 'product': '耳機', 'store_name': '台北店', 'return_date': '2024-07-01'}
+
+
+def event_types(frames):
+    return [line.split(': ', 1)[1] for frame in frames
+            for line in frame.decode('utf-8').splitlines() if line.startswith('event: ')]
+
+
+def test_encode_event_and_parse_last_event_id():
+    frame = encode_event(3, 'returns', {'name': '台北店'})
+    assert frame.decode('utf-8') == 'id: 3\nevent: returns\ndata: {"name":"台北店"}\n\n'
+    assert parse_last_event_id('7') == 7
+    assert parse_last_event_id('') is None and parse_last_event_id('x') is None
+
+
+def test_replay_from_history_or_reset():
+    bus = EventBus(history_size=2)
+    loop = asyncio.new_event_loop()
+    try:
+        for n in range(3):
+            bus.publish('returns', {'n': n})
+        _, backlog, reset = bus.subscribe(loop, last_event_id=2)
+        assert not reset and len(backlog) == 1
+        # 事件 1 已被淘汰，無法從 0 補送
+        assert bus.subscribe(loop, last_event_id=0)[2]
+        assert bus.subscribe(loop, last_event_id=99)[2]
+        assert bus.subscribe(loop)[1:] == ([], False)
+    finally:
+        loop.close()
+
+
+def test_stream_pushes_events_and_resets_slow_clients():
+    bus = EventBus(queue_size=2)
+
+    async def read():
+        stream = bus.stream(heartbeat_sec=0.05, max_duration_sec=1)
+        frames = [await stream.__anext__()]
+        for n in range(5):
+            bus.publish('returns', {'n': n})
+        await asyncio.sleep(0)
+        frames.append(await stream.__anext__())
+        frames.append(await stream.__anext__())
+        await stream.aclose()
+        return frames
+
+    frames = asyncio.run(read())
+    assert frames[0].startswith(b'retry: ')
+    assert event_types(frames[1:2]) == ['reset']
+    assert frames[2] == b': ping\n\n'
+    assert bus.get_stats()['subscribers'] == 0 and bus.get_stats()['resets'] == 1
+
+
+def test_writes_publish_only_after_commit(db_manager):
+    published = []
+    db_manager.events.publish = lambda event_type, data: published.append((event_type, data))
+
+    with pytest.raises(RuntimeError):
+        with db_manager.pool.transaction():
+            db_manager.insert_returns_bulk([ITEM])
+            assert published == []
+            raise RuntimeError('abort')
+    assert published == []
+
+    record_id = db_manager.insert_returns_bulk([ITEM])['ids'][0]
+    assert [event_type for event_type, _ in published] == ['returns', 'statistics']
+    returns_event = published[0][1]
+    assert returns_event['records'][0]['id'] == record_id
+    assert returns_event['data_version'] == db_manager.get_data_version()
+
+    db_manager.delete_return(record_id)
+    assert published[2][1]['deleted_ids'] == [record_id]
+    statistics_event = published[3][1]
+    assert statistics_event['total_returns'] == 0
+    assert statistics_event['stores'] == {'台北店': 0}
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+import time
+
+import executors
+
+
+def test_run_db_keeps_event_loop_free():
+    def blocking(value, delay=0.2):
+        time.sleep(delay)
+        return value, threading.current_thread().name
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await executors.run_db(blocking, 'ok', delay=0.2)
+        task.cancel()
+        return result, ticks
+
+    (value, thread_name), ticks = asyncio.run(main())
+    assert value == 'ok'
+    assert thread_name.startswith('db')
+    # 阻塞期間事件迴圈仍持續執行其他協程
+    assert ticks >= 5
+    stats = executors.get_executor_stats()
+    assert stats['db_active'] == 0 and stats['db_submitted'] >= 1
@@ -0,0 +1,47 @@
+from health import StatusMonitor
+
+
+def test_liveness_does_not_touch_database(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.db_manager, 'ping', None)
+    response = client.get("/healthz")
+    assert response.json() == {'status': 'ok'}
+    assert response.headers['cache-control'] == 'no-store'
+
+
+def test_readiness_reports_pool_exhaustion(client, app_module):
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert ready.json()['checks']['database']['status'] == 'ok'
+
+    pool = app_module.db_manager.pool
+    held = [pool.acquire() for _ in range(pool.max_readers)]
+    try:
+        busy = client.get("/readyz")
+    finally:
+        for conn in held:
+            pool.release(conn)
+    assert busy.status_code == 503
+    assert busy.json()['checks']['database']['status'] == 'timeout'
+
+
+def test_status_monitor_serves_last_snapshot(db_manager):
+    calls = []
+
+    def build_status():
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('boom')
+        return {'status': 'success', 'data': {'calls': len(calls)}}
+
+    monitor = StatusMonitor(build_status, db_manager, refresh_sec=3600)
+    status, refreshed_at = monitor.get_status()
+    assert status['data']['calls'] == 1 and refreshed_at is not None
+    assert monitor.get_status()[0]['data']['calls'] == 1
+
+    # 更新失敗時保留上一次的狀態
+    monitor.refresh()
+    status, _ = monitor.get_status()
+    assert status['data']['calls'] == 1
+    assert status['data']['monitor']['refresh_errors'] == 1
+    assert not status['data']['monitor']['stale']
+    assert len(calls) == 2
@@ -0,0 +1,46 @@
+import sqlite3
+
+from database import returns_query
+from migrations import MIGRATIONS, apply_migrations, get_schema_version
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def index_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_migrations_are_idempotent(workdir):
+    conn = sqlite3.connect(str(workdir / "schema.db"))
+    assert apply_migrations(conn) == [version for version, _, _ in MIGRATIONS]
+    assert apply_migrations(conn) == []
+    assert get_schema_version(conn) == LATEST_VERSION
+    assert {
+        'idx_returns_date', 'idx_returns_store_date', 'idx_returns_product_date',
+        'idx_returns_order_id', 'idx_returns_version',
+    } <= index_names(conn)
+
+
+def test_upgrade_keeps_existing_rows(workdir):
+    conn = sqlite3.connect(str(workdir / "old.db"))
+    apply_migrations(conn, target_version=4)
+    conn.executemany(
+        "INSERT INTO returns (order_id, product, store_name, return_date) VALUES (?, ?, ?, ?)",
+        [('A1', '耳機', '台北店', '2024-01-02'), ('A2', '滑鼠', '台中店', '2024-01-03')]
+    )
+
+    assert apply_migrations(conn) == list(range(5, LATEST_VERSION + 1))
+    rows = conn.execute(
+        "SELECT r.id, r.order_id, s.name, p.name FROM returns r "
+        "JOIN stores s ON s.id = r.store_id JOIN products p ON p.id = r.product_id ORDER BY r.id"
+    ).fetchall()
+    assert rows == [(1, 'A1', '台北店', '耳機'), (2, 'A2', '台中店', '滑鼠')]
+
+
+def test_filtered_queries_use_indexes(db_manager):
+    plan = " ".join(db_manager.explain_query(returns_query("WHERE r.store_id = ?"), [1]))
+    assert "idx_returns_store_date" in plan
+    plan = " ".join(db_manager.explain_query(returns_query("WHERE r.return_date BETWEEN ? AND ?"),
+                                             ['2024-01-01', '2024-01-31']))
+    assert "idx_returns_date" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,63 @@
+from database import MAX_PAGE_SIZE
+
+
+def seed(db_manager, count=25):
+    # 多筆記錄共用同一天，游標必須以 id 區分
+    items = [
+        {'order_id': f'ORD{i:03d}', 'product': f'產品{i % 4}', 'store_name': f'商店{i % 3}',
+         'return_date': f'2024-03-{i % 5 + 1:02d}'}
+        for i in range(count)
+    ]
+    return db_manager.insert_returns_bulk(items)['ids']
+
+
+def test_pages_cover_every_row_once_in_order(db_manager):
+    ids = seed(db_manager)
+    seen = []
+    cursor = None
+    while True:
+        page = db_manager.get_returns_page(limit=7, cursor=cursor)
+        seen.extend(page['records'])
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            break
+        cursor = page['next_cursor']
+
+    assert sorted(r['id'] for r in seen) == sorted(ids)
+    keys = [(r['return_date'], r['id']) for r in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_cursor_is_stable_under_inserts(db_manager):
+    seed(db_manager, 10)
+    first = db_manager.get_returns_page(limit=5)
+    # 新資料排在最前面，不影響已取得的游標之後的頁面
+    db_manager.insert_returns_bulk([{'order_id': 'NEW', 'product': '產品0', 'store_name': '商店0',
+                                     'return_date': '2024-12-31'}])
+    second = db_manager.get_returns_page(limit=5, cursor=first['next_cursor'])
+    assert {r['id'] for r in first['records']}.isdisjoint(r['id'] for r in second['records'])
+    assert len(second['records']) == 5
+    assert not second['has_more']
+
+
+def test_filters_and_page_size(db_manager):
+    seed(db_manager)
+    page = db_manager.get_returns_page(limit=100, store_name='商店1', start_date='2024-03-02')
+    assert page['records']
+    assert all(r['store_name'] == '商店1' and r['return_date'] >= '2024-03-02' for r in page['records'])
+    assert db_manager.get_returns_page(store_name='不存在')['records'] == []
+    assert db_manager.get_returns_page(limit=MAX_PAGE_SIZE * 10)['limit'] == MAX_PAGE_SIZE
+
+
+def test_returns_endpoint_pagination(client, app_module):
+    seed(app_module.db_manager, 12)
+    response = client.get("/api/returns", params={'limit': 10})
+    body = response.json()
+    assert response.status_code == 200
+    assert len(body['data']) == 10 and body['pagination']['has_more']
+
+    rest = client.get("/api/returns", params={'limit': 10, 'cursor': body['pagination']['next_cursor']}).json()
+    assert len(rest['data']) == 2 and not rest['pagination']['has_more']
+
+    assert client.get("/api/returns", params={'cursor': 'not-a-cursor'}).status_code == 400
+    assert client.get("/api/returns", params={'limit': 0}).status_code == 400
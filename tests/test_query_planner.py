@@ -0,0 +1,88 @@
+import pytest
+
+from query_planner import QueryPlanner
+
+STATISTICS = {
+    'total_returns': 3,
+    'store_stats': [
+        {'store_name': 'S', 'count': 1},
+        {'store_name': '台北店', 'count': 2},
+    ],
+    'product_stats': [
+        {'product': 'iPhone 15', 'count': 2},
+        {'product': 'iPad', 'count': 1},
+    ],
+    'monthly_stats': [],
+}
+
+
+@pytest.fixture
+def planner():
+    return QueryPlanner(None)
+
+
+@pytest.mark.parametrize('prompt, order_id', [
+    ('查詢訂單ID 12345', '12345'),
+    ('訂單編號：A-1', 'A-1'),
+    ('order 12345', '12345'),
+    ('order #A1', 'A1'),
+    ('ORDER ID X1', 'X1'),
+    ('查詢order 123', '123'),
+    ('查詢ORD001', 'ORD001'),
+])
+def test_extracts_order_id(planner, prompt, order_id):
+    assert planner.extract_filters(prompt, STATISTICS).get('order_id') == order_id
+
+
+@pytest.mark.parametrize('prompt', [
+    'list all orders',
+    'show orders from last month',
+    'order by date',
+    'ordered items',
+    'order 2024-01-01',
+])
+def test_plain_words_are_not_order_ids(planner, prompt):
+    assert 'order_id' not in planner.extract_filters(prompt, STATISTICS)
+
+
+@pytest.mark.parametrize('prompt', [
+    'list all returns',
+    'show returns in may',
+    'show iPads',
+])
+def test_short_names_need_word_boundaries(planner, prompt):
+    filters = planner.extract_filters(prompt, STATISTICS)
+    assert 'store_name' not in filters
+    assert 'product' not in filters
+
+
+def test_matches_names_on_boundaries(planner):
+    filters = planner.extract_filters('查詢 S 店 iPhone 15 前10筆', STATISTICS)
+    assert filters['store_name'] == 'S'
+    assert filters['product'] == 'iPhone 15'
+
+
+def test_chinese_names_match_without_spaces(planner):
+    filters = planner.extract_filters('查詢台北店iPhone 15', STATISTICS)
+    assert filters['store_name'] == '台北店'
+    assert filters['product'] == 'iPhone 15'
+
+
+def test_prefers_longest_name(planner):
+    statistics = dict(STATISTICS, product_stats=[{'product': 'iPhone', 'count': 1}, {'product': 'iPhone 15', 'count': 1}])
+    assert planner.extract_filters('查詢 iPhone 15', statistics)['product'] == 'iPhone 15'
+
+
+def test_plain_prompts_return_all_records(db_manager):
+    db_manager.insert_returns_bulk([
+        {'order_id': 'ORD001', 'product': 'iPhone 15', 'store_name': 'S', 'return_date': '2024-05-02'},
+        {'order_id': 'ORD002', 'product': 'iPad', 'store_name': '台北店', 'return_date': '2024-05-03'},
+    ])
+    planner = QueryPlanner(db_manager)
+    for prompt in ('list all orders', 'show orders'):
+        page = planner.execute(planner.plan(prompt))
+        assert page['plan']['filters'] == {}
+        assert len(page['records']) == 2
+
+    page = planner.execute(planner.plan('查詢 ORD002'))
+    assert [record['order_id'] for record in page['records']] == ['ORD002']
@@ -0,0 +1,35 @@
+import os
+import time
+
+import report_agent
+from report_agent import ReportAgent
+
+
+def test_cache_key_covers_type_params_and_version(workdir):
+    agent = ReportAgent()
+    key = agent.report_cache_key('simple', 3)
+    assert key == agent.report_cache_key('simple', 3, {'partition_by': 'none'})
+    assert key != agent.report_cache_key('simple', 4)
+    assert key != agent.report_cache_key('comprehensive', 3)
+    assert key != agent.report_cache_key('simple', 3, {'partition_by': 'store'})
+
+
+def test_find_cached_report_requires_fresh_file(workdir):
+    agent = ReportAgent()
+    assert agent.find_cached_report('simple', 3) is None
+    assert agent.find_cached_report('simple', None) is None
+
+    result = agent.generate_simple_report(
+        [{'order_id': 'A', 'product': '耳機', 'store_name': '台北店', 'return_date': '2024-01-01'}],
+        data_version=3
+    )
+    cached = agent.find_cached_report('simple', 3)
+    assert cached['data']['cached'] is True
+    assert cached['data']['filename'] == result['data']['filename']
+    # 快取命中只檢查檔案狀態，不重新開啟活頁簿
+    assert 'sheets' not in cached['data']
+    assert agent.find_cached_report('simple', 4) is None
+
+    old = time.time() - report_agent.REPORT_CACHE_MAX_AGE_SEC - 60
+    os.utime(cached['data']['filepath'], (old, old))
+    assert agent.find_cached_report('simple', 3) is None
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+
+from report_catalog import ReportCatalog, REPORT_TMP_MAX_AGE_SEC
+
+NOW = time.time()
+
+
+@pytest.fixture
+def reports_dir(workdir):
+    path = workdir / 'reports'
+    path.mkdir()
+    return path
+
+
+def make_report(reports_dir, filename, size=10, age_sec=0):
+    path = reports_dir / filename
+    path.write_bytes(b'x' * size)
+    mtime = NOW - age_sec
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def catalog_for(db_manager, reports_dir, **kwargs):
+    return ReportCatalog(db_manager.db_path, reports_dir=str(reports_dir), **kwargs)
+
+
+def filenames(page):
+    return [report['filename'] for report in page['reports']]
+
+
+def test_record_and_paginate(db_manager, reports_dir):
+    catalog = catalog_for(db_manager, reports_dir)
+    for n in range(5):
+        make_report(reports_dir, f'simple_report_{n}.xlsx', age_sec=100 - n)
+        catalog.record(f'simple_report_{n}.xlsx', 'simple', params={'partition_by': None})
+    make_report(reports_dir, 'returns_report_x.xlsx', age_sec=1000)
+    catalog.record('returns_report_x.xlsx', 'comprehensive')
+
+    first = catalog.list_reports(limit=2)
+    assert filenames(first) == ['simple_report_4.xlsx', 'simple_report_3.xlsx']
+    assert first['has_more']
+    rest = catalog.list_reports(limit=10, cursor=first['next_cursor'])
+    assert filenames(rest) == ['simple_report_2.xlsx', 'simple_report_1.xlsx', 'simple_report_0.xlsx',
+                               'returns_report_x.xlsx']
+    assert not rest['has_more'] and rest['next_cursor'] is None
+    assert filenames(catalog.list_reports(report_type='comprehensive')) == ['returns_report_x.xlsx']
+    assert catalog.list_reports()['reports'][0]['params'] == {'partition_by': None}
+
+    version = catalog.get_version()
+    catalog.record('simple_report_4.xlsx', 'simple')
+    assert catalog.get_version() == version + 1
+    assert catalog.get_totals()['reports_count'] == 6
+
+    with pytest.raises(ValueError):
+        catalog.list_reports(cursor='not-a-cursor')
+
+
+@pytest.mark.parametrize('limits, kept', [
+    ({'max_count': 2}, ['r0.xlsx', 'r1.xlsx']),
+    ({'max_bytes': 250}, ['r0.xlsx', 'r1.xlsx']),
+    ({'max_age_sec': 150}, ['r0.xlsx', 'r1.xlsx']),
+    # 最新的一份永遠保留
+    ({'max_count': 0, 'max_bytes': 0}, ['r0.xlsx']),
+])
+def test_prune_applies_retention_policy(db_manager, reports_dir, limits, kept):
+    catalog = catalog_for(db_manager, reports_dir, **limits)
+    for n in range(4):
+        make_report(reports_dir, f'r{n}.xlsx', size=100, age_sec=n * 100)
+        catalog.record(f'r{n}.xlsx', 'simple')
+
+    assert catalog.prune(now=NOW) == 4 - len(kept)
+    assert filenames(catalog.list_reports()) == kept
+    assert sorted(os.listdir(reports_dir)) == kept
+    assert catalog.get_stats()['pruned'] == 4 - len(kept)
+
+
+def test_prune_keeps_rows_whose_files_cannot_be_removed(db_manager, reports_dir, monkeypatch):
+    catalog = catalog_for(db_manager, reports_dir, max_count=1)
+    for n in range(2):
+        make_report(reports_dir, f'r{n}.xlsx', age_sec=n)
+        catalog.record(f'r{n}.xlsx', 'simple')
+
+    def locked(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(os, 'remove', locked)
+    assert catalog.prune(now=NOW) == 0
+    assert filenames(catalog.list_reports()) == ['r0.xlsx', 'r1.xlsx']
+
+
+def test_sync_imports_files_and_keeps_fresh_tmp(db_manager, reports_dir):
+    catalog = catalog_for(db_manager, reports_dir)
+    make_report(reports_dir, 'gone.xlsx')
+    catalog.record('gone.xlsx', 'simple')
+    os.remove(reports_dir / 'gone.xlsx')
+    make_report(reports_dir, 'returns_report_old.xlsx', age_sec=10)
+    make_report(reports_dir, 'simple_report_old.xlsx', age_sec=20)
+    make_report(reports_dir, 'simple_report_new.xlsx.123.tmp', age_sec=60)
+    make_report(reports_dir, 'simple_report_dead.xlsx.456.tmp', age_sec=REPORT_TMP_MAX_AGE_SEC + 60)
+
+    assert catalog.sync(now=NOW) == (2, 1)
+    reports = {report['filename']: report['report_type'] for report in catalog.list_reports()['reports']}
+    assert reports == {'returns_report_old.xlsx': 'comprehensive', 'simple_report_old.xlsx': 'simple'}
+    # 仍在寫入中的暫存檔保留，過期的才清除
+    assert sorted(os.listdir(reports_dir)) == [
+        'returns_report_old.xlsx', 'simple_report_new.xlsx.123.tmp', 'simple_report_old.xlsx'
+    ]
+    assert catalog.sync(now=NOW) == (0, 0)
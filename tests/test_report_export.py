@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+from openpyxl import load_workbook
+
+import streaming
+
+ITEMS = [
+    {'order_id': f'ORD{i:03d}', 'product': f'P{i % 3}', 'store_name': f'S{i % 2}', 'return_date': f'2024-0{1 + i % 3}-10'}
+    for i in range(50)
+]
+
+
+@pytest.fixture
+def export_client(client):
+    assert client.post('/api/returns/bulk', json=ITEMS).status_code == 200
+    return client
+
+
+def test_xlsx_export_streams_without_saving(export_client, workdir):
+    response = export_client.get('/api/reports/export?partition_by=store')
+    assert response.status_code == 200
+    assert response.headers['content-disposition'].startswith('attachment; filename="returns_report_')
+    wb = load_workbook(io.BytesIO(response.content), read_only=True)
+    assert wb.sheetnames == ['摘要', '詳細資料索引', '商店-S1', '商店-S0', '分析', '發現']
+    assert os.listdir(workdir / 'reports') == []
+
+
+def test_csv_and_ndjson_carry_the_same_fields(export_client):
+    csv_rows = list(csv.DictReader(io.StringIO(
+        export_client.get('/api/reports/export?format=csv&report_type=simple').text.lstrip('﻿')
+    )))
+    ndjson_rows = [
+        json.loads(line)
+        for line in export_client.get('/api/reports/export?format=ndjson&report_type=simple').text.splitlines()
+    ]
+    assert len(csv_rows) == len(ndjson_rows) == 50
+    assert list(ndjson_rows[0]) == list(csv_rows[0]) == ['order_id', 'product', 'store_name', 'return_date']
+    assert ndjson_rows == csv_rows
+
+    detail = json.loads(export_client.get('/api/reports/export?format=ndjson').text.splitlines()[0])
+    assert list(detail) == ['id', 'order_id', 'product', 'store_name', 'return_date', 'created_at']
+
+
+def test_export_rejects_bad_params_and_excess_exports(export_client):
+    assert export_client.get('/api/reports/export?format=pdf').status_code == 400
+    assert export_client.get('/api/reports/export?partition_by=week').status_code == 400
+
+    held = [streaming._writers.acquire(blocking=False) for _ in range(streaming.MAX_STREAM_WRITERS)]
+    try:
+        assert all(held)
+        assert export_client.get('/api/reports/export').status_code == 429
+    finally:
+        for _ in held:
+            streaming._writers.release()
+    assert export_client.get('/api/reports/export').status_code == 200
+
+
+def test_pipe_writer_applies_backpressure_and_stops_when_closed():
+    done = threading.Event()
+    pipe = streaming._PipeWriter(chunk_size=10, max_chunks=2)
+
+    def write(out):
+        try:
+            for _ in range(100):
+                out.write(b'x' * 10)
+        finally:
+            done.set()
+
+    assert streaming._writers.acquire(blocking=False)
+    thread = threading.Thread(target=streaming._run_writer, args=(write, pipe))
+    thread.start()
+    time.sleep(0.2)
+    assert not done.is_set() and pipe.queue.qsize() == 2
+
+    pipe.close()
+    thread.join(5)
+    assert done.is_set() and not thread.is_alive()
+    assert streaming._writers._value == streaming.MAX_STREAM_WRITERS
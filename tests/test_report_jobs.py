@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+import executors
+from database import DatabaseManager
+from report_catalog import get_report_catalog
+from report_jobs import ReportJobManager, JobQueueFullError, JOB_COMPLETED
+
+ITEMS = [
+    {'order_id': f'ORD{i:03d}', 'product': f'P{i % 3}', 'store_name': f'S{i % 2}', 'return_date': f'2024-0{1 + i % 3}-10'}
+    for i in range(30)
+]
+
+
+@pytest.fixture
+def report_db(db_manager):
+    db_manager.insert_returns_bulk(ITEMS)
+    yield db_manager
+    executors.shutdown_executors()
+
+
+def wait_finished(job, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, '報告工作逾時'
+        time.sleep(0.05)
+    return job
+
+
+def test_report_job_only_reads(report_db, monkeypatch):
+    # 報告行程不建立 DatabaseManager，也不開啟寫入連線
+    def fail(*args, **kwargs):
+        raise AssertionError('report job must not construct DatabaseManager')
+
+    monkeypatch.setattr(DatabaseManager, '__init__', fail)
+    monkeypatch.setattr(executors, '_worker_pools', {})
+    report_db.pool.close()
+
+    result = executors.generate_report_job(report_db.db_path, 'simple', params={'partition_by': 'store'})
+    assert result['report']['status'] == 'success'
+    assert result['returns_count'] == 30
+    assert result['report']['data']['sheets'] == ['商店-S1', '商店-S0']
+    assert executors._worker_pools[report_db.db_path]._writer is None
+
+
+def test_duplicate_jobs_are_merged_and_then_cached(report_db):
+    manager = ReportJobManager(report_db.db_path)
+    version = report_db.get_data_version()
+
+    job, created = manager.submit('simple', version)
+    same, created_again = manager.submit('simple', version)
+    assert created and not created_again
+    assert same is job
+
+    wait_finished(job)
+    assert job.status == JOB_COMPLETED, job.error
+    assert job.result['returns_count'] == 30
+
+    cached, created = manager.submit('simple', version)
+    assert created and cached is not job
+    assert cached.status == JOB_COMPLETED
+    assert cached.result['cached'] is True
+    assert cached.result['filename'] == job.result['filename']
+    # 工作表名稱在產生時記錄到報告目錄，快取命中時直接讀取
+    assert cached.result['sheets'] == job.result['sheets'] == ['退貨記錄']
+    assert get_report_catalog(report_db.db_path).get_sheets(job.result['filename']) == ['退貨記錄']
+    assert manager.get_stats()['cache_hits'] == 1
+
+    other, created = manager.submit('simple', version, {'partition_by': 'month'})
+    assert created and other is not job
+    wait_finished(other)
+    assert other.result['filename'] != job.result['filename']
+
+
+def test_full_queue_and_invalid_params_are_rejected(report_db):
+    manager = ReportJobManager(report_db.db_path, max_active_jobs=0)
+    with pytest.raises(JobQueueFullError):
+        manager.submit('simple', report_db.get_data_version())
+    with pytest.raises(ValueError):
+        manager.submit('simple', report_db.get_data_version(), {'partition_by': 'weekday'})
+    assert manager.get_stats()['rejected'] == 1
+
+
+def test_generate_report_endpoint_returns_job(client, app_module):
+    app_module.db_manager.insert_returns_bulk(ITEMS)
+    try:
+        response = client.post('/api/generate_report', data={'report_type': 'simple'})
+        assert response.status_code == 202
+        job_id = response.json()['data']['job_id']
+
+        deadline = time.monotonic() + 60
+        while client.get(f'/api/jobs/{job_id}/progress').json()['data']['status'] != JOB_COMPLETED:
+            assert time.monotonic() < deadline, '報告工作逾時'
+            time.sleep(0.05)
+        download = client.get(f'/api/jobs/{job_id}/download')
+        assert download.status_code == 200
+        assert client.get('/api/jobs/missing').status_code == 404
+    finally:
+        executors.shutdown_executors()
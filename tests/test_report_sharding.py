@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from report_agent import ReportAgent, normalize_report_params, MIN_SHEET_ROW_LIMIT
+
+
+def records(count, stores=1):
+    return [
+        {'id': i, 'order_id': f'H{i}', 'product': '耳機', 'store_name': f'店{i % stores}',
+         'return_date': '2024-01-01'}
+        for i in range(count)
+    ]
+
+
+def sheet_rows(wb, name):
+    return len(list(wb[name].iter_rows()))
+
+
+def test_normalize_report_params():
+    assert normalize_report_params(None) == {'partition_by': None, 'sheet_row_limit': 1000000}
+    assert normalize_report_params({'partition_by': 'all', 'sheet_row_limit': '2000'})['sheet_row_limit'] == 2000
+    for params in ({'partition_by': 'weekday'}, {'sheet_row_limit': 'many'},
+                   {'sheet_row_limit': MIN_SHEET_ROW_LIMIT - 1}, {'sheet_row_limit': 1048576}):
+        with pytest.raises(ValueError):
+            normalize_report_params(params)
+
+
+def test_details_split_at_row_limit(workdir):
+    result = ReportAgent().generate_excel_report(records(2500), params={'sheet_row_limit': 1000})
+    wb = load_workbook(result['data']['filepath'], read_only=True)
+    assert wb.sheetnames == ['摘要', '詳細資料索引', '詳細資料 1', '詳細資料 2', '詳細資料 3', '分析', '發現']
+    assert [sheet_rows(wb, f'詳細資料 {n}') for n in (1, 2, 3)] == [1001, 1001, 501]
+    # 索引列出每個分片
+    index_text = ' '.join(str(cell.value) for row in wb['詳細資料索引'].iter_rows() for cell in row)
+    assert all(f'詳細資料 {n}' in index_text for n in (1, 2, 3))
+
+
+def test_partitions_get_their_own_sheets(workdir):
+    data = sorted(records(2200, stores=2), key=lambda r: r['store_name'])
+    result = ReportAgent().generate_simple_report(data, params={'partition_by': 'store', 'sheet_row_limit': 1000})
+    wb = load_workbook(result['data']['filepath'], read_only=True)
+    assert wb.sheetnames == ['商店-店0 1', '商店-店0 2', '商店-店1 1', '商店-店1 2']
+
+
+def test_sheet_titles_are_valid_and_unique():
+    agent = ReportAgent.__new__(ReportAgent)
+    used = {'摘要'}
+    assert agent._sheet_title('商店-a/b:c', used) == '商店-a_b_c'
+    assert agent._sheet_title('摘要', used) == '摘要 (2)'
+    assert agent._sheet_title('x' * 40, used) == 'x' * 31
+    assert agent._sheet_title('x' * 40, used) == 'x' * 27 + ' (2)'
+
+
+def test_unsorted_input_is_grouped_by_partition(workdir):
+    # 兩個商店交錯出現
+    data = records(2200, stores=2)
+    agent = ReportAgent()
+    result = agent.generate_excel_report(data, params={'partition_by': 'store', 'sheet_row_limit': 1000})
+    wb = load_workbook(result['data']['filepath'], read_only=True)
+    assert wb.sheetnames == ['摘要', '詳細資料索引', '商店-店0 1', '商店-店0 2', '商店-店1 1', '商店-店1 2',
+                             '分析', '發現']
+    assert [sheet_rows(wb, name) for name in ('商店-店0 1', '商店-店0 2')] == [1001, 101]
+    assert {row[3].value for row in wb['商店-店1 2'].iter_rows(min_row=2)} == {'店1'}
+
+    frame = pd.DataFrame(records(40, stores=4))
+    result = agent.generate_simple_report(frame, params={'partition_by': 'store'})
+    assert result['data']['sheets'] == ['商店-店0', '商店-店1', '商店-店2', '商店-店3']
+
+
+def test_unsorted_batches_do_not_create_extra_sheets(workdir):
+    data = records(30, stores=3)
+    batches = iter([data[:10], data[10:20], data[20:]])
+    result = ReportAgent().generate_simple_report(batches, params={'partition_by': 'store'})
+    assert result['data']['sheets'] == ['商店-店0', '商店-店1', '商店-店2']
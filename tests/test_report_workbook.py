@@ -0,0 +1,36 @@
+from openpyxl import load_workbook
+
+from report_agent import ReportAgent
+
+
+def records(count):
+    return [
+        {'id': i, 'order_id': f'W{i}', 'product': '耳機', 'store_name': '台北店',
+         'return_date': f'2024-0{1 + i % 3}-01'}
+        for i in range(count)
+    ]
+
+
+def test_write_only_report_from_batch_iterator(workdir):
+    agent = ReportAgent()
+    consumed = []
+
+    def batches():
+        data = records(30)
+        for start in range(0, 30, 10):
+            consumed.append(start)
+            yield data[start:start + 10]
+
+    progress = []
+    result = agent.generate_excel_report(batches(), {'total_returns': 30}, returns_count=30,
+                                         progress=lambda percent, stage: progress.append(percent))
+    assert result['status'] == 'success', result['message']
+    assert consumed == [0, 10, 20]
+    assert result['data']['returns_count'] == 30
+    assert progress == sorted(progress)
+
+    wb = load_workbook(result['data']['filepath'], read_only=True)
+    assert wb.sheetnames == ['摘要', '詳細資料索引', '詳細資料', '分析', '發現']
+    # 標題列之後是 30 筆記錄
+    assert len(list(wb['詳細資料'].iter_rows())) == 31
+    assert not [name for name in (workdir / 'reports').iterdir() if name.suffix == '.tmp']
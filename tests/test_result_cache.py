@@ -0,0 +1,55 @@
+import pandas as pd
+
+from result_cache import ResultCache
+
+
+def test_hits_return_copies_and_new_version_invalidates():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'rows': [1, 2]}
+
+    first = cache.get_or_compute('stats', (), 1, compute)
+    first['rows'].append(3)
+    assert cache.get_or_compute('stats', (), 1, compute) == {'rows': [1, 2]}
+    assert len(calls) == 1
+
+    cache.get_or_compute('stats', (), 2, compute)
+    stats = cache.get_stats()
+    assert len(calls) == 2
+    assert stats['invalidations'] == 1 and stats['entries'] == 1 and stats['data_version'] == 2
+
+
+def test_stale_results_are_not_stored():
+    cache = ResultCache()
+    cache.get_or_compute('a', (), 5, lambda: 'new')
+    assert cache.get_or_compute('b', (), 4, lambda: 'old') == 'old'
+    assert cache.get_stats()['entries'] == 1
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.get_or_compute(name, (), 1, lambda: name)
+    assert cache.get_stats()['evictions'] == 1
+
+    small = ResultCache(max_bytes=1024)
+    frame = pd.DataFrame({'value': range(1000)})
+    assert small.get_or_compute('big', (), 1, lambda: frame) is frame
+    assert small.get_stats()['oversized'] == 1 and small.get_stats()['entries'] == 0
+
+
+def test_database_reads_are_invalidated_by_writes(db_manager):
+    db_manager.insert_returns_bulk([{'order_id': 'A', 'product': '耳機', 'store_name': '台北店',
+                                     'return_date': '2024-01-01'}])
+    assert len(db_manager.get_returns_by_store('台北店')) == 1
+    assert len(db_manager.get_returns_by_store('台北店')) == 1
+    hits = db_manager.get_cache_stats()['hits']
+    assert hits >= 1
+
+    db_manager.insert_returns_bulk([{'order_id': 'B', 'product': '耳機', 'store_name': '台北店',
+                                     'return_date': '2024-01-02'}])
+    assert len(db_manager.get_returns_by_store('台北店')) == 2
+    assert db_manager.get_cache_stats()['hits'] == hits
@@ -0,0 +1,43 @@
+import datetime
+import decimal
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import serialization
+from serialization import dumps, json_response
+
+VALUE = {
+    'date': datetime.date(2024, 1, 2),
+    'count': np.int64(3),
+    'ratio': decimal.Decimal('0.5'),
+    'stamp': pd.Timestamp('2024-01-02 03:04:05'),
+    'name': '台北店',
+}
+EXPECTED = {'date': '2024-01-02', 'count': 3, 'ratio': 0.5, 'stamp': '2024-01-02T03:04:05', 'name': '台北店'}
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_handles_pandas_and_numpy_values(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, 'orjson', None)
+    elif serialization.orjson is None:
+        pytest.skip('orjson 未安裝')
+    data = dumps(VALUE)
+    assert json.loads(data) == EXPECTED
+    assert '台北店'.encode('utf-8') in data
+
+
+def test_unknown_types_raise_type_error(monkeypatch):
+    monkeypatch.setattr(serialization, 'orjson', None)
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_json_response_renders_with_dumps():
+    response = json_response({'status': 'success', 'data': [VALUE]}, headers={'X-Test': '1'})
+    assert response.headers['content-type'] == 'application/json'
+    assert response.headers['x-test'] == '1'
+    assert json.loads(response.body)['data'] == [EXPECTED]
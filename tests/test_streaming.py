@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+
+import pytest
+
+from database import RETURNS_COLUMNS
+from streaming import csv_chunks, ndjson_chunks, negotiate_stream_format
+
+
+def test_negotiate_stream_format():
+    assert negotiate_stream_format('application/x-ndjson') == 'ndjson'
+    assert negotiate_stream_format('text/csv, */*;q=0.1') == 'csv'
+    assert negotiate_stream_format('application/json') is None
+    assert negotiate_stream_format('text/csv', 'json') is None
+    assert negotiate_stream_format(None, 'NDJSON') == 'ndjson'
+    with pytest.raises(ValueError):
+        negotiate_stream_format(None, 'xml')
+
+
+def test_chunks_are_produced_per_batch():
+    batches = [[{'a': 1, 'b': '中'}], [{'a': 2, 'b': 'x'}]]
+    assert list(ndjson_chunks(iter(batches))) == [b'{"a":1,"b":"\xe4\xb8\xad"}\n', b'{"a":2,"b":"x"}\n']
+
+    chunks = list(csv_chunks(iter(batches)))
+    assert len(chunks) == 2
+    assert chunks[0].decode('utf-8') == '\ufeffa,b\r\n1,中\r\n'
+    # 沒有資料時仍輸出標題列
+    assert b''.join(csv_chunks(iter([]), ['a', 'b'])).decode('utf-8') == '\ufeffa,b\r\n'
+
+
+@pytest.fixture
+def returns_client(client, app_module):
+    app_module.db_manager.insert_returns_bulk([
+        {'order_id': f'S{i}', 'product': '耳機', 'store_name': '台北店', 'return_date': f'2024-05-{i + 1:02d}'}
+        for i in range(30)
+    ])
+    return client
+
+
+def test_returns_stream_every_record(returns_client):
+    response = returns_client.get("/api/returns", params={'format': 'ndjson'})
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 30 and list(rows[0]) == RETURNS_COLUMNS
+    assert rows[0]['order_id'] == 'S29'
+
+    response = returns_client.get("/api/returns", headers={'accept': 'text/csv'})
+    assert response.headers['content-disposition'] == 'attachment; filename="returns.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.content.decode('utf-8-sig'))))
+    assert len(rows) == 30 and rows[-1]['order_id'] == 'S0'
+
+    assert returns_client.get("/api/returns", params={'format': 'xml'}).status_code == 400
@@ -0,0 +1,65 @@
+import pytest
+
+from aggregates import check_summary_consistency, read_statistics, rebuild_summary_tables
+
+ITEMS = [
+    {'order_id': f'ORD{i:03d}', 'product': f'P{i % 3}', 'store_name': f'S{i % 4}',
+     'return_date': f'2024-{1 + i % 5:02d}-{1 + i % 28:02d}'}
+    for i in range(40)
+]
+
+
+def summary(db_manager):
+    with db_manager.pool.reader() as conn:
+        return read_statistics(conn)
+
+
+def test_incremental_matches_rebuild(db_manager):
+    db_manager.insert_returns_bulk(ITEMS)
+    db_manager.insert_return('ORD900', 'P9', 'S9', '2024-06-01')
+    for record_id in (1, 2, 41):
+        assert db_manager.delete_return(record_id)
+
+    incremental = summary(db_manager)
+    with db_manager.pool.reader() as conn:
+        assert check_summary_consistency(conn) == {}
+    with db_manager.pool.transaction() as conn:
+        rebuild_summary_tables(conn)
+    assert summary(db_manager) == incremental
+    assert incremental['total_returns'] == 38
+    # 刪除最後一筆的分組不會留下數量為 0 的項目
+    assert 'S9' not in [s['store_name'] for s in incremental['store_stats']]
+
+
+def test_unpadded_dates_are_normalized(db_manager):
+    record_id = db_manager.insert_return('ORD1', 'iPhone', '台北店', '2024-3-5')
+    assert db_manager.get_return(record_id)['return_date'] == '2024-03-05'
+    record_id = db_manager.submit_return('ORD2', 'iPhone', '台北店', ' 2024-3-15 ').result(timeout=5)
+    assert db_manager.get_return(record_id)['return_date'] == '2024-03-15'
+
+    assert summary(db_manager)['monthly_stats'] == [{'month': '2024-03', 'count': 2}]
+    with db_manager.pool.reader() as conn:
+        assert check_summary_consistency(conn) == {}
+
+
+@pytest.mark.parametrize('value', ['2024/03/05', '2024-13-01', 'tomorrow', ''])
+def test_invalid_dates_are_rejected(db_manager, value):
+    with pytest.raises(ValueError):
+        db_manager.insert_return('ORD1', 'iPhone', '台北店', value)
+    assert summary(db_manager)['total_returns'] == 0
+
+
+def test_verify_endpoint_detects_and_repairs_drift(client, app_module):
+    db_manager = app_module.db_manager
+    db_manager.insert_returns_bulk(ITEMS)
+    with db_manager.pool.transaction() as conn:
+        conn.execute("UPDATE store_counts SET count = count + 5")
+
+    checked = client.post('/api/statistics/verify').json()['data']
+    assert not checked['consistent'] and not checked['repaired']
+    assert 'store_counts' in checked['mismatches']
+
+    repaired = client.post('/api/statistics/verify', params={'repair': 'true'}).json()['data']
+    assert repaired['repaired']
+    assert client.post('/api/statistics/verify').json()['data']['consistent']
+    assert summary(db_manager)['total_returns'] == len(ITEMS)
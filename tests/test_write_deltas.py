@@ -0,0 +1,42 @@
+def add(client, order_id, **extra):
+    form = {'order_id': order_id, 'product': '耳機', 'store_name': '台北店', 'return_date': '2024-04-01'}
+    form.update(extra)
+    return client.post("/api/add_return", data=form)
+
+
+def test_add_return_returns_only_the_new_record(client):
+    first = add(client, 'D1').json()['data']
+    assert first['record']['order_id'] == 'D1'
+    assert first['data_version'] == first['record']['version']
+    assert 'returns' not in first
+
+    second = add(client, 'D2', since_version=first['data_version']).json()['data']
+    changes = second['changes']
+    assert [r['order_id'] for r in changes['upserts']] == ['D2']
+    assert changes['data_version'] == second['data_version'] and not changes['reset']
+
+    assert add(client, 'D3', return_date='2024/04/01').status_code == 400
+
+
+def test_changes_include_deletes_and_reset_for_unknown_versions(client):
+    record_id = add(client, 'D1').json()['data']['record_id']
+    version = client.get("/api/returns/changes", params={'since_version': 0}).json()['data']['data_version']
+
+    deleted = client.delete(f"/api/returns/{record_id}").json()['data']
+    assert deleted['data_version'] == version + 1
+    changes = client.get("/api/returns/changes", params={'since_version': version}).json()['data']
+    assert changes['deleted_ids'] == [record_id] and changes['upserts'] == []
+
+    future = client.get("/api/returns/changes", params={'since_version': version + 100}).json()['data']
+    assert future['reset']
+    assert client.delete(f"/api/returns/{record_id}").status_code == 404
+
+
+def test_changes_reset_when_too_many(db_manager):
+    version = db_manager.get_data_version()
+    db_manager.insert_returns_bulk([
+        {'order_id': f'M{i}', 'product': '耳機', 'store_name': '台北店', 'return_date': '2024-04-02'}
+        for i in range(5)
+    ])
+    assert db_manager.get_changes_since(version, limit=3)['reset']
+    assert len(db_manager.get_changes_since(version, limit=5)['upserts']) == 5
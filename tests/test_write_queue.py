@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from database import DatabaseManager
+from write_queue import WriteBatcher, get_write_batcher
+
+
+def test_concurrent_writes_share_commits():
+    flushed = []
+
+    def flush(items):
+        flushed.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = WriteBatcher(flush, batch_size=64, max_delay_ms=20)
+    results = {}
+    barrier = threading.Barrier(32)
+
+    def writer(n):
+        barrier.wait()
+        results[n] = batcher.write(n)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert results == {n: n * 10 for n in range(32)}
+    assert len(flushed) < 32
+    assert batcher.get_stats()['records'] == 32
+
+
+def test_failed_item_only_fails_its_caller():
+    def flush(items):
+        if 'bad' in items:
+            raise ValueError('bad item')
+        return [item.upper() for item in items]
+
+    batcher = WriteBatcher(flush, batch_size=8, max_delay_ms=20)
+    futures = [batcher.submit(item) for item in ('a', 'bad', 'c')]
+    assert futures[0].result(timeout=5) == 'A'
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == 'C'
+    batcher.close()
+    assert batcher.get_stats()['fallbacks'] == 1
+
+
+def test_registry_rejects_conflicting_config(workdir):
+    db_path = str(workdir / 'returns.db')
+    first = get_write_batcher(db_path, list, batch_size=16, max_delay_ms=1.0)
+    assert get_write_batcher(db_path, list, batch_size=16, max_delay_ms=1.0) is first
+    with pytest.raises(ValueError):
+        get_write_batcher(db_path, list, batch_size=16, max_delay_ms=5.0)
+    first.close()
+
+
+def test_database_managers_share_one_queue(db_manager):
+    assert DatabaseManager(db_manager.db_path).write_queue is db_manager.write_queue
+    with pytest.raises(ValueError):
+        DatabaseManager(db_manager.db_path, write_max_delay_ms=50)
+
+    ids = [db_manager.submit_return(f'ORD{n}', 'iPhone', '台北店', '2024-05-01') for n in range(20)]
+    assert sorted(future.result(timeout=5) for future in ids) == list(range(1, 21))
+    assert db_manager.get_returns_count() == 20
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# 每次提交最多合併的筆數，以及第一筆進入佇列後最多等待的時間
+WRITE_BATCH_SIZE = 256
+WRITE_MAX_DELAY_MS = 2.0
+
+
+class WriteBatcher:
+    """將並行的單筆寫入合併為一個交易提交（group commit），每個呼叫端仍取得自己的結果"""
+
+    def __init__(self, flush, batch_size=WRITE_BATCH_SIZE, max_delay_ms=WRITE_MAX_DELAY_MS):
+        # flush(items) 在一個交易中寫入整批資料，並依序返回每一筆的結果
+        self.flush = flush
+        self.batch_size = batch_size
+        self.max_delay_ms = max_delay_ms
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._stats = {
+            'submitted': 0,
+            'batches': 0,
+            'records': 0,
+            'max_batch': 0,
+            'fallbacks': 0,
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """將一筆寫入放入佇列，返回完成後帶有結果的 Future"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("寫入佇列已關閉")
+            self._pending.append((item, future))
+            self._stats['submitted'] += 1
+            self._ensure_thread()
+            self._condition.notify_all()
+        return future
+
+    def write(self, item):
+        """提交一筆寫入並等待交易提交完成"""
+        return self.submit(item).result()
+
+    def _next_batch(self):
+        """等待第一筆資料，再於 max_delay_ms 內盡量湊滿一批"""
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return None
+
+            deadline = time.monotonic() + self.max_delay_ms / 1000
+            while len(self._pending) < self.batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._pending[:self.batch_size]
+            self._pending = self._pending[self.batch_size:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.flush(items)
+        except Exception:
+            # 整批失敗時逐筆重試，讓單一錯誤資料只影響自己的呼叫端
+            with self._condition:
+                self._stats['fallbacks'] += 1
+            for item, future in batch:
+                try:
+                    future.set_result(self.flush([item])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        with self._condition:
+            self._stats['batches'] += 1
+            self._stats['records'] += len(batch)
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self):
+        """停止接收新的寫入，寫完佇列中剩餘的資料後結束背景執行緒"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def get_stats(self):
+        """取得批次寫入的使用狀況"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'pending': len(self._pending),
+                'batch_size': self.batch_size,
+                'max_delay_ms': self.max_delay_ms,
+                'avg_batch': round(stats['records'] / stats['batches'], 2) if stats['batches'] else 0.0,
+            })
+        return stats
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_write_batcher(db_path, flush, batch_size=WRITE_BATCH_SIZE, max_delay_ms=WRITE_MAX_DELAY_MS):
+    """取得（或建立）指定資料庫檔案共用的寫入佇列
+    
+    每個資料庫只有一組批次設定：與既有佇列的 batch_size、max_delay_ms 不同時拋出 ValueError，
+    不會默默沿用先建立者的設定；flush 使用建立佇列時的函式（同一資料庫的寫入方式相同）
+    """
+    key = os.path.abspath(db_path)
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None or batcher._closed:
+            batcher = WriteBatcher(flush, batch_size=batch_size, max_delay_ms=max_delay_ms)
+            _batchers[key] = batcher
+        elif (batcher.batch_size, batcher.max_delay_ms) != (batch_size, max_delay_ms):
+            raise ValueError(
+                f"資料庫 {db_path} 的寫入佇列已使用 batch_size={batcher.batch_size}、"
+                f"max_delay_ms={batcher.max_delay_ms}，不能再以 batch_size={batch_size}、"
+                f"max_delay_ms={max_delay_ms} 建立"
+            )
+        return batcher